@@ -0,0 +1,119 @@
+"""
+Peak RSS and wall time of the AQ long-to-wide reshape on a synthetic store.
+
+legacy: every site concatenated with name/lat/lon on each row, pivot_table on a
+        five-column index, then a groupby into per-site copies
+lean:   one site at a time, pivoted on integer timestamp and pollutant codes
+
+Imputation is left out so only the reshape is measured, unless --impute-mode is
+given; then both variants impute every site the way filter_laqn_data.py does and
+the checksums cover the imputed values. Each variant runs in a fresh process.
+
+    python -m benchmarks.bench_aq_reshape --sites 100 --years 5
+    python -m benchmarks.bench_aq_reshape --sites 20 --years 3 --impute-mode windowed
+"""
+import argparse
+import multiprocessing as mp
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from filter_laqn_data import IMPUTE_COLS, POLLUTANTS, pivot_site
+from src import imputation
+from src import laqn_store as store
+from src.resources import peak_rss_mb
+
+
+def write_synthetic_store(store_dir, n_sites, years, seed=0):
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2010-01-01T00:00:00", "s").astype(np.int64)
+    hours = start + 3600 * np.arange(years * 8760, dtype=np.int64)
+    metadata = {}
+    with store.StoreWriter(store_dir) as writer:
+        for i in range(n_sites):
+            site_code = f"S{i:03d}"
+            metadata[site_code] = {"name": f"Synthetic site {i}", "lat": str(51.3 + rng.random() * 0.4),
+                                   "lon": str(-0.4 + rng.random() * 0.6)}
+            for pollutant in POLLUTANTS:
+                keep = rng.random(len(hours)) > 0.1
+                values = rng.gamma(4, 8, keep.sum()).round(1)
+                writer.write(site_code, store.chunk_table(pollutant, hours[keep], values))
+    store.save_site_metadata(metadata, store_dir)
+
+
+def combine(site_code, wide, impute_mode=None):
+    """PM2.5 combined with FINE, imputed when a mode is given; returns the (NO2, pm25_combined) sum."""
+    wide['pm25_combined'] = wide['PM2.5'].combine_first(wide['FINE'])
+    if impute_mode is not None:
+        _, filled, _ = imputation.impute_job(site_code, wide, IMPUTE_COLS, impute_mode)
+        return float(filled.sum().sum())
+    return float(wide[IMPUTE_COLS].sum().sum())
+
+
+def run_legacy(store_dir, impute_mode=None):
+    metadata = store.load_site_metadata(store_dir)
+    frames = []
+    for site_code in store.stored_sites(store_dir):
+        site_df = store.read_site(site_code, store_dir)
+        site_info = metadata[site_code]
+        site_df['site_name'] = site_info['name']
+        site_df['latitude'] = pd.to_numeric(site_info['lat'])
+        site_df['longitude'] = pd.to_numeric(site_info['lon'])
+        frames.append(site_df)
+    df = pd.concat(frames, ignore_index=True)
+    df['pollutant'] = df['pollutant'].astype(str)
+    wide = df.pivot_table(index=['timestamp', 'site_code', 'site_name', 'latitude', 'longitude'],
+                          columns='pollutant', values='value').reset_index()
+    wide = wide.rename(columns={"timestamp": "date"}).set_index('date')
+    checksum, rows = 0.0, 0
+    for site_code, site_df in wide.groupby('site_code'):
+        df_copy = site_df.copy()
+        checksum += combine(site_code, df_copy, impute_mode)
+        rows += len(df_copy)
+    return rows, checksum
+
+
+def run_lean(store_dir, impute_mode=None):
+    checksum, rows = 0.0, 0
+    for site_code in store.stored_sites(store_dir):
+        wide = pivot_site(store.read_site(site_code, store_dir))
+        checksum += combine(site_code, wide, impute_mode)
+        rows += len(wide)
+    return rows, checksum
+
+
+def measure(name, store_dir, impute_mode, queue):
+    start = time.perf_counter()
+    rows, checksum = {"legacy": run_legacy, "lean": run_lean}[name](store_dir, impute_mode)
+    queue.put((rows, checksum, time.perf_counter() - start, peak_rss_mb()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=100)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--impute-mode", choices=["windowed", "fast", "knn"], default=None,
+                        help="also impute each site, as filter_laqn_data.py does")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        store_dir = Path(tmp)
+        write_synthetic_store(store_dir, args.sites, args.years)
+        size = sum(p.stat().st_size for p in store_dir.rglob("*.parquet"))
+        print(f"synthetic store: {args.sites} sites x {args.years} years, {size / 2**20:.1f} MB on disk")
+
+        for name in ("legacy", "lean"):
+            queue = ctx.Queue()
+            proc = ctx.Process(target=measure, args=(name, store_dir, args.impute_mode, queue))
+            proc.start()
+            rows, checksum, elapsed, peak = queue.get()
+            proc.join()
+            print(f"{name:<7} rows={rows:>11,}  checksum={checksum:16.1f}  {elapsed:7.2f}s  peak_rss={peak:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
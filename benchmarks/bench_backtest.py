@@ -0,0 +1,151 @@
+"""
+A multi-year backtest of a LightGBM model per target (the notebooks' lag features,
+600 trees), trained on the model-ready dataset up to --split and replayed from a
+forecast origin every day after it, 1-48 hours ahead for every site.
+
+check:   forecasts from a few origins equal model.predict on add_features rows, with
+         the targets after the origin replaced by the forecasts themselves
+batched: src.backtest.backtest, every (origin, site) pair in one feature grid
+loop:    Forecaster.forecast_from once per origin (all sites), timed on --loop-origins
+         origins and scaled to all of them
+rolling: rolling_backtest refitting the models every --refit-days on everything before
+
+Forecasts/s counts (origin, site, horizon) forecasts per target. The metrics are the
+batched backtest's, for a few horizons and per site.
+
+    python -m benchmarks.bench_backtest --split 2011-01-01 --refit-days 180
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from lightgbm import LGBMRegressor
+
+from benchmarks.bench_model_schema import synthetic_frame
+from build_model_dataset import apply_model_schema
+from src import config as cfg
+from src.backtest import backtest, daily_origins, history_forecaster, horizon_metrics, rolling_backtest
+from src.calendar_table import add_calendar_features
+from src.features import HOUR_NS, FeatureSpec, add_features
+from src.forecasting import MAX_HORIZON, model_manifest
+
+TARGETS = ['NO2', 'PM2.5']
+NOT_FEATURES = TARGETS + ['date', 'site_code', 'site_name']
+SPEC = FeatureSpec(lags=(24, 12))
+
+
+def load_rows(path, sites, years):
+    if path.exists():
+        df = pd.read_parquet(path)
+        source = str(path.relative_to(cfg.ROOT))
+    else:
+        df = apply_model_schema(add_calendar_features(synthetic_frame(sites, years)))
+        source = f"synthetic ({sites} sites × {years} years; {path.name} not found)"
+    return df.sort_values(['site_code', 'date'], ignore_index=True), source
+
+
+def fit(rows, trees):
+    rows = rows.dropna(subset=SPEC.names() + TARGETS)
+    features = [col for col in rows.columns if col not in NOT_FEATURES]
+    models = {t: LGBMRegressor(n_estimators=trees, num_leaves=63, learning_rate=0.05, verbose=-1)
+              .fit(rows[features], rows[t]) for t in TARGETS}
+    return models, rows[features]
+
+
+def check(df, forecaster, models, results, origins, n_checks=3):
+    worst = 0.0
+    for origin in origins[np.linspace(0, len(origins) - 1, n_checks).astype(int)]:
+        origin = pd.Timestamp(origin * HOUR_NS, tz='UTC')
+        for site in forecaster.sites:
+            out = results[(results['origin'] == origin) & (results['site_code'] == site)]
+            filled = df[(df['site_code'] == site) & (df['date'] <= out['date'].max())].copy()
+            filled[TARGETS] = filled[TARGETS].astype('float64')
+            # the forecasts replace the hours ahead, observed or not
+            filled = filled.set_index('date').reindex(
+                pd.date_range(filled['date'].min(), out['date'].max(), freq='h', name='date')).reset_index()
+            filled['site_code'] = site
+            ahead = filled['date'] > origin
+            filled.loc[ahead, TARGETS] = out[[f"{t}_forecast" for t in TARGETS]].to_numpy()
+            rows = add_features(filled, SPEC).loc[ahead]
+            X = rows.reindex(columns=forecaster.features)
+            X['road_type'] = X['road_type'].astype(pd.CategoricalDtype(forecaster.categories['road_type']))
+            # hours missing from the dataset have no weather either way; compare where the row exists
+            exists = rows['temperature_2m'].notna().to_numpy()
+            for t in TARGETS:
+                diff = np.abs(models[t].predict(X[exists]) - rows.loc[exists, t].to_numpy())
+                worst = max(worst, diff.max() if len(diff) else 0.0)
+    print(f"check: {n_checks} origins × {len(forecaster.sites)} sites × {forecaster.max_horizon} horizons, "
+          f"max |backtest - notebook predict| = {worst:.2e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=str(cfg.MODEL_READY))
+    parser.add_argument("--sites", type=int, default=4, help="synthetic sites when --data is missing")
+    parser.add_argument("--years", type=int, default=3, help="synthetic years when --data is missing")
+    parser.add_argument("--split", default=None, help="first forecast origin (default a third into the data)")
+    parser.add_argument("--trees", type=int, default=600)
+    parser.add_argument("--loop-origins", type=int, default=30)
+    parser.add_argument("--refit-days", type=int, default=0, help="also run rolling_backtest refitting this often")
+    args = parser.parse_args()
+
+    df, source = load_rows(cfg.ROOT / args.data, args.sites, args.years)
+    first, last = df['date'].min(), df['date'].max()
+    split = pd.Timestamp(args.split, tz='UTC') if args.split else (first + (last - first) / 3).normalize()
+    origins = daily_origins(split, last - pd.Timedelta(hours=MAX_HORIZON))
+    rows = add_features(df, SPEC)
+    train_rows = rows[rows['date'] <= split]
+
+    start = time.perf_counter()
+    models, X_train = fit(train_rows, args.trees)
+    fit_s = time.perf_counter() - start
+    start = time.perf_counter()
+    forecaster = history_forecaster(model_manifest(models, X_train, SPEC), models, df)
+    observe_s = time.perf_counter() - start
+    n_forecasts = len(origins) * len(forecaster.sites) * MAX_HORIZON
+    print(f"{source}: {df['site_code'].nunique()} sites, {first:%Y-%m-%d} to {last:%Y-%m-%d}; "
+          f"trained to {split:%Y-%m-%d} in {fit_s:.1f}s, observed the history in {observe_s:.2f}s")
+    print(f"{len(origins):,} daily origins × {len(forecaster.sites)} sites × {MAX_HORIZON} horizons "
+          f"= {n_forecasts:,} forecasts per target")
+
+    start = time.perf_counter()
+    results = backtest(forecaster, origins)
+    batched_s = time.perf_counter() - start
+    check(df, forecaster, models, results, origins)
+
+    site_idx = np.arange(len(forecaster.sites))
+    subset = origins[:args.loop_origins]
+    start = time.perf_counter()
+    for origin in subset:
+        forecaster.forecast_from(site_idx, np.full(len(site_idx), origin), MAX_HORIZON)
+    loop_s = (time.perf_counter() - start) * len(origins) / len(subset)
+
+    print(f"\n{'mode':<8} {'seconds':>9} {'forecasts/s':>12}")
+    print(f"{'batched':<8} {batched_s:9.1f} {n_forecasts / batched_s:12,.0f}")
+    print(f"{'loop':<8} {loop_s:9.1f} {n_forecasts / loop_s:12,.0f}  (scaled from {len(subset)} origins)")
+    if args.refit_days:
+        start = time.perf_counter()
+        rolling = rolling_backtest(df, lambda r: fit(r, args.trees), origins, SPEC,
+                                   refit_every=args.refit_days * 24)
+        rolling_s = time.perf_counter() - start
+        refits = len(range(int(origins[0]), int(origins[-1]) + 1, args.refit_days * 24))
+        print(f"{'rolling':<8} {rolling_s:9.1f} {n_forecasts / rolling_s:12,.0f}  ({refits} fits included)")
+
+    pd.set_option('display.width', 120)
+    by_horizon = horizon_metrics(results, 'horizon')
+    print("\nper horizon:")
+    print(by_horizon[by_horizon['horizon'].isin([1, 6, 12, 24, 36, 48])]
+          .pivot(index='horizon', columns='target', values=['r2', 'mae', 'rmse']).round(3))
+    print("\nper site:")
+    print(horizon_metrics(results, 'site_code').pivot(index='site_code', columns='target',
+                                                      values=['r2', 'mae', 'rmse']).round(3))
+    if args.refit_days:
+        print("\nper horizon, refitted every", args.refit_days, "days:")
+        rolled = horizon_metrics(rolling, 'horizon')
+        print(rolled[rolled['horizon'].isin([1, 6, 12, 24, 36, 48])]
+              .pivot(index='horizon', columns='target', values=['r2', 'mae', 'rmse']).round(3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Calendar features for every (site, hour) row of a synthetic dataset.
+
+legacy: tz_convert, time parts, holiday isin over python dates and rush-hour
+        flags on every row, as build_model_dataset.py did
+cold:   build the per-hour calendar table, then join it on the hour key
+warm:   read the cached table, then join it on the hour key
+
+    python -m benchmarks.bench_calendar --sites 40 --years 10
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import holidays
+import numpy as np
+import pandas as pd
+
+from src.calendar_table import add_calendar_features, load_calendar
+
+START_YEAR = 2010
+LEGACY_COLUMNS = ['month', 'day_of_week', 'hour', 'is_weekend', 'is_holiday', 'is_rush_hour']
+
+
+def run_legacy(df):
+    df['date_local'] = df['date'].dt.tz_convert('Europe/London')
+    df['month'] = df['date_local'].dt.month
+    df['day_of_week'] = df['date_local'].dt.dayofweek
+    df['hour'] = df['date_local'].dt.hour
+    df['is_weekend'] = (df['day_of_week'] >= 5).astype(int)
+    uk_holidays = holidays.UK(subdiv='ENG', years=range(2010, 2026))
+    df['is_holiday'] = df['date_local'].dt.date.isin(uk_holidays).astype(int)
+    is_weekday = ~df['is_weekend'].astype(bool)
+    morning_rush = (df['hour'] >= 6) & (df['hour'] <= 9)
+    evening_rush = (df['hour'] >= 16) & (df['hour'] <= 21)
+    df['is_rush_hour'] = np.where(is_weekday & (morning_rush | evening_rush), 1, 0)
+    return df
+
+
+def run_calendar(df, path):
+    years = START_YEAR, int(df['date'].dt.year.max())
+    return add_calendar_features(df, load_calendar(*years, path=path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=40)
+    parser.add_argument("--years", type=int, default=10)
+    args = parser.parse_args()
+
+    hours = pd.date_range(f"{START_YEAR}-01-01", periods=args.years * 8760, freq="h", tz="UTC")
+    df = pd.DataFrame({"site_code": np.repeat([f"S{i:03d}" for i in range(args.sites)], len(hours)),
+                       "date": np.tile(hours, args.sites)})
+    print(f"{len(df):,} rows, {args.sites} sites, {len(hours):,} hours")
+
+    start = time.perf_counter()
+    legacy = run_legacy(df.copy())
+    print(f"legacy  {time.perf_counter() - start:7.2f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "calendar_hours.parquet"
+        for label in ("cold", "warm"):
+            start = time.perf_counter()
+            joined = run_calendar(df.copy(), path)
+            print(f"{label:<7} {time.perf_counter() - start:7.2f}s")
+
+    pd.testing.assert_frame_equal(legacy[LEGACY_COLUMNS], joined[LEGACY_COLUMNS])
+    print("calendar columns match the legacy ones")
+
+
+if __name__ == "__main__":
+    main()
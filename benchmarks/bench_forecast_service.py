@@ -0,0 +1,201 @@
+"""
+Latency and throughput of the forecasting service on synthetic sites, with a LightGBM
+model per target trained on the notebooks' lag features.
+
+check:      forecasts for every horizon equal model.predict on add_features rows, with the
+            targets after the origin replaced by the forecasts themselves (the recursion)
+in-process: Forecaster.forecast for batches of sites × every horizon up to --horizon
+http:       serve_forecasts.py in its own process, --clients threads each posting
+            /forecast requests for --batch random sites over one keep-alive connection
+
+p50/p99 are per request; forecasts/s counts site-hours returned.
+
+    python -m benchmarks.bench_forecast_service --sites 200 --horizon 24 --clients 4
+"""
+import argparse
+import http.client
+import json
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from lightgbm import LGBMRegressor
+
+from benchmarks.bench_model_schema import synthetic_frame
+from build_model_dataset import apply_model_schema
+from src import config as cfg
+from src.calendar_table import add_calendar_features
+from src.features import FeatureSpec, add_features
+from src.forecasting import Forecaster, save_models
+
+TARGETS = ['NO2', 'PM2.5']
+NOT_FEATURES = TARGETS + ['date', 'site_code', 'site_name']
+SPEC = FeatureSpec(lags=(24, 12))
+TRAIN_SITES = 5
+
+
+def synthetic_sites(n_sites, days):
+    """Model-ready rows with real calendar columns and pollutants that persist from hour to hour."""
+    df = synthetic_frame(n_sites, 1).groupby('site_code').head(days * 24).reset_index(drop=True)
+    for col in TARGETS:
+        df[col] = df.groupby('site_code')[col].transform(lambda s: s.rolling(6, min_periods=1).mean())
+    return apply_model_schema(add_calendar_features(df))
+
+
+def train(df, origin):
+    rows = add_features(df[df['site_code'].isin(df['site_code'].cat.categories[:TRAIN_SITES])], SPEC)
+    rows = rows[rows['date'] <= origin].dropna()
+    features = [col for col in rows.columns if col not in NOT_FEATURES]
+    models = {t: LGBMRegressor(n_estimators=600, num_leaves=63, learning_rate=0.05, verbose=-1)
+              .fit(rows[features], rows[t]) for t in TARGETS}
+    return models, rows[features]
+
+
+def check(df, forecaster, models, features, origin, horizon):
+    sites = list(df['site_code'].cat.categories[:3])
+    out = forecaster.forecast(sites, range(1, horizon + 1))
+    filled = df[df['site_code'].isin(sites) & (df['date'] <= origin + pd.Timedelta(hours=horizon))].copy()
+    filled['site_code'] = filled['site_code'].astype(str)
+    filled = filled.sort_values(['site_code', 'date'], ignore_index=True)
+    ahead = filled['date'] > origin
+    filled[TARGETS] = filled[TARGETS].astype('float64')
+    filled.loc[ahead, TARGETS] = out.sort_values(['site_code', 'date'])[TARGETS].to_numpy()
+    X = add_features(filled, SPEC).loc[ahead, features]
+    X['road_type'] = X['road_type'].astype(pd.CategoricalDtype(forecaster.categories['road_type']))
+    worst = max(np.abs(models[t].predict(X) - filled.loc[ahead, t]).max() for t in TARGETS)
+    print(f"check: {len(sites)} sites × {horizon} horizons, max |forecast - notebook predict| = {worst:.2e}")
+
+
+def percentiles(latencies):
+    ms = np.array(latencies) * 1000
+    return np.percentile(ms, 50), np.percentile(ms, 99)
+
+
+def run_in_process(forecaster, sites, batch, horizon, n_requests, rng):
+    latencies = []
+    for _ in range(n_requests):
+        chosen = list(rng.choice(sites, batch, replace=False))
+        start = time.perf_counter()
+        forecaster.forecast(chosen, range(1, horizon + 1))
+        latencies.append(time.perf_counter() - start)
+    return latencies, sum(latencies)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_http(port, sites, batch, horizon, clients, n_requests):
+    latencies = []
+    lock = threading.Lock()
+
+    def client(seed):
+        rng = np.random.default_rng(seed)
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        mine = []
+        for _ in range(n_requests):
+            body = json.dumps({"sites": list(rng.choice(sites, batch, replace=False)),
+                               "horizons": list(range(1, horizon + 1))})
+            start = time.perf_counter()
+            conn.request("POST", "/forecast", body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            payload = response.read()
+            mine.append(time.perf_counter() - start)
+            if response.status != 200:
+                raise RuntimeError(payload.decode())
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - start
+
+
+def wait_for(port, proc, timeout=300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("serve_forecasts.py exited")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("serve_forecasts.py did not come up")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=200)
+    parser.add_argument("--days", type=int, default=60, help="hours of history per site, in days")
+    parser.add_argument("--horizon", type=int, default=24)
+    parser.add_argument("--batch", type=int, default=20, help="sites per HTTP request")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100, help="requests per client / per in-process batch size")
+    args = parser.parse_args()
+
+    df = synthetic_sites(args.sites, args.days)
+    origin = df['date'].max() - pd.Timedelta(hours=args.horizon)
+    models, X_train = train(df, origin)
+    sites = list(df['site_code'].cat.categories)
+    # the service sees targets up to the origin and weather beyond it, as forecast weather
+    history = df.copy()
+    history.loc[history['date'] > origin, TARGETS] = np.nan
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir, history_path = Path(tmp) / "models", Path(tmp) / "history.parquet"
+        save_models(model_dir, models, X_train, SPEC, sites=sites)
+        history.to_parquet(history_path, index=False)
+
+        start = time.perf_counter()
+        forecaster = Forecaster(model_dir, max_horizon=args.horizon)
+        forecaster.observe(history)
+        print(f"{args.sites} sites × {args.days * 24:,} hours, {len(models)} models of 600 trees; "
+              f"load and warm-up {time.perf_counter() - start:.2f}s")
+        check(df, forecaster, models, list(X_train.columns), origin, args.horizon)
+
+        print(f"\n{'mode':<11} {'clients':>7} {'sites/req':>9} {'p50_ms':>8} {'p99_ms':>8} "
+              f"{'req/s':>8} {'forecasts/s':>12}")
+        rng = np.random.default_rng(0)
+        for batch in sorted({1, args.batch, args.sites}):
+            latencies, elapsed = run_in_process(forecaster, sites, batch, args.horizon, args.requests, rng)
+            p50, p99 = percentiles(latencies)
+            rate = len(latencies) / elapsed
+            print(f"{'in-process':<11} {1:7d} {batch:9d} {p50:8.2f} {p99:8.2f} {rate:8.1f} "
+                  f"{rate * batch * args.horizon:12,.0f}")
+
+        port = free_port()
+        proc = subprocess.Popen([sys.executable, "serve_forecasts.py", "--models", str(model_dir),
+                                 "--history", str(history_path), "--port", str(port),
+                                 "--max-horizon", str(args.horizon)],
+                                cwd=cfg.ROOT, stdout=subprocess.DEVNULL)
+        try:
+            wait_for(port, proc)
+            for clients in sorted({1, args.clients}):
+                latencies, elapsed = run_http(port, sites, args.batch, args.horizon, clients, args.requests)
+                p50, p99 = percentiles(latencies)
+                rate = len(latencies) / elapsed
+                print(f"{'http':<11} {clients:7d} {args.batch:9d} {p50:8.2f} {p99:8.2f} {rate:8.1f} "
+                      f"{rate * args.batch * args.horizon:12,.0f}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+LightGBM hyperparameter search on synthetic model-ready rows, full budget against
+successive halving, with each search's best parameters refitted on all training rows
+and scored on a holdout (the last fifth of the rows, as the notebooks split by date).
+
+full:     src.training.search, n_iter candidates at their sampled n_estimators
+halving:  src.training.halving_search, n_candidates on 1/27 → 1/9 → 1/3 → all of the
+          rounds and rows, each fit stopped early on the latest 15% of its training rows
+
+The parameter grid is the LightGBM notebook's. Each search runs in a fresh process.
+
+    python -m benchmarks.bench_halving --rows 100000 --n-iter 12 --n-candidates 27
+"""
+import argparse
+import multiprocessing as mp
+import tempfile
+import time
+from pathlib import Path
+
+from sklearn.metrics import mean_absolute_error, r2_score
+
+from benchmarks.bench_training import TARGETS, TreeMemory, synthetic_xy
+
+PARAM_DIST = {
+    'n_estimators': [300, 600, 1000],
+    'learning_rate': [0.03, 0.05, 0.08],
+    'num_leaves': [31, 63, 127],
+    'min_data_in_leaf': [20, 50, 100],
+    'subsample': [0.7, 0.8, 0.9],
+    'colsample_bytree': [0.7, 0.8, 0.9],
+    'reg_lambda': [0.0, 0.5, 1.0, 2.0],
+}
+HOLDOUT = 0.2
+
+
+def measure(name, rows, n_iter, n_candidates, cache_dir, queue):
+    from lightgbm import LGBMRegressor
+    from src.training import FoldCache, halving_search, search
+
+    X, y = synthetic_xy(rows)
+    split = int(len(X) * (1 - HOLDOUT))
+    X_train, X_test, y_train, y_test = X[:split], X[split:], y[:split], y[split:]
+    with TreeMemory() as memory:
+        start = time.perf_counter()
+        cache = FoldCache.build(X_train, y_train, cache_dir)
+        if name == "full":
+            result = search(cache, "lgbm", PARAM_DIST, n_iter)
+        else:
+            result = halving_search(cache, PARAM_DIST, n_candidates)
+        elapsed = time.perf_counter() - start
+
+    holdout = {}
+    for target in TARGETS:
+        model = LGBMRegressor(**result.best_params[target], random_state=42, verbose=-1)
+        model.fit(X_train, y_train[target])
+        pred = model.predict(X_test)
+        holdout[target] = (result.best_params[target]['n_estimators'],
+                           r2_score(y_test[target], pred), mean_absolute_error(y_test[target], pred))
+    queue.put((elapsed, memory.peak, holdout))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--n-iter", type=int, default=12)
+    parser.add_argument("--n-candidates", type=int, default=27)
+    args = parser.parse_args()
+
+    print(f"{args.rows:,} rows, {HOLDOUT:.0%} holdout; full search {args.n_iter} candidates, "
+          f"halving {args.n_candidates}")
+    print(f"{'search':<8} {'seconds':>8} {'peak_pss_mb':>12}  {'target':<6} {'rounds':>6} "
+          f"{'holdout_r2':>10} {'holdout_mae':>11}")
+
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("full", "halving"):
+            queue = ctx.Queue()
+            proc = ctx.Process(target=measure, args=(name, args.rows, args.n_iter, args.n_candidates,
+                                                     Path(tmp) / name, queue))
+            proc.start()
+            elapsed, peak, holdout = queue.get()
+            proc.join()
+            for k, (target, (rounds, r2, mae)) in enumerate(holdout.items()):
+                lead = f"{name:<8} {elapsed:8.1f} {peak:12.0f}" if k == 0 else " " * 30
+                print(f"{lead}  {target:<6} {rounds:6d} {r2:10.3f} {mae:11.3f}")
+
+
+if __name__ == "__main__":
+    main()
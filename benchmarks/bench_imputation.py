@@ -0,0 +1,134 @@
+"""
+Quality and cost of the imputation modes on synthetic hourly site histories.
+
+Gaps of realistic lengths are punched into series whose true values are known,
+then each mode is scored against the truth and against the whole-history KNN
+output that filter_laqn_data.py used to produce.
+
+    python -m benchmarks.bench_imputation --sites 2 --years 3
+"""
+import argparse
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src import imputation
+
+COLS = ['NO2', 'pm25_combined']
+
+
+def synthetic_site(years, seed):
+    rng = np.random.default_rng(seed)
+    # the LAQN store's timestamps are in seconds, not pandas' default ns
+    index = pd.date_range("2010-01-01", periods=years * 8760, freq="h", unit="s")
+    hour = index.hour.to_numpy()
+    doy = index.dayofyear.to_numpy()
+    diurnal = 12 * np.exp(-((hour - 8) ** 2) / 6) + 10 * np.exp(-((hour - 18) ** 2) / 8)
+    seasonal = 8 * np.cos(2 * np.pi * (doy - 15) / 365)
+    noise = np.empty(len(index))
+    noise[0] = 0
+    shocks = rng.normal(0, 3, len(index))
+    for i in range(1, len(index)):
+        noise[i] = 0.9 * noise[i - 1] + shocks[i]
+    no2 = 30 + diurnal + seasonal + noise
+    pm25 = 8 + 0.3 * diurnal + 0.5 * seasonal + 0.4 * noise + rng.normal(0, 1.5, len(index))
+    truth = pd.DataFrame({'NO2': no2, 'pm25_combined': pm25}, index=index)
+
+    observed = truth.copy()
+    n = len(index)
+    for col, n_short, n_long in (('NO2', n // 200, n // 4000), ('pm25_combined', n // 150, n // 3000)):
+        for start in rng.integers(0, n, n_short):
+            observed.iloc[start:start + rng.integers(1, 4), observed.columns.get_loc(col)] = np.nan
+        for start in rng.integers(0, n, n_long):
+            observed.iloc[start:start + rng.integers(24, 24 * 14), observed.columns.get_loc(col)] = np.nan
+    return truth, observed
+
+
+def traced_job(site_code, frame, cols, mode):
+    """impute_frame for one site, timed and with its peak traced memory recorded."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    filled, counts = imputation.impute_frame(frame, cols, mode)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = {"site_code": site_code, "rows": len(frame), "seconds": round(elapsed, 3),
+             "peak_mb": round(peak / 2**20, 1), **counts}
+    return site_code, filled, stats
+
+
+def impute_sites(site_frames, cols, mode, max_workers):
+    """
+    Imputes each site on its own worker process. Returns ({site_code: filled frame}, [per-site stats]),
+    where stats carry rows, runtime, peak traced memory and how many values each step filled.
+    """
+    results, stats = {}, []
+    if max_workers <= 1 or len(site_frames) <= 1:
+        for code, frame in site_frames.items():
+            site_code, filled, site_stats = traced_job(code, frame[cols], cols, mode)
+            results[site_code] = filled
+            stats.append(site_stats)
+        return results, stats
+
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(site_frames))) as executor:
+        futures = [executor.submit(traced_job, code, frame[cols], cols, mode)
+                   for code, frame in site_frames.items()]
+        for future in futures:
+            site_code, filled, site_stats = future.result()
+            results[site_code] = filled
+            stats.append(site_stats)
+    return results, stats
+
+
+def check_blocks(index, block_days=imputation.BLOCK_DAYS):
+    """The KNN blocks are block_days long whatever the index's unit."""
+    expected = int((index[-1] - index[0]) // pd.Timedelta(days=block_days)) + 1
+    for unit in ["s", "ms", "ns"]:
+        starts, _ = imputation.block_bounds(index.as_unit(unit), block_days)
+        if len(starts) != expected:
+            raise AssertionError(f"{len(starts)} KNN blocks on a {unit} index, expected {expected}")
+    print(f"{expected} KNN blocks of {block_days} days on s, ms and ns indexes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=2)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=imputation.MAX_WORKERS)
+    parser.add_argument("--modes", nargs="+", default=["knn", "windowed", "fast"])
+    args = parser.parse_args()
+
+    truths, frames = {}, {}
+    for i in range(args.sites):
+        truths[f"S{i:03d}"], frames[f"S{i:03d}"] = synthetic_site(args.years, seed=i)
+    print(f"{args.sites} sites x {args.years * 8760:,} hours")
+    check_blocks(next(iter(frames.values())).index)
+
+    outputs = {}
+    for mode in args.modes:
+        filled, stats = impute_sites(frames, COLS, mode, args.workers)
+        outputs[mode] = filled
+        print(f"\n[{mode}]")
+        print(pd.DataFrame(stats).set_index('site_code').fillna(0).to_string())
+
+    print("\nMAE on the punched-out values (vs truth, and vs whole-history KNN where it ran):")
+    for mode, filled in outputs.items():
+        vs_truth, vs_knn = [], []
+        for site_code, frame in frames.items():
+            mask = frame[COLS].isna().to_numpy()
+            diff = filled[site_code][COLS].to_numpy() - truths[site_code][COLS].to_numpy()
+            vs_truth.append(np.abs(diff[mask]))
+            if "knn" in outputs:
+                diff = filled[site_code][COLS].to_numpy() - outputs["knn"][site_code][COLS].to_numpy()
+                vs_knn.append(np.abs(diff[mask]))
+        line = f"{mode:<9} vs truth {np.concatenate(vs_truth).mean():6.2f}"
+        if vs_knn:
+            line += f"   vs knn {np.concatenate(vs_knn).mean():6.2f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
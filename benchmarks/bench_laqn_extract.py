@@ -0,0 +1,106 @@
+"""
+Compares the old record-dict extraction (one dict per hour, everything gathered
+before a single CSV write) with column extraction streamed into the Parquet store,
+on synthetic RawAQData payloads. Each path runs in a fresh process so peak RSS
+is measured independently.
+
+    python -m benchmarks.bench_laqn_extract --sites 4 --years 15
+"""
+import argparse
+import multiprocessing as mp
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+import fetch_data_Laqn as laqn
+from benchmarks.laqn_stub_server import synthetic_payload
+from src import laqn_store as store
+from src.resources import peak_rss_mb
+
+
+def legacy_extract_records(raw_data, site_code, site_info, pollutant_name):
+    """extract_records as it was before the columnar path."""
+    if not raw_data or "RawAQData" not in raw_data or "Data" not in raw_data["RawAQData"]:
+        return []
+    data_points = raw_data["RawAQData"]["Data"]
+    if not isinstance(data_points, list):
+        data_points = [data_points]
+    records = []
+    for point in data_points:
+        ts = point.get("@MeasurementDateGMT")
+        val = point.get("@Value")
+        if ts and val and val.strip():
+            records.append({
+                "site_code": site_code, "site_name": site_info.get("name"),
+                "latitude": site_info.get("lat"), "longitude": site_info.get("lon"),
+                "pollutant": pollutant_name, "timestamp": ts, "value": float(val),
+            })
+    return records
+
+
+def iter_payloads(tasks):
+    # payloads are generated lazily, the way chunks arrive from the network
+    for site_code, pollutant_name, species_code, start_str, end_str in tasks:
+        yield site_code, pollutant_name, synthetic_payload(site_code, species_code, start_str, end_str)
+
+
+def run_legacy(tasks, out_dir):
+    site_info = {"name": "Synthetic site", "lat": "51.5", "lon": "-0.1"}
+    all_records = []
+    for site_code, pollutant_name, raw in iter_payloads(tasks):
+        all_records.extend(legacy_extract_records(raw, site_code, site_info, pollutant_name))
+    df = pd.DataFrame(all_records)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    df['latitude'] = pd.to_numeric(df['latitude'], errors='coerce')
+    df['longitude'] = pd.to_numeric(df['longitude'], errors='coerce')
+    df = df.sort_values(by=["site_code", "timestamp"]).reset_index(drop=True)
+    df.to_csv(out_dir / "legacy.csv", index=False)
+    return len(df)
+
+
+def run_columnar(tasks, out_dir):
+    with store.StoreWriter(out_dir) as writer:
+        for site_code, pollutant_name, raw in iter_payloads(tasks):
+            table = laqn.extract_columns(raw, pollutant_name)
+            if table is not None:
+                writer.write(site_code, table)
+    return sum(writer.rows.values())
+
+
+def measure(name, tasks, out_dir, queue):
+    start = time.perf_counter()
+    rows = {"legacy": run_legacy, "columnar": run_columnar}[name](tasks, out_dir)
+    elapsed = time.perf_counter() - start
+    size = sum(p.stat().st_size for p in out_dir.rglob("*") if p.is_file())
+    queue.put((name, rows, elapsed, peak_rss_mb(), size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=4)
+    parser.add_argument("--years", type=int, default=15)
+    args = parser.parse_args()
+
+    sites = [f"S{i:03d}" for i in range(args.sites)]
+    chunks = laqn.build_date_chunks(datetime(2010, 1, 1), datetime(2010 + args.years, 1, 1))
+    tasks = laqn.build_tasks(sites, chunks)
+    print(f"{len(tasks)} synthetic chunks ({args.sites} sites, {args.years} years)")
+
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("legacy", "columnar"):
+            out_dir = Path(tmp) / name
+            out_dir.mkdir()
+            queue = ctx.Queue()
+            proc = ctx.Process(target=measure, args=(name, tasks, out_dir, queue))
+            proc.start()
+            _, rows, elapsed, peak, size = queue.get()
+            proc.join()
+            print(f"{name:<9} rows={rows:>10,}  {elapsed:7.2f}s  peak_rss={peak:8.1f} MB  on_disk={size / 2**20:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Throughput benchmark for the LAQN downloader against the local stand-in server.
+
+Compares the old layout (one worker per site, chunks fetched one after another)
+with the task-level scheduler in fetch_data_Laqn.py.
+
+    python -m benchmarks.bench_laqn_fetch --latency 0.2 --error-rate 0.05
+"""
+import argparse
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import fetch_data_Laqn as laqn
+from benchmarks.laqn_stub_server import StubServer
+from src.http_utils import HostLimiter
+
+
+def run_per_site(session, tasks, base_url, cache_dir, max_workers=4):
+    """The previous behaviour: one pool task per site, chunks fetched serially inside it."""
+    by_site = {}
+    for task in tasks:
+        by_site.setdefault(task[0], []).append(task)
+
+    def process_site(site_tasks):
+        ok = 0
+        for site_code, _, species_code, start_str, end_str in site_tasks:
+            raw = laqn.fetch_data_chunk(session, site_code, species_code, start_str, end_str,
+                                        base_url=base_url, cache_dir=cache_dir)
+            ok += raw is not None
+        return ok
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return sum(executor.map(process_site, by_site.values()))
+
+
+def run_task_level(session, tasks, base_url, cache_dir, limiter, max_workers):
+    ok = 0
+    for _, raw in laqn.download_chunks(session, tasks, limiter, base_url=base_url,
+                                       cache_dir=cache_dir, max_workers=max_workers,
+                                       show_progress=False):
+        ok += raw is not None
+    return ok
+
+
+def timed(label, fn, n_tasks, server):
+    before = server.state.requests
+    server.state.max_in_flight = 0
+    start = time.perf_counter()
+    ok = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {elapsed:8.2f}s  {n_tasks / elapsed:8.1f} chunks/s  "
+          f"ok={ok}/{n_tasks}  requests={server.state.requests - before}  "
+          f"max_in_flight={server.state.max_in_flight}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=4)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="share of requests answered with 503")
+    parser.add_argument("--workers", type=int, default=laqn.MAX_WORKERS)
+    parser.add_argument("--per-host", type=int, default=laqn.MAX_PER_HOST)
+    parser.add_argument("--rate", type=float, default=0, help="requests per second, 0 disables the limiter")
+    args = parser.parse_args()
+
+    sites = [f"S{i:03d}" for i in range(args.sites)]
+    chunks = laqn.build_date_chunks(datetime(2010, 1, 1), datetime(2010 + args.years, 1, 1))
+    tasks = laqn.build_tasks(sites, chunks)
+    print(f"{len(tasks)} chunks ({args.sites} sites x {len(laqn.POLLUTANTS)} species x {len(chunks)} windows), "
+          f"latency={args.latency}s, error_rate={args.error_rate}")
+
+    with StubServer(latency=args.latency, error_rate=args.error_rate) as server:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_dir = Path(tmp) / "per_site"
+            cache_dir.mkdir()
+            session = laqn.create_session(pool_size=4, backoff_factor=0.05)
+            serial = timed("per-site", lambda: run_per_site(session, tasks, server.base_url, cache_dir),
+                           len(tasks), server)
+
+            cache_dir = Path(tmp) / "task_level"
+            cache_dir.mkdir()
+            limiter = HostLimiter(args.per_host, rate=args.rate, burst=args.per_host)
+            session = laqn.create_session(pool_size=args.workers, backoff_factor=0.05, limiter=limiter)
+            concurrent = timed("task-level",
+                               lambda: run_task_level(session, tasks, server.base_url, cache_dir,
+                                                      limiter, args.workers),
+                               len(tasks), server)
+
+    print(f"speed-up: {serial / concurrent:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
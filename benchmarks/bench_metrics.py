@@ -0,0 +1,86 @@
+"""
+Overhead of src/metrics.py: the cost of a span (written to a scratch file) and of a
+counter increment with metrics on (AIRQ_METRICS=1) and off (unset), and the time the
+profilers AIRQ_PROFILE switches on add to a pandas workload the size of one site-year.
+
+    python -m benchmarks.bench_metrics --spans 20000
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src import metrics
+
+
+def per_call_us(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def empty_span():
+    with metrics.span("bench", site="BL0"):
+        pass
+
+
+def one_count():
+    metrics.count("bench")
+
+
+def workload(rows=8760):
+    """Roughly one site-year of the build: a merge, a groupby fill and a sort."""
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2020-01-01", periods=rows, freq="h", tz="UTC")
+    left = pd.DataFrame({"date": dates, "site_code": "BL0", "NO2": rng.random(rows)})
+    right = pd.DataFrame({"date": dates, "site_code": "BL0", "temperature_2m": rng.random(rows)})
+    df = left.merge(right, on=["date", "site_code"])
+    df["year"] = df["date"].dt.year
+    df["NO2"] = df.groupby("year")["NO2"].transform(lambda s: s.ffill().bfill())
+    return df.sort_values("date")
+
+
+def timed_workload(repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        workload()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spans", type=int, default=20000)
+    parser.add_argument("--repeats", type=int, default=30, help="workload runs per profiler mode")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # metrics read AIRQ_METRICS once at import; the module's switches are flipped here instead
+        metrics.PATH, metrics.ENABLED = str(Path(tmp) / "metrics.jsonl"), True
+        metrics.PROFILE_DIR = Path(tmp) / "profiles"
+        on_span, on_count = per_call_us(empty_span, args.spans), per_call_us(one_count, args.spans)
+        metrics.ENABLED = False
+        off_span, off_count = per_call_us(empty_span, args.spans), per_call_us(one_count, args.spans)
+
+        print(f"{'':<14} {'span us':>9} {'count us':>9}")
+        print(f"{'metrics on':<14} {on_span:9.2f} {on_count:9.3f}")
+        print(f"{'metrics off':<14} {off_span:9.2f} {off_count:9.3f}")
+
+        metrics.ENABLED = True
+        timed_workload(2)
+        base = timed_workload(args.repeats)
+        print(f"\n{args.repeats} site-year workloads: {base:.2f}s unprofiled")
+        for mode in ["sample", "cprofile"]:
+            os.environ["AIRQ_PROFILE"] = mode
+            with metrics.entry_point("bench"):
+                seconds = timed_workload(args.repeats)
+            print(f"AIRQ_PROFILE={mode:<9} {seconds:.2f}s ({seconds / base - 1:+.0%})")
+        os.environ.pop("AIRQ_PROFILE")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+File size, load time and training-time memory of the model-ready dataset, written
+with pandas' inferred dtypes against the typed schema in src/config.py.
+
+inferred: float64 measurements, int64 flags, object site columns, road dummies,
+          written with DataFrame.to_parquet defaults (the old build output)
+typed:    cfg.MODEL_DTYPES via apply_model_schema, written by write_model_ready
+
+For each file, in a fresh process:
+  load:  pd.read_parquet of the whole file
+  train: load, then the notebooks' preparation (drop missing targets, sort, pick
+         the feature columns) and a constructed LightGBM Dataset
+  site:  one site read through the row-group statistics (typed only)
+
+    python -m benchmarks.bench_model_schema --sites 20 --years 5
+"""
+import argparse
+import multiprocessing as mp
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from build_model_dataset import apply_model_schema, write_model_ready
+from src import config as cfg
+from src.resources import peak_rss_mb
+
+TARGETS = ['NO2', 'PM2.5']
+NOT_FEATURES = TARGETS + ['date', 'site_code', 'site_name']
+
+
+def synthetic_frame(n_sites, years, seed=0):
+    """Rows as the build produces them, measurements rounded like the LAQN and Open-Meteo values."""
+    rng = np.random.default_rng(seed)
+    hours = pd.date_range("2010-01-01", periods=years * 8760, freq="h", tz="UTC")
+    n = len(hours) * n_sites
+    df = pd.DataFrame({"date": np.tile(hours, n_sites),
+                       "site_code": np.repeat([f"S{i:03d}" for i in range(n_sites)], len(hours))})
+    df["site_name"] = "Site " + df["site_code"]
+    df["latitude"] = np.repeat(rng.uniform(51.3, 51.7, n_sites), len(hours))
+    df["longitude"] = np.repeat(rng.uniform(-0.5, 0.3, n_sites), len(hours))
+    for col, dtype in cfg.MODEL_DTYPES.items():
+        if col in df.columns:
+            continue
+        if dtype == 'float32':
+            df[col] = rng.gamma(4, 8, n).round(1)
+        elif col == 'weather_code':
+            df[col] = rng.integers(0, 80, n)
+    df["year"] = df["date"].dt.year
+    df["aadf_vehicle_count"] = np.repeat(rng.integers(1000, 50000, n_sites), len(hours)).astype(float)
+    df["road_type"] = np.repeat(rng.choice(["Major", "Minor"], n_sites), len(hours))
+    local = df["date"].dt.tz_convert("Europe/London")
+    df["month"], df["day_of_week"], df["hour"] = local.dt.month, local.dt.dayofweek, local.dt.hour
+    df["is_weekend"] = (df["day_of_week"] >= 5).astype(int)
+    for col in ("is_holiday", "is_rush_hour", "is_ulez", "is_lockdown"):
+        df[col] = rng.integers(0, 2, n)
+    return df
+
+
+def write_files(root, n_sites, years):
+    df = synthetic_frame(n_sites, years)
+    inferred, typed = root / "inferred.parquet", root / "typed.parquet"
+    pd.get_dummies(df, columns=["road_type"], prefix="road").to_parquet(inferred, index=False)
+    write_model_ready(apply_model_schema(df), typed)
+    return inferred, typed
+
+
+def run_load(path):
+    return pd.read_parquet(path)
+
+
+def run_train(path):
+    import lightgbm as lgb
+    df = pd.read_parquet(path)
+    df = df.dropna(subset=TARGETS).sort_values(["site_code", "date"])
+    features = [col for col in df.columns if col not in NOT_FEATURES]
+    dataset = lgb.Dataset(df[features], label=df["NO2"], params={"verbose": -1})
+    dataset.construct()
+    return df
+
+
+def run_site(path):
+    return pd.read_parquet(path, filters=[("site_code", "==", "S000")])
+
+
+def measure(name, path, queue):
+    start = time.perf_counter()
+    df = {"load": run_load, "train": run_train, "site": run_site}[name](path)
+    elapsed = time.perf_counter() - start
+    queue.put((len(df), df.memory_usage(deep=True).sum() / 2**20, elapsed, peak_rss_mb()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=20)
+    parser.add_argument("--years", type=int, default=5)
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        files = dict(zip(("inferred", "typed"), write_files(Path(tmp), args.sites, args.years)))
+        for label, path in files.items():
+            print(f"{label:<9} file {path.stat().st_size / 2**20:8.1f} MB")
+
+        print(f"\n{'file':<9} {'run':<6} {'rows':>10} {'frame_mb':>9} {'seconds':>8} {'peak_rss_mb':>12}")
+        runs = [(label, name) for label in files for name in ("load", "train")] + [("typed", "site")]
+        for label, name in runs:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=measure, args=(name, files[label], queue))
+            proc.start()
+            rows, frame_mb, elapsed, peak = queue.get()
+            proc.join()
+            print(f"{label:<9} {name:<6} {rows:10,} {frame_mb:9.1f} {elapsed:8.2f} {peak:12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Times every pipeline stage and measures its peak memory on seeded synthetic inputs
+(benchmarks/synthetic_inputs.py), from 4 sites × 1 year up to 500 sites × 15 years, and
+saves the results as JSON so runs can be compared.
+
+The scripts and src/ are copied into a scratch tree with the synthetic data, so
+src/config.py resolves every path under it. The stages are run_pipeline.py's in README
+order, minus the two network fetches the generator stands in for, plus train: the
+LightGBM notebook's halving search over its lag features, for the first --train-sites
+sites. Each stage runs alone, in its own process.
+
+seconds:        wall time of the stage's process
+peak_rss_mb:    peak RSS of the stage's own process (VmHWM where there is one)
+workers_mb:     peak RSS of the largest worker process it started, if any
+tree_pss_mb:    peak summed PSS of the stage's whole process tree, sampled every 200 ms
+output_mb:      size of the stage's outputs on disk
+
+    python -m benchmarks.bench_pipeline --scale medium
+    python -m benchmarks.bench_pipeline --scale medium --compare benchmarks/results/<earlier run>.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.bench_halving import PARAM_DIST
+from benchmarks.bench_training import TreeMemory
+from benchmarks.synthetic_inputs import under, write_inputs
+from run_pipeline import FETCH_STAGES, build_stages
+from src import config as cfg
+from src import imputation
+from src.pipeline import expand
+from src.training import CACHE_DIR
+
+SCALES = {"tiny": (4, 1), "small": (20, 3), "medium": (100, 5), "large": (250, 10), "full": (500, 15)}
+RESULTS_DIR = cfg.ROOT / "benchmarks" / "results"
+PACKAGES = ["numpy", "pandas", "pyarrow", "scikit-learn", "lightgbm"]
+
+# runs a stage script as __main__ and records its peak memory, even when it fails
+MEASURE = """
+import json, runpy, sys
+from src.resources import peak_rss_mb
+script, out = sys.argv[1], sys.argv[2]
+sys.argv = [script] + sys.argv[3:]
+try:
+    runpy.run_path(script, run_name="__main__")
+finally:
+    try:
+        import resource
+        workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / (2**20 if sys.platform == "darwin" else 2**10)
+    except ImportError:
+        workers = None
+    with open(out, "w") as f:
+        json.dump({"peak_rss_mb": peak_rss_mb(), "workers_mb": workers or None}, f)
+"""
+
+TRAIN = """
+import json, sys
+import pandas as pd
+from src import config as cfg
+from src.features import FeatureSpec, add_features
+from src.training import CACHE_DIR, FoldCache, halving_search
+
+if __name__ == "__main__":
+    sites, n_candidates, path = json.loads(sys.argv[1]), int(sys.argv[2]), sys.argv[3]
+    param_dist = json.loads(sys.argv[4])
+    spec = FeatureSpec(lags=(24, 12))
+    df = pd.read_parquet(path, filters=[('site_code', 'in', sites)])
+    df = df.dropna(subset=['NO2', 'PM2.5']).sort_values(['site_code', 'date'])
+    df = add_features(df, spec).dropna(subset=spec.names()).sort_values('date', kind='stable')
+    features = [col for col in df.columns if col not in ['NO2', 'PM2.5', 'date', 'site_code', 'site_name']]
+    train = df['date'] < df['date'].quantile(0.8)
+    cache = FoldCache.build(df.loc[train, features], df.loc[train, ['NO2', 'PM2.5']], CACHE_DIR / "bench")
+    result = halving_search(cache, param_dist, n_candidates=n_candidates, random_state=42)
+    print(result.summary())
+    for target in ['NO2', 'PM2.5']:
+        scores = result.fold_scores(target)
+        print(f"{target}: {train.sum():,} training rows, best mean fold R² {sum(scores) / len(scores):.3f}")
+"""
+
+
+def scratch_tree(root):
+    for script in cfg.ROOT.glob("*.py"):
+        shutil.copy(script, root)
+    shutil.copytree(cfg.ROOT / "src", root / "src", ignore=shutil.ignore_patterns("__pycache__", "eda", "data"))
+    (root / "bench_train.py").write_text(TRAIN)
+
+
+def stage_commands(root, sites, args):
+    """(name, script and arguments, outputs under root) for every stage the suite runs, in order."""
+    stages = build_stages(args.impute_mode, args.workers, args.traffic, streaming=args.streaming)
+    commands = [(stage.name, [stage.script] + stage.args, [under(root, p) for p in stage.outputs])
+                for stage in stages if stage.name not in FETCH_STAGES]
+    dataset = cfg.MODEL_READY_DIR if args.streaming else cfg.MODEL_READY
+    commands.append(("train", ["bench_train.py", json.dumps(sites[:args.train_sites]), str(args.candidates),
+                               str(under(root, dataset)), json.dumps(PARAM_DIST)],
+                     [under(root, CACHE_DIR)]))
+    return commands
+
+
+def run_stage(root, name, command, outputs):
+    logs = root / "logs"
+    logs.mkdir(exist_ok=True)
+    measured = logs / f"{name}.json"
+    with open(logs / f"{name}.log", 'w') as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, "-c", MEASURE, command[0], str(measured)] + command[1:],
+                                cwd=root, stdout=log, stderr=subprocess.STDOUT)
+        with TreeMemory(pid=proc.pid) as memory:
+            proc.wait()
+        seconds = time.perf_counter() - start
+
+    result = {"name": name, "status": "ok" if proc.returncode == 0 else "failed", "seconds": round(seconds, 3)}
+    if measured.exists():
+        result.update({k: round(v, 1) if v is not None else None for k, v in json.loads(measured.read_text()).items()})
+    files = [f for path in outputs for f in expand(path) if f.is_file()]
+    result["tree_pss_mb"] = round(memory.peak, 1)
+    result["output_mb"] = round(sum(f.stat().st_size for f in files) / 2**20, 1)
+    return result
+
+
+def environment():
+    from importlib.metadata import PackageNotFoundError, version
+    packages = {}
+    for name in PACKAGES:
+        try:
+            packages[name] = version(name)
+        except PackageNotFoundError:
+            packages[name] = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=cfg.ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=cfg.ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+    except OSError:
+        commit, dirty = None, None
+    return {"commit": commit, "dirty": dirty, "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "packages": packages}
+
+
+def print_results(results, previous=None):
+    before = {stage["name"]: stage for stage in (previous or {}).get("stages", [])}
+    print(f"\n{'stage':<16} {'status':<7} {'seconds':>9} {'peak_rss_mb':>11} {'workers_mb':>10} "
+          f"{'tree_pss_mb':>11} {'output_mb':>9}" + (f" {'was_s':>9} {'ratio':>6} {'was_mb':>8}" if previous else ""))
+    for stage in results["stages"]:
+        line = (f"{stage['name']:<16} {stage['status']:<7} {stage['seconds']:9.2f} "
+                f"{stage.get('peak_rss_mb') or 0:11.0f} {stage.get('workers_mb') or 0:10.0f} "
+                f"{stage['tree_pss_mb']:11.0f} {stage['output_mb']:9.1f}")
+        old = before.get(stage['name'])
+        if old:
+            line += (f" {old['seconds']:9.2f} {stage['seconds'] / max(old['seconds'], 1e-9):6.2f} "
+                     f"{old.get('peak_rss_mb') or 0:8.0f}")
+        print(line)
+    print(f"{'total':<16} {'':<7} {sum(s['seconds'] for s in results['stages']):9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=list(SCALES), default="tiny",
+                        help=", ".join(f"{name}: {s} sites × {y} years" for name, (s, y) in SCALES.items()))
+    parser.add_argument("--sites", type=int, default=None, help="overrides the scale's sites")
+    parser.add_argument("--years", type=int, default=None, help="overrides the scale's years")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", nargs="+", default=None, metavar="STAGE",
+                        help="only report these (stages before them still run, to make their inputs)")
+    parser.add_argument("--impute-mode", choices=["windowed", "fast", "knn"], default=imputation.IMPUTE_MODE)
+    parser.add_argument("--workers", type=int, default=imputation.MAX_WORKERS, help="sites cleaned in parallel")
+    parser.add_argument("--traffic", choices=["nearest", "idw"], default="nearest")
+    parser.add_argument("--streaming", action="store_true", help="build the dataset with --streaming")
+    parser.add_argument("--train-sites", type=int, default=2, help="sites in the train stage (the notebooks use 2)")
+    parser.add_argument("--candidates", type=int, default=9, help="halving search candidates (the notebooks use 27)")
+    parser.add_argument("--out", default=None, help="results JSON (default benchmarks/results/<scale>-<time>.json)")
+    parser.add_argument("--compare", default=None, help="an earlier results JSON to compare against")
+    parser.add_argument("--keep", default=None, help="build the scratch tree here and keep it")
+    args = parser.parse_args()
+
+    n_sites, years = SCALES[args.scale]
+    n_sites, years = args.sites or n_sites, args.years or years
+    previous = json.loads(Path(args.compare).read_text()) if args.compare else None
+    results = {"suite": "pipeline", "created": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+               "environment": environment(),
+               "options": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "keep")}}
+
+    tmp = None if args.keep else tempfile.TemporaryDirectory()
+    root = Path(args.keep or tmp.name)
+    try:
+        root.mkdir(parents=True, exist_ok=True)
+        scratch_tree(root)
+        start = time.perf_counter()
+        results["inputs"] = write_inputs(root, n_sites, years, args.seed)
+        results["inputs"]["seconds"] = round(time.perf_counter() - start, 1)
+        print(f"{n_sites} sites × {years} years: {results['inputs']}")
+
+        sites = [f"S{i:03d}" for i in range(n_sites)]
+        results["stages"] = []
+        for name, command, outputs in stage_commands(root, sites, args):
+            result = run_stage(root, name, command, outputs)
+            print(f"{name}: {result['status']} in {result['seconds']:.1f}s", flush=True)
+            if args.stages is None or name in args.stages:
+                results["stages"].append(result)
+            if result["status"] != "ok":
+                print((root / "logs" / f"{name}.log").read_text()[-3000:])
+                break
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{args.scale}-{n_sites}x{years}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=1))
+    print_results(results, previous)
+    print(f"\nresults saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
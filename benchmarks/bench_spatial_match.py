@@ -0,0 +1,97 @@
+"""
+Site-to-count-point matching: the dense haversine matrix + argmin against the
+BallTree index, on synthetic GB-wide count points.
+
+dense: vectorized_haversine, the matcher's previous approach, builds the full
+       queries x points matrix
+tree:  PointIndex build plus a k-nearest query (and a radius query)
+
+Each variant runs in a fresh process; nearest matches are checked against dense.
+Dense is skipped when its matrix would exceed --dense-max-mb.
+
+    python -m benchmarks.bench_spatial_match --points 200000 --queries 2000
+"""
+import argparse
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+from src import spatial
+from src.resources import peak_rss_mb
+
+
+def vectorized_haversine(lat1, lon1, lat2, lon2):
+    """Great-circle km between every (lat1, lon1) and every (lat2, lon2), as a dense matrix."""
+    R = 6371
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1.reshape(-1, 1)
+    dlon = lon2 - lon1.reshape(-1, 1)
+    a = np.sin(dlat / 2)**2 + np.cos(lat1).reshape(-1, 1) * np.cos(lat2) * np.sin(dlon / 2)**2
+    c = 2 * np.arcsin(np.sqrt(a))
+    return R * c
+
+
+def synthetic_points(n_points, n_queries, seed=0):
+    rng = np.random.default_rng(seed)
+    # count points across GB, queries clustered over London like the LAQN network
+    points = (50.0 + rng.random(n_points) * 8.5, -5.5 + rng.random(n_points) * 7.2)
+    queries = (51.3 + rng.random(n_queries) * 0.4, -0.5 + rng.random(n_queries) * 0.7)
+    return points, queries
+
+
+def run_dense(points, queries, k, radius_km):
+    distance_matrix = vectorized_haversine(queries[0], queries[1], points[0], points[1])
+    return np.argmin(distance_matrix, axis=1), np.min(distance_matrix, axis=1), None
+
+
+def run_tree(points, queries, k, radius_km):
+    index = spatial.PointIndex(points[0], points[1])
+    dist, idx = index.nearest(queries[0], queries[1], k=k)
+    within, _ = index.within(queries[0], queries[1], radius_km)
+    return idx[:, 0], dist[:, 0], float(np.mean([len(d) for d in within]))
+
+
+def measure(name, n_points, n_queries, k, radius_km, queue):
+    points, queries = synthetic_points(n_points, n_queries)
+    start = time.perf_counter()
+    nearest, dist, mean_within = {"dense": run_dense, "tree": run_tree}[name](points, queries, k, radius_km)
+    queue.put((nearest, dist, mean_within, time.perf_counter() - start, peak_rss_mb()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--radius-km", type=float, default=3.0)
+    parser.add_argument("--dense-max-mb", type=float, default=4096)
+    args = parser.parse_args()
+
+    # a handful of float64 temporaries of the full matrix are alive at once
+    dense_mb = args.points * args.queries * 8 * 6 / 2**20
+    print(f"{args.points:,} count points, {args.queries:,} query sites (dense matrix ~{dense_mb:,.0f} MB)")
+
+    ctx = mp.get_context("spawn")
+    results = {}
+    for name in ("dense", "tree"):
+        if name == "dense" and dense_mb > args.dense_max_mb:
+            print("dense    skipped")
+            continue
+        queue = ctx.Queue()
+        proc = ctx.Process(target=measure, args=(name, args.points, args.queries, args.k, args.radius_km, queue))
+        proc.start()
+        nearest, dist, mean_within, elapsed, peak = queue.get()
+        proc.join()
+        results[name] = (nearest, dist)
+        extra = f"  mean points within {args.radius_km:g} km={mean_within:.1f}" if mean_within is not None else ""
+        print(f"{name:<8} {elapsed:7.2f}s  peak_rss={peak:8.1f} MB{extra}")
+
+    if "dense" in results:
+        np.testing.assert_allclose(results["tree"][1], results["dense"][1], rtol=1e-9, atol=1e-9)
+        print(f"nearest distances match; same point chosen for "
+              f"{(results['tree'][0] == results['dense'][0]).mean():.1%} of queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Time to get the two derived traffic tables out of a synthetic DfT AADF file
+with the national file's 34 columns.
+
+legacy: pandas read_csv of every column (low_memory=False), then the groupby
+        mean and the count-point drop_duplicates
+build:  pyarrow multithreaded read of six columns, aggregated and persisted
+cached: source unchanged, both tables read back from the index
+
+Each variant runs in a fresh process; the tables are checked against legacy.
+
+    python -m benchmarks.bench_traffic_index --rows 500000
+"""
+import argparse
+import multiprocessing as mp
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src import traffic_index
+from src.resources import peak_rss_mb
+
+TEXT_COLUMNS = ['region_name', 'region_ons_code', 'local_authority_name', 'local_authority_code', 'road_name',
+                'road_category', 'start_junction_road_name', 'end_junction_road_name', 'estimation_method',
+                'estimation_method_detailed']
+COUNT_COLUMNS = ['pedal_cycles', 'two_wheeled_motor_vehicles', 'cars_and_taxis', 'buses_and_coaches', 'lgvs',
+                 'hgvs_2_rigid_axle', 'hgvs_3_rigid_axle', 'hgvs_4_or_more_rigid_axle',
+                 'hgvs_3_or_4_articulated_axle', 'hgvs_5_articulated_axle', 'hgvs_6_articulated_axle', 'all_hgvs']
+
+
+def write_synthetic_aadf(path, n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    n_points = max(n_rows // 12, 1)
+    point = rng.integers(0, n_points, n_rows)
+    lat = 50 + rng.random(n_points) * 5
+    lon = -5 + rng.random(n_points) * 6
+    df = pd.DataFrame({'count_point_id': 1000 + point, 'year': rng.integers(2000, 2025, n_rows),
+                       'region_id': rng.integers(1, 12, n_rows), 'local_authority_id': rng.integers(1, 200, n_rows)})
+    for col in TEXT_COLUMNS:
+        df[col] = np.array([f"{col} {i}" for i in range(50)])[rng.integers(0, 50, n_rows)]
+    df['road_type'] = np.where(point % 3 == 0, 'Major', 'Minor')
+    df['easting'] = rng.integers(100000, 600000, n_rows)
+    df['northing'] = rng.integers(100000, 600000, n_rows)
+    df['latitude'] = lat[point].round(6)
+    df['longitude'] = lon[point].round(6)
+    # some rows without coordinates, as in the real file
+    df.loc[rng.random(n_rows) < 0.02, ['latitude', 'longitude']] = np.nan
+    df['link_length_km'] = rng.random(n_rows).round(2)
+    df['link_length_miles'] = (df['link_length_km'] * 0.621).round(2)
+    for col in COUNT_COLUMNS:
+        df[col] = rng.integers(0, 5000, n_rows)
+    df['all_motor_vehicles'] = rng.integers(100, 100000, n_rows)
+    df.to_csv(path, index=False)
+
+
+def run_legacy(source, index_dir):
+    dft_df = pd.read_csv(source, low_memory=False)
+    aadf = dft_df.groupby(['count_point_id', 'year'])['all_motor_vehicles'].mean().reset_index()
+    points = dft_df[traffic_index.POINT_COLUMNS].dropna().drop_duplicates('count_point_id').reset_index(drop=True)
+    return aadf, points
+
+
+def run_index(source, index_dir):
+    traffic_index.ensure_index(source, index_dir)
+    return traffic_index.load_aadf(source=source, index_dir=index_dir), \
+        traffic_index.load_count_points(source=source, index_dir=index_dir)
+
+
+def measure(name, source, index_dir, queue):
+    start = time.perf_counter()
+    aadf, points = {"legacy": run_legacy, "build": run_index, "cached": run_index}[name](source, index_dir)
+    elapsed = time.perf_counter() - start
+    queue.put((aadf, points, elapsed, peak_rss_mb()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500_000)
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        source, index_dir = Path(tmp) / "dft_traffic_counts_aadf.csv", Path(tmp) / "index"
+        write_synthetic_aadf(source, args.rows)
+        print(f"synthetic AADF file: {args.rows:,} rows, {source.stat().st_size / 2**20:.1f} MB")
+
+        results = {}
+        for name in ("legacy", "build", "cached"):
+            queue = ctx.Queue()
+            proc = ctx.Process(target=measure, args=(name, source, index_dir, queue))
+            proc.start()
+            aadf, points, elapsed, peak = queue.get()
+            proc.join()
+            results[name] = (aadf, points)
+            print(f"{name:<7} {elapsed:7.2f}s  peak_rss={peak:8.1f} MB")
+
+        legacy_aadf, legacy_points = results["legacy"]
+        for name in ("build", "cached"):
+            aadf, points = results[name]
+            pd.testing.assert_frame_equal(aadf, legacy_aadf, check_dtype=False)
+            pd.testing.assert_frame_equal(points, legacy_points, check_dtype=False, check_categorical=False)
+        size = sum(p.stat().st_size for p in index_dir.glob("*.parquet"))
+        print(f"index tables match legacy; {size / 2**20:.2f} MB on disk")
+
+
+if __name__ == "__main__":
+    main()
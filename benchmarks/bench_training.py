@@ -0,0 +1,153 @@
+"""
+Hyperparameter search for both targets on synthetic model-ready rows.
+
+notebook: one RandomizedSearchCV(n_jobs=-1) per target around LGBMRegressor(n_jobs=-1),
+          as LightGBM.ipynb runs it (joblib hands every worker its own copy of X)
+harness:  src.training.search over a memory-mapped FoldCache and Dataset binaries
+          binned once, for several splits of the cores between workers and model threads
+
+Wall time and the peak summed PSS of the whole process tree (sampled every 200 ms) are
+measured the same way for every configuration. PSS splits shared pages (the memory-mapped
+folds) between the processes mapping them, where summed RSS would count them in each.
+Each run starts in a fresh process.
+
+    python -m benchmarks.bench_training --rows 200000 --n-iter 6
+"""
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import psutil
+
+PARAM_DIST = {
+    'n_estimators': [100, 200],
+    'learning_rate': [0.05, 0.08],
+    'num_leaves': [31, 63],
+    'min_data_in_leaf': [20, 50, 100],
+    'subsample': [0.8, 0.9],
+    'colsample_bytree': [0.8, 0.9],
+    'reg_lambda': [0.0, 1.0],
+}
+TARGETS = ['NO2', 'PM2.5']
+
+
+def synthetic_xy(rows, n_features=30, seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(rows, n_features)).astype(np.float32),
+                     columns=[f"f{i}" for i in range(n_features)])
+    X['road_type'] = pd.Categorical(rng.choice(['Major', 'Minor'], rows))
+    y = pd.DataFrame({'NO2': 3 * X['f0'] + X['f1'] ** 2 + rng.normal(size=rows),
+                      'PM2.5': 2 * X['f2'] - X['f3'] + rng.normal(size=rows)})
+    return X, y
+
+
+class TreeMemory:
+    """
+    Samples the summed PSS (RSS where PSS isn't available) of a process (default this
+    one) and its descendants.
+    """
+
+    def __init__(self, interval=0.2, pid=None):
+        self.interval = interval
+        self.pid = pid
+        self.peak = 0.0
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self):
+        try:
+            proc = psutil.Process(self.pid)
+        except psutil.Error:
+            return
+        while not self.stop.is_set():
+            total = 0
+            try:
+                tree = [proc] + proc.children(recursive=True)
+            except psutil.Error:
+                tree = []
+            for p in tree:
+                try:
+                    info = p.memory_full_info()
+                    total += getattr(info, "pss", info.rss)
+                except psutil.Error:
+                    pass
+            self.peak = max(self.peak, total / 2**20)
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+
+
+def run_notebook(rows, n_iter, workers, threads, cache_dir):
+    from lightgbm import LGBMRegressor
+    from sklearn.model_selection import RandomizedSearchCV, TimeSeriesSplit
+    X, y = synthetic_xy(rows)
+    best = {}
+    for target in TARGETS:
+        searcher = RandomizedSearchCV(LGBMRegressor(random_state=42, n_jobs=-1, verbose=-1), PARAM_DIST,
+                                      n_iter=n_iter, cv=TimeSeriesSplit(n_splits=5), scoring='r2',
+                                      n_jobs=-1, random_state=42)
+        searcher.fit(X, y[target])
+        best[target] = searcher.best_score_
+    return best
+
+
+def run_harness(rows, n_iter, workers, threads, cache_dir):
+    from src.training import FoldCache, search
+    X, y = synthetic_xy(rows)
+    cache = FoldCache.build(X, y, cache_dir)
+    del X, y
+    result = search(cache, "lgbm", PARAM_DIST, n_iter, search_workers=workers, model_threads=threads)
+    return {target: result.scores[target][result.best_index[target]].mean() for target in TARGETS}
+
+
+def measure(name, rows, n_iter, workers, threads, cache_dir, queue):
+    run = {"notebook": run_notebook, "harness": run_harness}[name]
+    with TreeMemory() as memory:
+        start = time.perf_counter()
+        best = run(rows, n_iter, workers, threads, cache_dir)
+        elapsed = time.perf_counter() - start
+    queue.put((elapsed, memory.peak, best))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--n-iter", type=int, default=6)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    configs = [("notebook", None, None), ("harness", 1, cores)]
+    if cores > 1:
+        configs += [("harness", cores, 1)]
+    if cores >= 4:
+        configs += [("harness", 2, cores // 2)]
+    print(f"{args.rows:,} rows, {args.n_iter} candidates × 5 folds × {len(TARGETS)} targets, {cores} cores")
+    print(f"{'run':<9} {'workers':>7} {'threads':>7} {'seconds':>8} {'peak_pss_mb':>12}  best mean R2")
+
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, workers, threads in configs:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=measure, args=(name, args.rows, args.n_iter, workers, threads,
+                                                     Path(tmp) / "folds", queue))
+            proc.start()
+            elapsed, peak, best = queue.get()
+            proc.join()
+            scores = "  ".join(f"{t} {s:.3f}" for t, s in best.items())
+            print(f"{name:<9} {workers or '-':>7} {threads or '-':>7} {elapsed:8.1f} {peak:12.0f}  {scores}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Batch prediction with the notebooks' models, native predict against src.tree_inference
+tables, on the model-ready dataset (the lag features added as the notebooks add them,
+the last fifth of the dates held out as the test years).
+
+native: RandomForestRegressor.predict / LGBMRegressor.predict on the DataFrame
+table:  compile_model(model) once, then TreeTable.predict on the same DataFrame
+
+Rows per second are for predicting the test and the training rows. Memory is the model
+itself (pickled size against TreeTable.nbytes) and the peak of what predict allocates
+through numpy, traced by tracemalloc (LightGBM's own C++ buffers are not seen). max_diff
+is the largest |native - table| over the rows.
+
+    python -m benchmarks.bench_tree_inference --trees 300 --threads 1
+"""
+import argparse
+import pickle
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from lightgbm import LGBMRegressor
+from sklearn.ensemble import RandomForestRegressor
+
+from benchmarks.bench_model_schema import synthetic_frame
+from build_model_dataset import apply_model_schema
+from src import config as cfg
+from src.calendar_table import add_calendar_features
+from src.features import FeatureSpec, add_features
+from src.tree_inference import compile_model
+
+TARGET = 'NO2'
+NOT_FEATURES = ['NO2', 'PM2.5', 'date', 'site_code', 'site_name']
+TEST_SHARE = 0.2
+
+
+def load_rows(path, sites, years):
+    if path.exists():
+        df = pd.read_parquet(path)
+        source = str(path.relative_to(cfg.ROOT))
+    else:
+        df = apply_model_schema(add_calendar_features(synthetic_frame(sites, years)))
+        source = f"synthetic ({sites} sites × {years} years; {path.name} not found)"
+    df = df.dropna(subset=['NO2', 'PM2.5']).sort_values(['site_code', 'date'])
+    df = add_features(df, FeatureSpec(lags=(24, 12))).dropna()
+    split = df['date'].quantile(1 - TEST_SHARE)
+    return df, df['date'] < split, source
+
+
+def traced(func):
+    """(result, seconds, peak MB allocated through numpy during the call)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=str(cfg.MODEL_READY))
+    parser.add_argument("--sites", type=int, default=4, help="synthetic sites when --data is missing")
+    parser.add_argument("--years", type=int, default=3, help="synthetic years when --data is missing")
+    parser.add_argument("--trees", type=int, default=100, help="random forest trees (the notebooks use up to 300)")
+    parser.add_argument("--threads", type=int, default=None, help="native n_jobs and table threads (default all cores)")
+    args = parser.parse_args()
+
+    df, train_mask, source = load_rows(cfg.ROOT / args.data, args.sites, args.years)
+    features = [col for col in df.columns if col not in NOT_FEATURES]
+    n_jobs = args.threads or -1
+    print(f"{source}: {train_mask.sum():,} training rows, {(~train_mask).sum():,} test rows, "
+          f"{len(features)} features")
+
+    # the random forest notebook one-hot encodes road_type, LightGBM takes the categorical
+    X_rf = pd.get_dummies(df[features], columns=['road_type'], prefix='road')
+    models = {
+        f"rf_{args.trees}": (RandomForestRegressor(n_estimators=args.trees, max_depth=30, min_samples_leaf=15,
+                                                   n_jobs=n_jobs, random_state=42), X_rf),
+        "lgbm_600": (LGBMRegressor(n_estimators=600, num_leaves=63, learning_rate=0.05, n_jobs=n_jobs,
+                                   random_state=42, verbose=-1), df[features]),
+    }
+
+    print(f"\n{'model':<9} {'model_mb':>8} {'table_mb':>8} {'compile_s':>9}  {'rows':<5} {'path':<6} "
+          f"{'rows/s':>10} {'peak_mb':>8} {'max_diff':>9}")
+    for name, (model, X) in models.items():
+        model.fit(X[train_mask], df.loc[train_mask, TARGET])
+        table, compile_s, _ = traced(lambda: compile_model(model))
+        model_mb, table_mb = len(pickle.dumps(model)) / 2**20, table.nbytes / 2**20
+        lead = f"{name:<9} {model_mb:8.1f} {table_mb:8.1f} {compile_s:9.2f}"
+        for rows, mask in (("test", ~train_mask), ("train", train_mask)):
+            X_rows = X[mask]
+            native, native_s, native_mb = traced(lambda: model.predict(X_rows))
+            fast, table_s, fast_mb = traced(lambda: table.predict(X_rows, n_threads=args.threads))
+            diff = np.abs(native - fast).max()
+            print(f"{lead}  {rows:<5} {'native':<6} {len(X_rows) / native_s:10,.0f} {native_mb:8.1f}")
+            print(f"{' ' * len(lead)}  {'':<5} {'table':<6} {len(X_rows) / table_s:10,.0f} {fast_mb:8.1f} "
+                  f"{diff:9.1e}")
+            lead = " " * len(lead)
+
+
+if __name__ == "__main__":
+    main()
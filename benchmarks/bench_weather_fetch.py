@@ -0,0 +1,75 @@
+"""
+Weather fetch cost with grid-cell de-duplication and multi-location batching,
+against the in-process Open-Meteo stand-in.
+
+per-site: one archive call per site, submitted one second apart (the old loop)
+batched:  one call per BATCH_SIZE unique grid cells, rate limited
+
+    python -m benchmarks.bench_weather_fetch --sites 40 --latency 0.5
+"""
+import argparse
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import fetch_weather_data as weather
+from benchmarks.openmeteo_stub import StubOpenMeteo
+from src import weather_store
+
+
+def random_sites(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{"site_code": f"S{i:03d}", "laqn_lat": 51.28 + rng.random() * 0.4,
+             "laqn_lon": -0.45 + rng.random() * 0.6} for i in range(n)]
+
+
+def run_per_site(site_list, client, store_dir, submit_delay):
+    def fetch_one(site):
+        frames = weather.fetch_weather_batch([(site["laqn_lat"], site["laqn_lon"])], client)
+        weather_store.write_site(site["site_code"], next(iter(frames.values())), store_dir)
+
+    with ThreadPoolExecutor(max_workers=weather.MAX_WORKERS) as executor:
+        futures = []
+        for site in site_list:
+            futures.append(executor.submit(fetch_one, site))
+            time.sleep(submit_delay)
+        for future in futures:
+            future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per stand-in api call")
+    parser.add_argument("--submit-delay", type=float, default=1.0, help="the old fixed sleep between sites")
+    parser.add_argument("--days", type=int, default=90,
+                        help="length of the requested series; short keeps writing out of the timing")
+    args = parser.parse_args()
+    weather.END_DATE = str((pd.Timestamp(weather.START_DATE) + pd.Timedelta(days=args.days - 1)).date())
+
+    site_list = random_sites(args.sites)
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_dir, batched_dir = Path(tmp) / "per_site", Path(tmp) / "batched"
+
+        client = StubOpenMeteo(latency=args.latency)
+        start = time.perf_counter()
+        run_per_site(site_list, client, legacy_dir, args.submit_delay)
+        print(f"per-site  {time.perf_counter() - start:7.2f}s  calls={client.calls}  locations={client.locations}")
+
+        client = StubOpenMeteo(latency=args.latency)
+        start = time.perf_counter()
+        weather.fetch_sites(site_list, client=client, store_dir=batched_dir, show_progress=False)
+        print(f"batched   {time.perf_counter() - start:7.2f}s  calls={client.calls}  locations={client.locations}")
+
+        # every site must end up with the series of its own grid cell
+        pd.testing.assert_frame_equal(weather_store.load_weather(store_dir=legacy_dir),
+                                      weather_store.load_weather(store_dir=batched_dir))
+        print(f"all {len(site_list)} site partitions match")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+On-disk size, load time and peak RSS of the weather data: the old CSV route
+against the site-partitioned Parquet store, on synthetic hourly series.
+
+csv:         per-site CSVs -> prepare (parse + concat + combined CSV) -> build re-parses it
+store:       per-site partitions -> dataset view -> load_weather
+store-slice: load_weather for a few sites and columns only
+
+Each load runs in a fresh process.
+
+    python -m benchmarks.bench_weather_store --sites 40 --years 5
+"""
+import argparse
+import multiprocessing as mp
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src import weather_store
+from src.resources import peak_rss_mb
+
+SLICE_COLUMNS = ['temperature_2m', 'wind_speed_10m']
+
+
+def synthetic_site(years, rng):
+    hours = pd.date_range("2010-01-01", periods=years * 8760, freq="h", tz="UTC")
+    frame = {"time": hours}
+    for var in weather_store.VARIABLES:
+        frame[var] = rng.normal(10, 5, len(hours)).astype(np.float32)
+    frame["weather_code"] = rng.integers(0, 80, len(hours)).astype(np.float32)
+    return pd.DataFrame(frame)
+
+
+def write_sources(root, n_sites, years, seed=0):
+    rng = np.random.default_rng(seed)
+    csv_dir, store_dir = root / "csv", root / "store"
+    csv_dir.mkdir()
+    for i in range(n_sites):
+        frame = synthetic_site(years, rng)
+        frame.to_csv(csv_dir / f"weather_S{i:03d}.csv", index=False)
+        weather_store.write_site(f"S{i:03d}", frame, store_dir)
+    return csv_dir, store_dir
+
+
+def run_csv(root):
+    # the old prepare_weather_data step
+    frames = []
+    for file_path in sorted((root / "csv").glob("weather_*.csv")):
+        temp_df = pd.read_csv(file_path, parse_dates=['time'])
+        temp_df['site_code'] = file_path.stem.replace('weather_', '')
+        frames.append(temp_df)
+    combined = pd.concat(frames, ignore_index=True)
+    combined.to_csv(root / "weather_combined_full.csv", index=False)
+    del frames, combined
+    # and build_model_dataset parsing it again
+    df = pd.read_csv(root / "weather_combined_full.csv")
+    df['time'] = pd.to_datetime(df['time'], utc=True)
+    return df
+
+
+def run_store(root):
+    return weather_store.load_weather(store_dir=root / "store")
+
+
+def run_store_slice(root):
+    sites = weather_store.stored_sites(root / "store")[:5]
+    return weather_store.load_weather(sites=sites, columns=SLICE_COLUMNS, store_dir=root / "store")
+
+
+def measure(name, root, queue):
+    start = time.perf_counter()
+    df = {"csv": run_csv, "store": run_store, "store-slice": run_store_slice}[name](root)
+    elapsed = time.perf_counter() - start
+    queue.put((len(df), df.memory_usage(deep=True).sum() / 2**20, elapsed, peak_rss_mb()))
+
+
+def dir_size_mb(path, pattern):
+    return sum(p.stat().st_size for p in path.rglob(pattern)) / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sites", type=int, default=40)
+    parser.add_argument("--years", type=int, default=5)
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        csv_dir, store_dir = write_sources(root, args.sites, args.years)
+        print(f"synthetic weather: {args.sites} sites x {args.years} years")
+        print(f"on disk: per-site csv {dir_size_mb(csv_dir, '*.csv'):.1f} MB, "
+              f"store {dir_size_mb(store_dir, '*.parquet'):.1f} MB")
+
+        for name in ("csv", "store", "store-slice"):
+            queue = ctx.Queue()
+            proc = ctx.Process(target=measure, args=(name, root, queue))
+            proc.start()
+            rows, frame_mb, elapsed, peak = queue.get()
+            proc.join()
+            print(f"{name:<12} rows={rows:>10,}  frame={frame_mb:7.1f} MB  {elapsed:7.2f}s  peak_rss={peak:8.1f} MB")
+        print(f"combined csv written by the old route: {dir_size_mb(root, 'weather_combined_full.csv'):.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Local stand-in for the LAQN /Data/SiteSpecies endpoint.
+
+Serves synthetic hourly RawAQData payloads with injected latency and a
+configurable share of 5xx errors, so the fetcher can be exercised without
+touching the real API.
+"""
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PATH_RE = re.compile(
+    r"/Data/SiteSpecies/SiteCode=(?P<site>[^/]+)/SpeciesCode=(?P<species>[^/]+)"
+    r"/StartDate=(?P<start>[\d-]+)/EndDate=(?P<end>[\d-]+)/Json"
+)
+
+
+def synthetic_payload(site_code, species_code, start_str, end_str, missing_rate=0.05, seed=None):
+    """Builds a RawAQData payload with one reading per hour between the two dates."""
+    rng = random.Random(seed if seed is not None else f"{site_code}{species_code}{start_str}")
+    start = datetime.strptime(start_str, "%Y-%m-%d")
+    end = datetime.strptime(end_str, "%Y-%m-%d")
+    points = []
+    ts = start
+    while ts < end:
+        value = "" if rng.random() < missing_rate else f"{rng.uniform(2, 80):.1f}"
+        points.append({"@MeasurementDateGMT": ts.strftime("%Y-%m-%d %H:%M:%S"), "@Value": value})
+        ts += timedelta(hours=1)
+    return {"RawAQData": {"@SiteCode": site_code, "@SpeciesCode": species_code, "Data": points}}
+
+
+class StubState:
+    def __init__(self, latency, error_rate, seed):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            match = PATH_RE.search(self.path)
+            with state.lock:
+                state.requests += 1
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+                fail = state.rng.random() < state.error_rate
+                if fail:
+                    state.errors += 1
+            try:
+                time.sleep(state.latency)
+                if match is None:
+                    self.send_error(404)
+                    return
+                if fail:
+                    self.send_error(503)
+                    return
+                payload = synthetic_payload(match["site"], match["species"], match["start"], match["end"])
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+    return Handler
+
+
+class StubServer:
+    """Runs the stand-in server on a background thread; use as a context manager."""
+
+    def __init__(self, latency=0.2, error_rate=0.05, seed=0):
+        self.state = StubState(latency, error_rate, seed)
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(self.state))
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
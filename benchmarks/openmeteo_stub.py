@@ -0,0 +1,83 @@
+"""
+In-process stand-in for openmeteo_requests.Client.
+
+weather_api() mirrors the real signature and response accessors
+(Latitude/Longitude/Hourly/Time/TimeEnd/Interval/Variables().ValuesAsNumpy),
+returning deterministic synthetic hourly arrays per grid cell after an injected
+latency. Calls and requested locations are counted.
+"""
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+
+class _Values:
+    def __init__(self, values):
+        self.values = values
+
+    def ValuesAsNumpy(self):
+        return self.values
+
+
+class _Hourly:
+    def __init__(self, start, end, variables):
+        self.start, self.end, self.variables = start, end, variables
+
+    def Time(self):
+        return self.start
+
+    def TimeEnd(self):
+        return self.end
+
+    def Interval(self):
+        return 3600
+
+    def Variables(self, i):
+        return _Values(self.variables[i])
+
+
+class _Response:
+    def __init__(self, lat, lon, hourly):
+        self.lat, self.lon, self.hourly = lat, lon, hourly
+
+    def Latitude(self):
+        return self.lat
+
+    def Longitude(self):
+        return self.lon
+
+    def Hourly(self):
+        return self.hourly
+
+
+class StubOpenMeteo:
+    def __init__(self, latency=0.5, resolution=0.1):
+        self.latency = latency
+        self.resolution = resolution
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.locations = 0
+
+    def _cell(self, x):
+        return round(round(x / self.resolution) * self.resolution, 6)
+
+    def weather_api(self, url, params):
+        lats = np.atleast_1d(params["latitude"]).astype(float)
+        lons = np.atleast_1d(params["longitude"]).astype(float)
+        with self.lock:
+            self.calls += 1
+            self.locations += len(lats)
+        time.sleep(self.latency)
+
+        start = int(pd.Timestamp(params["start_date"], tz="UTC").timestamp())
+        end = int((pd.Timestamp(params["end_date"], tz="UTC") + pd.Timedelta(days=1)).timestamp())
+        n_hours = (end - start) // 3600
+        responses = []
+        for lat, lon in zip(lats, lons):
+            cell = (self._cell(lat), self._cell(lon))
+            rng = np.random.default_rng(abs(hash(cell)) % 2**32)
+            variables = [rng.normal(10, 5, n_hours).astype(np.float32) for _ in params["hourly"]]
+            responses.append(_Response(cell[0], cell[1], _Hourly(start, end, variables)))
+        return responses
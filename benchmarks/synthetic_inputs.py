@@ -0,0 +1,228 @@
+"""
+Seeded synthetic pipeline inputs, written under a root where src/config.py expects them
+(root/data/...), in the formats the pipeline reads:
+
+  LAQN store      data/raw/pollution/laqn_store/site_code=*/ and _sites.json (site names
+                  and coordinates), as fetch_data_Laqn.py writes them: NO2 everywhere,
+                  reference PM2.5 at most sites and FINE where there's none, with outages
+  weather         data/raw/weather/weather_{site}.csv, one hourly Open-Meteo CSV per site,
+                  as fetch_weather_data.py wrote them before the weather store
+  DfT AADF        data/raw/traffic/dft_traffic_counts_aadf.csv with the national file's
+                  columns: count points around every site plus national ones, a row per year
+
+Pollution follows the weather (less NO2 in wind, more PM2.5 in humid still air), the
+rush hours, weekends and seasons, so models trained on it have something to learn.
+The same seed, sites and years always write the same data.
+
+    python -m benchmarks.synthetic_inputs /tmp/airq --sites 40 --years 5
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+from benchmarks.bench_traffic_index import COUNT_COLUMNS, TEXT_COLUMNS
+from src import config as cfg
+from src import laqn_store
+from src import traffic_index
+
+START_YEAR = 2010
+# greater London, where the sites and their count points are placed
+LAT_RANGE = (51.28, 51.69)
+LON_RANGE = (-0.51, 0.33)
+POINTS_PER_SITE = 12
+NATIONAL_POINTS = 2000
+FIRST_AADF_YEAR = 2000
+WEATHER_CODES = np.array([0, 1, 2, 3, 45, 51, 53, 61, 63, 65, 71, 80, 95])
+
+
+def under(root, path):
+    """path from src/config.py, moved under root."""
+    return Path(root) / Path(path).relative_to(cfg.ROOT)
+
+
+def ar1(rng, n, phi, sigma):
+    """AR(1) noise with stationary standard deviation sigma."""
+    shocks = rng.normal(0, sigma * np.sqrt(1 - phi ** 2), n)
+    return lfilter([1.0], [1.0, -phi], shocks)
+
+
+def regional_weather(hours, rng):
+    """Weather shared by every site, which each site then perturbs a little."""
+    n = len(hours)
+    hod, doy = hours.hour.to_numpy(), hours.dayofyear.to_numpy()
+    season = np.cos(2 * np.pi * (doy - 200) / 365.25)             # +1 in mid July
+    daylight = np.clip(np.sin(np.pi * (hod - 5) / 14), 0, None) * (0.6 + 0.4 * season)
+    wind = np.clip(4.5 + 0.8 * (-season) + ar1(rng, n, 0.97, 2.2), 0.2, None)
+    cloud = np.clip(60 + ar1(rng, n, 0.95, 30), 0, 100)
+    wet = ar1(rng, n, 0.9, 1) > 1.1
+    return {
+        'temperature_2m': 11 + 7 * season + 4 * daylight + ar1(rng, n, 0.98, 2.5),
+        'wind_speed_10m': wind,
+        'cloud_cover': cloud,
+        'precipitation': np.where(wet, rng.gamma(0.8, 1.2, n), 0.0),
+        'pressure_msl': 1013 + ar1(rng, n, 0.995, 9),
+        'shortwave_radiation': 800 * daylight * (1 - 0.7 * cloud / 100),
+        'wind_direction_10m': (225 + np.degrees(ar1(rng, n, 0.99, 1.2))) % 360,
+        'humidity_anomaly': ar1(rng, n, 0.95, 8),
+    }
+
+
+def site_weather(hours, regional, rng):
+    n = len(hours)
+    season = np.cos(2 * np.pi * (hours.dayofyear.to_numpy() - 200) / 365.25)
+    temperature = regional['temperature_2m'] + rng.normal(0.3, 0.3) + rng.normal(0, 0.4, n)
+    humidity = np.clip(78 - 10 * season - 0.8 * (temperature - 11) + regional['humidity_anomaly'], 20, 100)
+    dew_point = temperature - (100 - humidity) / 5
+    wind = regional['wind_speed_10m'] * rng.uniform(0.8, 1.2) + np.abs(rng.normal(0, 0.3, n))
+    precipitation = regional['precipitation'] * rng.uniform(0.7, 1.3)
+    snow = np.where((temperature < 0.5) & (precipitation > 0), precipitation * 0.7, 0.0)
+    code = np.where(precipitation > 0, rng.choice(WEATHER_CODES[5:], n),
+                    rng.choice(WEATHER_CODES[:5], n, p=[0.3, 0.25, 0.2, 0.2, 0.05]))
+    return pd.DataFrame({
+        'time': hours.strftime('%Y-%m-%dT%H:%M'),
+        'temperature_2m': temperature,
+        'relative_humidity_2m': humidity,
+        'dew_point_2m': dew_point,
+        'precipitation': precipitation,
+        'snow_depth': lfilter([0.01], [1.0, -0.97], snow),        # metres lying, melting away after a fall
+        'weather_code': code,
+        'pressure_msl': regional['pressure_msl'] + rng.normal(0, 0.3, n),
+        'cloud_cover': regional['cloud_cover'],
+        'shortwave_radiation': regional['shortwave_radiation'],
+        'wind_speed_10m': wind,
+        'wind_direction_10m': regional['wind_direction_10m'],
+        'wind_gusts_10m': wind * rng.uniform(1.4, 1.9, n),
+    })
+
+
+def outages(rng, n, years, max_days=30, missing_rate=0.02):
+    """Mask of hours a monitor reported: a few multi-day outages a year plus scattered gaps."""
+    ok = rng.random(n) > missing_rate
+    for start in rng.integers(0, n, rng.poisson(2 * years)):
+        ok[start:start + rng.integers(6, max_days * 24)] = False
+    return ok
+
+
+def site_pollution(hours, weather, rng, years):
+    """{pollutant: (hour positions, values)} for one site."""
+    n = len(hours)
+    hod, dow = hours.hour.to_numpy(), hours.dayofweek.to_numpy()
+    season = np.cos(2 * np.pi * (hours.dayofyear.to_numpy() - 15) / 365.25)      # +1 in mid January
+    rush = (1 + 0.45 * np.exp(-((hod - 8) / 2) ** 2) + 0.5 * np.exp(-((hod - 18) / 2.5) ** 2)
+            - 0.3 * np.exp(-((hod - 3) / 2.5) ** 2))
+    weekday = np.where(dow >= 5, 0.78, 1.0)
+    trend = 0.97 ** (np.arange(n) / 8766)                     # slowly cleaner air
+    wind = weather['wind_speed_10m'].to_numpy()
+    humidity = weather['relative_humidity_2m'].to_numpy()
+
+    roadside = rng.random() < 0.4
+    no2 = (rng.uniform(30, 55) * (1.4 if roadside else 1.0) * rush * weekday * (1 + 0.2 * season) * trend
+           / (1 + 0.09 * wind) * np.exp(ar1(rng, n, 0.85, 0.3)))
+    pm25 = (rng.uniform(9, 14) * (1 + 0.3 * season) * (1 + 0.01 * (humidity - 70)) * trend
+            / (1 + 0.05 * wind) * np.exp(ar1(rng, n, 0.97, 0.45)))
+
+    # some monitors open part way through the period
+    opened = rng.integers(0, n // 2) if rng.random() < 0.2 else 0
+    out = {'NO2': (opened, no2)}
+    has_reference = rng.random() < 0.7
+    if has_reference:
+        out['PM2.5'] = (opened, pm25)
+    if not has_reference or rng.random() < 0.2:
+        out['FINE'] = (opened, pm25 * rng.uniform(0.9, 1.15) + rng.normal(0, 1.5, n))
+    return {pollutant: (np.flatnonzero(outages(rng, n, years)[first:]) + first,
+                        np.clip(values, 0.1, None).round(1))
+            for pollutant, (first, values) in out.items()}
+
+
+def write_traffic(path, sites, years, rng):
+    """National AADF rows for count points around each site and elsewhere, one per point per year."""
+    n_local = len(sites) * POINTS_PER_SITE
+    lat = np.concatenate([np.repeat(sites['lat'].to_numpy(), POINTS_PER_SITE) + rng.normal(0, 0.01, n_local),
+                          rng.uniform(50.0, 55.0, NATIONAL_POINTS)])
+    lon = np.concatenate([np.repeat(sites['lon'].to_numpy(), POINTS_PER_SITE) + rng.normal(0, 0.015, n_local),
+                          rng.uniform(-5.0, 1.5, NATIONAL_POINTS)])
+    n_points = len(lat)
+    major = rng.random(n_points) < 0.35
+    flow = np.where(major, rng.lognormal(10.3, 0.5, n_points), rng.lognormal(8.3, 0.8, n_points))
+
+    years_out = np.arange(FIRST_AADF_YEAR, START_YEAR + years)
+    point = np.repeat(np.arange(n_points), len(years_out))
+    year = np.tile(years_out, n_points)
+    n_rows = len(point)
+    df = pd.DataFrame({'count_point_id': 100000 + point, 'year': year,
+                       'region_id': 6, 'local_authority_id': rng.integers(1, 33, n_points)[point]})
+    for col in TEXT_COLUMNS:
+        df[col] = np.array([f"{col} {i}" for i in range(50)])[rng.integers(0, 50, n_points)][point]
+    df['road_type'] = np.where(major, 'Major', 'Minor')[point]
+    df['easting'] = (530000 + (lon[point] + 0.1) * 69000).round()
+    df['northing'] = (180000 + (lat[point] - 51.5) * 111000).round()
+    df['latitude'] = lat[point].round(6)
+    df['longitude'] = lon[point].round(6)
+    # some rows without coordinates, as in the real file
+    df.loc[rng.random(n_rows) < 0.02, ['latitude', 'longitude']] = np.nan
+    df['link_length_km'] = rng.uniform(0.1, 5, n_points).round(2)[point]
+    df['link_length_miles'] = (df['link_length_km'] * 0.621).round(2)
+    vehicles = np.round(flow[point] * 0.99 ** (year - FIRST_AADF_YEAR) * rng.normal(1, 0.05, n_rows))
+    shares = rng.dirichlet(np.ones(len(COUNT_COLUMNS)), n_rows)
+    for k, col in enumerate(COUNT_COLUMNS):
+        df[col] = np.round(vehicles * shares[:, k]).astype(np.int64)
+    df['all_motor_vehicles'] = vehicles.astype(np.int64)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(path, index=False)
+    return n_rows
+
+
+def write_inputs(root, n_sites, years, seed=0):
+    """
+    Writes every input for n_sites × years of hourly data from START_YEAR under root,
+    one site at a time, and returns a summary of what was written.
+    """
+    rng = np.random.default_rng(seed)
+    hours = pd.date_range(f"{START_YEAR}-01-01", f"{START_YEAR + years}-01-01", freq='h', inclusive='left')
+    epoch_seconds = hours.as_unit('s').asi8
+    sites = pd.DataFrame({'site_code': [f"S{i:03d}" for i in range(n_sites)],
+                          'lat': rng.uniform(*LAT_RANGE, n_sites).round(6),
+                          'lon': rng.uniform(*LON_RANGE, n_sites).round(6)})
+    regional = regional_weather(hours, rng)
+
+    store_dir, weather_dir = under(root, cfg.AQ_STORE), under(root, cfg.RAW_WTH)
+    weather_dir.mkdir(parents=True, exist_ok=True)
+    readings = 0
+    for site in sites.itertuples():
+        weather = site_weather(hours, regional, rng)
+        weather.to_csv(weather_dir / f"weather_{site.site_code}.csv", index=False, float_format='%.1f')
+        # one writer per site, so only one site's parquet writer is open at a time
+        with laqn_store.StoreWriter(store_dir) as writer:
+            for pollutant, (positions, values) in site_pollution(hours, weather, rng, years).items():
+                writer.write(site.site_code, laqn_store.chunk_table(pollutant, epoch_seconds[positions],
+                                                                    values[positions]))
+                readings += len(positions)
+    laqn_store.save_site_metadata({site.site_code: {"name": f"Synthetic site {site.site_code}",
+                                                    "lat": str(site.lat), "lon": str(site.lon)}
+                                   for site in sites.itertuples()}, store_dir)
+    aadf_rows = write_traffic(under(root, traffic_index.SOURCE), sites, years, rng)
+    size = sum(f.stat().st_size for f in (Path(root) / "data").rglob("*") if f.is_file())
+    return {"sites": n_sites, "years": years, "seed": seed, "hours": len(hours),
+            "laqn_readings": readings, "weather_rows": len(hours) * n_sites, "aadf_rows": aadf_rows,
+            "input_mb": round(size / 2**20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", help="directory to write data/ under")
+    parser.add_argument("--sites", type=int, default=4)
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = write_inputs(args.root, args.sites, args.years, args.seed)
+    print(f"wrote {summary} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
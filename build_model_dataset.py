@@ -1,72 +1,379 @@
+import argparse
+import shutil
 import pandas as pd
 import numpy as np
-import holidays
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from src import config as cfg
+from src.calendar_table import add_calendar_features, load_calendar
+from src.features import FeatureEngine, FeatureSpec, add_features
+from src.resources import peak_rss_mb
+from src.validation import RunningStats
+from src import metrics
+from src import traffic_index
+from src import weather_store
 
-def run_final_build():
+def weighted_site_traffic(neighbours, traffic_agg):
+    """
+    Inverse-distance weighted yearly vehicle count per site over its neighbouring
+    count points, renormalising the weights over the points counted in that year.
+    """
+    df = pd.merge(neighbours[['site_code', 'count_point_id', 'weight']], traffic_agg, on='count_point_id')
+    df = df.dropna(subset=['all_motor_vehicles'])
+    df['weighted'] = df['weight'] * df['all_motor_vehicles']
+    site_year = df.groupby(['site_code', 'year'])[['weighted', 'weight']].sum()
+    return (site_year['weighted'] / site_year['weight']).rename('all_motor_vehicles').reset_index()
+
+
+# pollutant history features added by --history-features
+HISTORY_SPEC = FeatureSpec(lags=(24, 12), windows=(24,), ewm_spans=(24,), shift=12)
+DROP_COLUMNS = ['nearest_count_point_id', 'count_point_id', 'SiteID']
+
+ROW_GROUP_ROWS = 8760 * 5    # rows per Parquet row group in the in-memory build's output, about five site-years
+
+# streaming build
+MEMORY_BUDGET_MB = 1024     # peak RSS the streaming build may reach before it stops
+AQ_BLOCK_BYTES = 8 << 20    # bytes of the AQ csv parsed at a time
+
+
+def load_traffic_lookup(traffic_map, traffic_mode="nearest"):
+    """Yearly vehicle counts keyed by count point (nearest) or by site (idw)."""
+    if traffic_mode == "idw":
+        neighbours = pd.read_csv(cfg.MATCHED_NEIGHBOURS)
+        return weighted_site_traffic(neighbours, traffic_index.load_aadf(neighbours['count_point_id'].unique()))
+    return traffic_index.load_aadf(traffic_map['nearest_count_point_id'].dropna().unique())
+
+
+def apply_model_schema(df, feature_columns=()):
+    """
+    df cast to cfg.MODEL_DTYPES and put in its column order, with any history
+    feature columns as float32 at the end. A column the schema doesn't know is an error.
+    """
+    dtypes = dict(cfg.MODEL_DTYPES)
+    dtypes.update({col: cfg.MODEL_FEATURE_DTYPE for col in feature_columns})
+    unknown = [col for col in df.columns if col not in dtypes]
+    missing = [col for col in dtypes if col not in df.columns]
+    if unknown or missing:
+        raise ValueError(f"dataset columns don't match cfg.MODEL_DTYPES: unknown {unknown}, missing {missing}")
+    return df[list(dtypes)].astype(dtypes)
+
+
+def parquet_options(columns):
+    """Writer options for the model-ready data: delta encoding for the hourly timestamps, dictionaries elsewhere."""
+    return dict(use_dictionary=[col for col in columns if col != 'date'],
+                column_encoding={'date': 'DELTA_BINARY_PACKED'})
+
+
+def write_model_ready(df, path):
+    """
+    Writes the typed dataset in row groups of a few site-years. Rows stay sorted by
+    site and date, so each row group's statistics cover a narrow range of both and
+    filtered reads (pd.read_parquet(..., filters=[('site_code', '==', 'BL0')])) skip the rest.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(table, path, row_group_size=ROW_GROUP_ROWS, **parquet_options(table.column_names))
+
+
+def run_final_build(traffic_mode="nearest", history_features=False):
 
     try:
-        aq_df = pd.read_csv(cfg.INT_AQ / 'laqn_wide.csv', parse_dates=['date'])
-        weather_df = pd.read_csv(cfg.INT_WTH / "weather_combined_full.csv")
-        traffic_map = pd.read_csv(cfg.MATCHED_SITES)
-        traffic_counts = pd.read_csv(cfg.RAW_TRF / "dft_traffic_counts_aadf.csv", low_memory=False)
+        with metrics.span("load") as span:
+            aq_df = pd.read_csv(cfg.AQ_WIDE, parse_dates=['date'])
+            traffic_map = pd.read_csv(cfg.MATCHED_SITES)
+            traffic_agg = load_traffic_lookup(traffic_map, traffic_mode)
+            # only the sites present in the AQ data are read from the weather store
+            weather_df = weather_store.load_weather(sites=aq_df['site_code'].unique())
+            span.set(aq_rows=len(aq_df), weather_rows=len(weather_df))
+        metrics.count("rows_in", len(aq_df))
         print("source files loaded successfully.")
     except FileNotFoundError as e:
         print(f"critical error: missing source file\n{e}")
         return
 
     # prepare and merge air quality and weather data
-    aq_df.rename(columns={'NO2_final': 'NO2', 'PM2.5_final': 'PM2.5'}, inplace=True)
-    aq_df['date'] = pd.to_datetime(aq_df['date']).dt.tz_localize('UTC')
-    weather_df.rename(columns={'time': 'date'}, inplace=True)
-    weather_df['date'] = pd.to_datetime(weather_df['date'], utc=True)
-    df = pd.merge(aq_df, weather_df, on=['date', 'site_code'], how='inner')
+    with metrics.span("merge_weather") as span:
+        aq_df.rename(columns={'NO2_final': 'NO2', 'PM2.5_final': 'PM2.5'}, inplace=True)
+        aq_df['date'] = pd.to_datetime(aq_df['date']).dt.tz_localize('UTC')
+        weather_df.rename(columns={'time': 'date'}, inplace=True)
+        weather_df['site_code'] = weather_df['site_code'].astype(str)
+        df = pd.merge(aq_df, weather_df, on=['date', 'site_code'], how='inner')
+        span.set(rows_in=len(aq_df), rows_out=len(df))
     print("air quality and weather data merged.")
 
     # prepare and merge yearly traffic data
-    traffic_agg = traffic_counts.groupby(['count_point_id', 'year'])['all_motor_vehicles'].mean().reset_index()
-    traffic_map_cols = ['site_code', 'nearest_count_point_id', 'road_type']
-    df['year'] = df['date'].dt.year
-    df = pd.merge(df, traffic_map[traffic_map_cols], on='site_code', how='left')
-    df = pd.merge(df, traffic_agg, left_on=['nearest_count_point_id', 'year'], right_on=['count_point_id', 'year'], how='left')
-    df.rename(columns={'all_motor_vehicles': 'aadf_vehicle_count'}, inplace=True)
-    df.sort_values(by=['site_code', 'date'], inplace=True)
-    df['aadf_vehicle_count'] = df.groupby('site_code')['aadf_vehicle_count'].ffill().bfill()
-    df['aadf_vehicle_count'].fillna(df['aadf_vehicle_count'].mean(), inplace=True)
+    # yearly means per count point come pre-aggregated from the traffic index
+    with metrics.span("merge_traffic", traffic_mode=traffic_mode) as span:
+        traffic_map_cols = ['site_code', 'nearest_count_point_id', 'road_type']
+        df['year'] = df['date'].dt.year
+        df = pd.merge(df, traffic_map[traffic_map_cols], on='site_code', how='left')
+        if traffic_mode == "idw":
+            df = pd.merge(df, traffic_agg, on=['site_code', 'year'], how='left')
+        else:
+            df = pd.merge(df, traffic_agg, left_on=['nearest_count_point_id', 'year'], right_on=['count_point_id', 'year'], how='left')
+        df.rename(columns={'all_motor_vehicles': 'aadf_vehicle_count'}, inplace=True)
+        df.sort_values(by=['site_code', 'date'], inplace=True)
+        # forward then backward within each site only, so no site borrows its neighbour's count
+        df['aadf_vehicle_count'] = df.groupby('site_code')['aadf_vehicle_count'].transform(lambda s: s.ffill().bfill())
+        # sites with no count at all get the mean over site-years, as in site_year_traffic
+        site_year_counts = df.drop_duplicates(['site_code', 'year'])['aadf_vehicle_count']
+        df['aadf_vehicle_count'] = df['aadf_vehicle_count'].fillna(site_year_counts.mean())
+        span.set(rows_out=len(df))
     print("traffic data and road type merged and imputed.")
 
-    # feature engineering
-    df['date_local'] = df['date'].dt.tz_convert('Europe/London')
-    df['month'] = df['date_local'].dt.month
-    df['day_of_week'] = df['date_local'].dt.dayofweek
-    df['hour'] = df['date_local'].dt.hour
-    
-    df['is_weekend'] = (df['day_of_week'] >= 5).astype(int)
-    uk_holidays = holidays.UK(subdiv='ENG', years=range(2010, 2026))
-    df['is_holiday'] = df['date_local'].dt.date.isin(uk_holidays).astype(int)
-    
-    is_weekday = ~df['is_weekend'].astype(bool)
-    morning_rush = (df['hour'] >= 6) & (df['hour'] <= 9)
-    evening_rush = (df['hour'] >= 16) & (df['hour'] <= 21)
-    df['is_rush_hour'] = np.where(is_weekday & (morning_rush | evening_rush), 1, 0)
-    
-    df = pd.get_dummies(df, columns=['road_type'], prefix='road')
+    # feature engineering; calendar columns come from the per-hour table
+    with metrics.span("calendar"):
+        add_calendar_features(df)
+
+    if history_features:
+        # same feature path as the notebooks; the first day of each site has no history
+        with metrics.span("history_features") as span:
+            df = add_features(df, HISTORY_SPEC)
+            df = df.dropna(subset=HISTORY_SPEC.names())
+            span.set(rows_out=len(df))
+        print(f"added {len(HISTORY_SPEC.names())} pollutant history features.")
     
     # finalize and save
-    cols_to_drop = ['nearest_count_point_id', 'count_point_id', 'date_local', 'SiteID']
-    df.drop(columns=cols_to_drop, inplace=True, errors='ignore')
+    df.drop(columns=DROP_COLUMNS, inplace=True, errors='ignore')
 
     # final validation checks
-    assert df.isnull().sum().sum() == 0, "error: missing values found in the final dataset."
-    print("validation checks passed.")
+    with metrics.span("validate"):
+        assert df.isnull().sum().sum() == 0, "error: missing values found in the final dataset."
+        print("validation checks passed.")
+        df = apply_model_schema(df, HISTORY_SPEC.names() if history_features else ())
     
-    output_path = cfg.FIN_MERGED / "model_ready_dataset.parquet"
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    df.to_parquet(output_path, index=False)
+    output_path = cfg.MODEL_READY
+    with metrics.span("write", rows=len(df)):
+        write_model_ready(df, output_path)
+    metrics.count("rows_out", len(df))
     
     print(f"\nfinal dataset saved to {output_path}")
     print(f"final shape: {df.shape}")
     print("\nsample of final columns:", df.columns.tolist())
 
+def read_aq_batches(path=cfg.AQ_WIDE, columns=None, block_bytes=AQ_BLOCK_BYTES):
+    """The cleaned AQ csv as pandas frames of about block_bytes of text each, parsed by pyarrow."""
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=block_bytes),
+        convert_options=pacsv.ConvertOptions(include_columns=columns,
+                                             column_types={'date': pa.timestamp('ns'), 'site_code': pa.string()}),
+    )
+    for batch in reader:
+        yield batch.to_pandas()
+
+
+def aq_site_years(path=cfg.AQ_WIDE):
+    """The (site_code, year) pairs in the cleaned AQ csv, reading two columns a block at a time."""
+    pairs = [batch.assign(year=batch['date'].dt.year)[['site_code', 'year']].drop_duplicates()
+             for batch in read_aq_batches(path, columns=['site_code', 'date'])]
+    return pd.concat(pairs).drop_duplicates().sort_values(['site_code', 'year'], ignore_index=True)
+
+
+def site_year_traffic(traffic_map, traffic_agg, traffic_mode, site_years):
+    """
+    Vehicle count per (site_code, year) for the site-years in the AQ data, filled the
+    way the in-memory build fills its rows: forward then backward within the site,
+    and the mean over site-years for sites with no count at all. Small enough to keep in memory.
+    """
+    sites = traffic_map[['site_code', 'nearest_count_point_id']].drop_duplicates('site_code')
+    grid = site_years.merge(sites, on='site_code', how='left')
+    if traffic_mode == "idw":
+        grid = grid.merge(traffic_agg, on=['site_code', 'year'], how='left')
+    else:
+        grid = grid.merge(traffic_agg, left_on=['nearest_count_point_id', 'year'],
+                          right_on=['count_point_id', 'year'], how='left')
+    grid = grid.sort_values(['site_code', 'year'])
+    counts = grid.groupby('site_code')['all_motor_vehicles'].transform(lambda s: s.ffill().bfill())
+    counts = counts.fillna(counts.mean())
+    return pd.Series(counts.to_numpy(), index=pd.MultiIndex.from_frame(grid[['site_code', 'year']]),
+                     name='aadf_vehicle_count')
+
+
+def iter_aq_blocks(path=cfg.AQ_WIDE):
+    """
+    Yields (site_code, year, frame) blocks from the cleaned AQ csv without loading
+    it whole. filter_laqn_data.py writes each site's rows together in time order,
+    so a block is complete as soon as the next one starts.
+    """
+    carry = None
+    finished = set()
+    for chunk in read_aq_batches(path):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        sites = chunk['site_code'].to_numpy()
+        years = chunk['date'].dt.year.to_numpy()
+        starts = np.flatnonzero(np.r_[True, (sites[1:] != sites[:-1]) | (years[1:] != years[:-1])])
+        ends = np.r_[starts[1:], len(chunk)]
+        # the last run may continue in the next chunk
+        for start, end in zip(starts[:-1], ends[:-1]):
+            key = (sites[start], int(years[start]))
+            if key in finished:
+                raise ValueError(f"{path} is not grouped by site and year ({key[0]} {key[1]} appears twice); "
+                                 "rebuild it with filter_laqn_data.py")
+            finished.add(key)
+            yield key[0], key[1], chunk.iloc[start:end].reset_index(drop=True)
+        carry = chunk.iloc[starts[-1]:].reset_index(drop=True)
+    if carry is not None and len(carry):
+        yield carry['site_code'].iat[0], int(carry['date'].dt.year.iat[0]), carry
+
+
+class PartitionWriter:
+    """
+    Appends blocks to one Parquet file per site under site_code=<SITE>/, one row
+    group per block, holding a single file open at a time. The dataset is written
+    to a temporary directory and swapped in on close, so readers never see half a build.
+    """
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+        if self.tmp_dir.exists():
+            shutil.rmtree(self.tmp_dir)
+        self.schema = None
+        self.site_code = None
+        self.writer = None
+        self.rows = 0
+
+    def write(self, site_code, df):
+        table = pa.Table.from_pandas(df.drop(columns='site_code'), preserve_index=False)
+        if self.schema is None:
+            self.schema = table.schema.remove_metadata()
+        table = table.cast(self.schema)
+        if site_code != self.site_code:
+            self._close_site()
+            site_dir = self.tmp_dir / f"site_code={site_code}"
+            site_dir.mkdir(parents=True, exist_ok=True)
+            self.writer = pq.ParquetWriter(site_dir / "part-0.parquet", self.schema, **parquet_options(self.schema.names))
+            self.site_code = site_code
+        self.writer.write_table(table)
+        self.rows += table.num_rows
+
+    def _close_site(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def abort(self):
+        self._close_site()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def close(self):
+        self._close_site()
+        if self.out_dir.exists():
+            shutil.rmtree(self.out_dir)
+        if self.tmp_dir.exists():
+            self.tmp_dir.replace(self.out_dir)
+
+
+def build_block(block, weather_site, traffic_map, site_traffic, road_categories, calendar):
+    """The in-memory build's merges and features for one site-year of AQ rows."""
+    block = block.rename(columns={'NO2_final': 'NO2', 'PM2.5_final': 'PM2.5'})
+    block['date'] = block['date'].dt.tz_localize('UTC')
+    # the site's weather is sorted by time, so only the block's span takes part in the merge
+    lo, hi = weather_site['date'].searchsorted([block['date'].min(), block['date'].max()], side='left')
+    df = pd.merge(block, weather_site.iloc[lo:hi + 1], on=['date', 'site_code'], how='inner')
+
+    df['year'] = df['date'].dt.year
+    df = pd.merge(df, traffic_map[['site_code', 'nearest_count_point_id', 'road_type']], on='site_code', how='left')
+    keys = pd.MultiIndex.from_arrays([df['site_code'], df['year']])
+    df['aadf_vehicle_count'] = site_traffic.reindex(keys).to_numpy()
+    df = df.sort_values('date', ignore_index=True)
+
+    add_calendar_features(df, calendar)
+    # fixed categories so every block's road_type codes mean the same thing
+    df['road_type'] = pd.Categorical(df['road_type'], categories=road_categories)
+    return df
+
+
+def run_streaming_build(traffic_mode="nearest", history_features=False, memory_budget_mb=MEMORY_BUDGET_MB,
+                        out_dir=cfg.MODEL_READY_DIR):
+    """
+    Builds the modelling dataset one site-year at a time, appending to a site-partitioned
+    Parquet dataset. Only the site mapping, the site-year traffic table and one site's
+    weather are held in memory. Validation statistics accumulate per block. Peak RSS is
+    checked after each block and the build stops once it has gone over memory_budget_mb;
+    the check is after the fact, so it bounds how far a run goes, not the peak itself.
+    """
+    try:
+        traffic_map = pd.read_csv(cfg.MATCHED_SITES)
+        traffic_agg = load_traffic_lookup(traffic_map, traffic_mode)
+        if not cfg.AQ_WIDE.exists():
+            raise FileNotFoundError(cfg.AQ_WIDE)
+    except FileNotFoundError as e:
+        print(f"critical error: missing source file\n{e}")
+        return
+
+    with metrics.span("site_years") as span:
+        site_years = aq_site_years()
+        site_traffic = site_year_traffic(traffic_map, traffic_agg, traffic_mode, site_years)
+        span.set(site_years=len(site_years))
+    calendar = load_calendar(int(site_years['year'].min()), int(site_years['year'].max()))
+    road_categories = sorted(traffic_map['road_type'].dropna().unique())
+    stats = RunningStats()
+    writer = PartitionWriter(out_dir)
+    engine = FeatureEngine(HISTORY_SPEC) if history_features else None
+    weather_site, weather_for, peak = None, None, 0.0
+
+    try:
+        for site_code, year, block in iter_aq_blocks():
+            if weather_for != site_code:
+                with metrics.span("load_weather", site=site_code):
+                    weather_site = weather_store.load_weather(sites=[site_code]).rename(columns={'time': 'date'})
+                    weather_site['site_code'] = weather_site['site_code'].astype(str)
+                weather_for = site_code
+                first_block = True
+
+            with metrics.span("block", site=site_code, year=year, rows_in=len(block)) as span:
+                df = build_block(block, weather_site, traffic_map, site_traffic, road_categories, calendar)
+                if engine is not None:
+                    # history carries over from the site's previous year through the engine state
+                    features = engine.fit_transform(df) if first_block else engine.update(df)
+                    df = pd.concat([df, features], axis=1).dropna(subset=HISTORY_SPEC.names())
+                first_block = False
+
+                df.drop(columns=DROP_COLUMNS, inplace=True, errors='ignore')
+                df = apply_model_schema(df, HISTORY_SPEC.names() if history_features else ())
+                stats.update(df)
+                writer.write(site_code, df)
+                span.set(rows_out=len(df))
+            metrics.count("rows_in", len(block))
+            metrics.count("rows_out", len(df))
+
+            peak = max(peak, peak_rss_mb())
+            if peak > memory_budget_mb:
+                raise MemoryError(f"peak RSS {peak:.0f} MB went over the {memory_budget_mb} MB budget "
+                                  f"while building {site_code} {year}")
+            print(f"{site_code} {year}: {len(df):,} rows (peak RSS {peak:.0f} MB)")
+
+        # final validation checks, from the accumulated statistics; a failed build leaves no tmp dataset behind
+        assert stats.null_total() == 0, "error: missing values found in the final dataset.\n" + \
+            stats.summary().query('nulls > 0').to_string()
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    print("validation checks passed.")
+    print(stats.summary().to_string())
+    print(f"\nfinal dataset saved to {out_dir} ({writer.rows:,} rows)")
+    print(f"peak RSS {peak:.0f} MB (budget {memory_budget_mb} MB)")
+
+
 if __name__ == "__main__":
-    run_final_build()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Merge AQ, weather and traffic into the modelling dataset.")
+    parser.add_argument("--traffic", choices=["nearest", "idw"], default="nearest",
+                        help="nearest: the single closest count point; idw: distance-weighted over the matched neighbours")
+    parser.add_argument("--history-features", action="store_true",
+                        help="add pollutant lags, rolling and EWM features (the notebooks otherwise add the lags)")
+    parser.add_argument("--streaming", action="store_true",
+                        help="build one site-year at a time into a site-partitioned dataset at cfg.MODEL_READY_DIR")
+    parser.add_argument("--memory-budget-mb", type=float, default=MEMORY_BUDGET_MB,
+                        help="streaming only: stop once peak RSS has gone over this (checked after each site-year)")
+    args = parser.parse_args()
+    with metrics.entry_point("build_dataset", traffic=args.traffic, history_features=args.history_features,
+                             streaming=args.streaming):
+        if args.streaming:
+            run_streaming_build(args.traffic, args.history_features, args.memory_budget_mb)
+        else:
+            run_final_build(args.traffic, args.history_features)
\ No newline at end of file
@@ -1,38 +1,60 @@
+import argparse
+import numpy as np
 import pandas as pd
 import requests
 import json
 import time
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 from src import config as cfg
-from pathlib import Path
+from src import laqn_store as store
+from src import metrics
+from src.http_utils import HostLimiter, LimitedRetry
 from tqdm import tqdm
 
 
 BASE_URL = "https://api.erg.ic.ac.uk/AirQuality"
 DATA_DIR = cfg.RAW_AQ
 CACHE_DIR = DATA_DIR / "raw_cache"
-OUTPUT_CSV = DATA_DIR / "london_air_quality_2010_2025.csv"
 
 # specify site and pollutant codes
 SITES = ["BL0", "BX2", "GN0", "HK6"]
 POLLUTANTS = {"NO2": "NO2", "PM2.5": "PM25", "FINE": "FINE"}
 
+START_DATE = datetime(2010, 1, 1)
+END_DATE = datetime(2025, 6, 30)
+
 REQUEST_TIMEOUT = 30
-MAX_WORKERS = 4
 CHUNK_SIZE = timedelta(days=90)
+REFRESH_OVERLAP = timedelta(days=2)   # recent hours are provisional, re-read them on every sync
+
+# every (site, species, chunk) is its own task, so these bound the whole download
+MAX_WORKERS = 16          # concurrent chunk downloads (and pooled connections)
+MAX_PER_HOST = 8          # in-flight requests allowed against a single host
+RATE_LIMIT = 10.0         # requests per second across all workers, 0 disables
+RATE_BURST = 10
 
 
 
-def create_session():
-    """Creates a requests session with retry logic."""
+def create_session(pool_size=MAX_WORKERS, backoff_factor=1, limiter=None):
+    """
+    Creates a requests session with retry logic and a connection pool sized for the workers.
+    Given the HostLimiter, retried attempts draw from its token bucket like first attempts.
+    """
     session = requests.Session()
-    retries = Retry(total=5, backoff_factor=1, status_forcelist=[502, 503, 504])
-    session.mount('https://', HTTPAdapter(max_retries=retries))
+    retries = LimitedRetry(total=5, backoff_factor=backoff_factor, status_forcelist=[500, 502, 503, 504],
+                           limiter=limiter.bucket if limiter is not None else None)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
     return session
 
+
+def create_limiter():
+    """Creates the shared per-host concurrency cap and token-bucket rate limiter."""
+    return HostLimiter(MAX_PER_HOST, rate=RATE_LIMIT, burst=RATE_BURST)
+
 def fetch_all_site_metadata(session):
     """
     Fetches metadata for all London sites in a single call and caches the result.
@@ -45,6 +67,8 @@ def fetch_all_site_metadata(session):
     url = "https://api.erg.ic.ac.uk/AirQuality/Information/MonitoringSiteSpecies/GroupName=London/Json"
     try:
         response = session.get(url, timeout=REQUEST_TIMEOUT)
+        metrics.count("http_requests")
+        metrics.count("bytes_downloaded", len(response.content))
         response.raise_for_status()
         all_sites_data = response.json()["Sites"]["Site"]
         
@@ -64,77 +88,174 @@ def fetch_all_site_metadata(session):
         print(f"Could not fetch the site metadata list. Error: {e}")
         return None
 
-def fetch_data_chunk(session, site_code, species_code, start_date_str, end_date_str):
-    """Fetches and caches a single chunk of air quality data."""
-    cache_file = CACHE_DIR / f"{site_code}_{species_code}_{start_date_str}_{end_date_str}.json"
-    if cache_file.exists():
-        with open(cache_file, 'r') as f:
-            return json.load(f)
+def fetch_data_chunk(session, site_code, species_code, start_date_str, end_date_str,
+                     limiter=None, base_url=BASE_URL, cache_dir=CACHE_DIR):
+    """Fetches and caches a single chunk of air quality data. Pass cache_dir=None to skip the JSON cache."""
+    with metrics.span("fetch_chunk", site=site_code, species=species_code,
+                      start=start_date_str, end=end_date_str) as span:
+        cache_file = None
+        if cache_dir is not None:
+            cache_file = cache_dir / f"{site_code}_{species_code}_{start_date_str}_{end_date_str}.json"
+            if cache_file.exists():
+                metrics.count("cache_hits")
+                span.set(cache="hit")
+                with open(cache_file, 'r') as f:
+                    return json.load(f)
+            metrics.count("cache_misses")
 
-    url = f"{BASE_URL}/Data/SiteSpecies/SiteCode={site_code}/SpeciesCode={species_code}/StartDate={start_date_str}/EndDate={end_date_str}/Json"
-    try:
-        response = session.get(url, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
-        data = response.json()
-        with open(cache_file, 'w') as f:
-            json.dump(data, f)
-        return data
-    except Exception:
-        return None
+        url = f"{base_url}/Data/SiteSpecies/SiteCode={site_code}/SpeciesCode={species_code}/StartDate={start_date_str}/EndDate={end_date_str}/Json"
+        try:
+            if limiter is not None:
+                with limiter.slot(url):
+                    response = session.get(url, timeout=REQUEST_TIMEOUT)
+            else:
+                response = session.get(url, timeout=REQUEST_TIMEOUT)
+            metrics.count("http_requests")
+            metrics.count("bytes_downloaded", len(response.content))
+            span.set(status=response.status_code, bytes=len(response.content))
+            response.raise_for_status()
+            data = response.json()
+            if cache_file is not None:
+                with open(cache_file, 'w') as f:
+                    json.dump(data, f)
+            return data
+        except Exception as e:
+            metrics.count("chunks_failed")
+            span.set(error=type(e).__name__)
+            return None
 
-def extract_records(raw_data, site_code, site_info, pollutant_name):
-    """Extracts and formats data points from the raw JSON response."""
+def extract_columns(raw_data, pollutant_name):
+    """
+    Decodes a raw JSON response straight into a store batch: int64 epoch-second
+    timestamps and float32 values, skipping hours without a reading.
+    """
     if not raw_data or "RawAQData" not in raw_data or "Data" not in raw_data["RawAQData"]:
-        return []
+        return None
 
     data_points = raw_data["RawAQData"]["Data"]
     if not isinstance(data_points, list):
         data_points = [data_points]
 
-    records = []
-    for point in data_points:
-        ts = point.get("@MeasurementDateGMT")
-        val = point.get("@Value")
-        if ts and val and val.strip():
-            records.append({
-                "site_code": site_code,
-                "site_name": site_info.get("name"),
-                "latitude": site_info.get("lat"),
-                "longitude": site_info.get("lon"),
-                "pollutant": pollutant_name,
-                "timestamp": ts,
-                "value": float(val)
-            })
-    return records
-
-def process_site(session, site_code, site_info):
-    """Processes all pollutants and date chunks for a single site."""
-    records = []
-    start_date = datetime(2010, 1, 1)
-    end_date = datetime(2025, 6, 30)
+    timestamps = np.array([point.get("@MeasurementDateGMT") or "NaT" for point in data_points],
+                          dtype="datetime64[s]")
+    values = pd.to_numeric(pd.Series([point.get("@Value") for point in data_points], dtype=object),
+                           errors='coerce').to_numpy(dtype=np.float32)
+    keep = ~np.isnat(timestamps) & ~np.isnan(values)
+    return store.chunk_table(pollutant_name, timestamps[keep].view(np.int64), values[keep])
 
+def build_date_chunks(start_date=START_DATE, end_date=END_DATE):
+    """Splits the date range into CHUNK_SIZE windows as (start, end) strings."""
     date_chunks = []
     current = start_date
     while current <= end_date:
         chunk_end = min(current + CHUNK_SIZE, end_date)
         date_chunks.append((current.strftime("%Y-%m-%d"), chunk_end.strftime("%Y-%m-%d")))
         current = chunk_end + timedelta(days=1)
+    return date_chunks
+
+def build_tasks(sites, date_chunks):
+    """One task per (site, pollutant, date chunk)."""
+    return [(site_code, p_name, s_code, start_str, end_str)
+            for site_code in sites
+            for p_name, s_code in POLLUTANTS.items()
+            for start_str, end_str in date_chunks]
+
+def download_chunks(session, tasks, limiter=None, base_url=BASE_URL, cache_dir=CACHE_DIR,
+                    max_workers=MAX_WORKERS, show_progress=True):
+    """
+    Schedules every task on a shared thread pool and yields (task, raw_data)
+    as each chunk completes. raw_data is None when the chunk could not be fetched.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_task = {
+            executor.submit(fetch_data_chunk, session, site_code, species_code, start_str, end_str,
+                            limiter, base_url, cache_dir): (site_code, p_name, species_code, start_str, end_str)
+            for site_code, p_name, species_code, start_str, end_str in tasks
+        }
 
-    tasks = [(p_name, s_code, start_str, end_str)
-             for p_name, s_code in POLLUTANTS.items()
-             for start_str, end_str in date_chunks]
+        failed = 0
+        progress = tqdm(as_completed(future_to_task), total=len(future_to_task),
+                        desc="Fetching chunks", unit="chunk", disable=not show_progress)
+        for future in progress:
+            task = future_to_task[future]
+            try:
+                raw = future.result()
+            except Exception as e:
+                print(f"Error fetching {task}: {e}")
+                raw = None
+            if raw is None:
+                failed += 1
+                progress.set_postfix(failed=failed)
+            yield task, raw
 
-    for pollutant_name, species_code, start_str, end_str in tasks:
-        raw = fetch_data_chunk(session, site_code, species_code, start_str, end_str)
-        if raw:
-            records.extend(extract_records(raw, site_code, site_info, pollutant_name))
-    return records
+def build_sync_tasks(state, sites, end_date):
+    """
+    Tasks for only the windows each (site, species) is missing: the tail past its
+    high-water mark (less REFRESH_OVERLAP) plus any earlier gaps. Windows are
+    half-open [start, end) days so consecutive chunks never skip a day.
+    """
+    tasks = []
+    for site_code in sites:
+        for p_name, s_code in POLLUTANTS.items():
+            covered = state.get(site_code, {}).get(s_code, {}).get("covered", [])
+            high_water = store.high_water_mark(covered)
+            refresh_from = high_water - REFRESH_OVERLAP if high_water else None
+            for gap_start, gap_end in store.missing_windows(covered, START_DATE.date(), end_date, refresh_from):
+                current = gap_start
+                while current < gap_end:
+                    chunk_end = min(current + CHUNK_SIZE, gap_end)
+                    tasks.append((site_code, p_name, s_code, current.isoformat(), chunk_end.isoformat()))
+                    current = chunk_end
+    return tasks
 
-def main():
+def stream_to_store(session, tasks, limiter, base_url=BASE_URL, cache_dir=None,
+                    store_dir=store.STORE_DIR, inclusive_end=False):
+    """
+    Downloads the tasks and streams each decoded chunk into the store as it arrives.
+    Only chunks that were fetched advance the high-water marks, and only after
+    their rows are on disk. Returns (rows written, chunks fetched).
+    """
+    state = store.load_state(store_dir)
+    fetched = []
+    with store.StoreWriter(store_dir) as writer:
+        for (site_code, pollutant_name, species_code, start_str, end_str), raw in download_chunks(
+                session, tasks, limiter, base_url=base_url, cache_dir=cache_dir):
+            if raw is None:
+                continue
+            table = extract_columns(raw, pollutant_name)
+            if table is not None:
+                writer.write(site_code, table)
+                metrics.count("rows_out", table.num_rows)
+            end = date.fromisoformat(end_str) + (timedelta(days=1) if inclusive_end else timedelta(0))
+            fetched.append((site_code, species_code, date.fromisoformat(start_str), end))
+    rows = sum(writer.rows.values())
+
+    for site_code, species_code, start, end in fetched:
+        store.mark_covered(state, site_code, species_code, start, end)
+    store.save_state(state, store_dir)
+    return rows, len(fetched)
+
+def sync(session, limiter, end_date, sites=SITES, base_url=BASE_URL, store_dir=store.STORE_DIR):
+    """
+    Brings the local store up to end_date, fetching only missing windows and
+    appending the new rows as one part file per site. Returns the number of rows added.
+    """
+    tasks = build_sync_tasks(store.load_state(store_dir), sites, end_date)
+    if not tasks:
+        print("Store is already up to date.")
+        return 0
+    print(f"Syncing {len(tasks)} missing chunks up to {end_date}...")
+
+    rows, n_fetched = stream_to_store(session, tasks, limiter, base_url=base_url, store_dir=store_dir)
+    print(f"Appended {rows} rows from {n_fetched}/{len(tasks)} chunks.")
+    return rows
+
+def main(sync_mode=False, end_date=None):
     CACHE_DIR.mkdir(parents=True, exist_ok=True)
     DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-    session = create_session()
+    limiter = create_limiter()
+    session = create_session(limiter=limiter)
     
     # Fetch all site metadata first
     print("Fetching site metadata...")
@@ -143,41 +264,36 @@ def main():
         return
     print("Metadata loaded.")
 
-    # fetch pollutant data for selected sites
-    all_records = []
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_site = {
-            executor.submit(process_site, session, site_code, all_sites_metadata.get(site_code, {})): site_code 
-            for site_code in SITES
-        }
+    store.save_site_metadata({code: all_sites_metadata.get(code, {}) for code in SITES})
 
-        for future in tqdm(as_completed(future_to_site), total=len(SITES), desc="Processing Sites"):
-            try:
-                result = future.result()
-                if result:
-                    all_records.extend(result)
-            except Exception as e:
-                site = future_to_site[future]
-                print(f"Error processing site {site}: {e}")
+    if sync_mode:
+        sync(session, limiter, end_date or date.today())
+        return
+
+    # full crawl: one task per site/pollutant/chunk, streamed into the store as chunks arrive
+    tasks = build_tasks(SITES, build_date_chunks())
+    print(f"Scheduling {len(tasks)} chunks across {MAX_WORKERS} workers...")
+    rows, n_fetched = stream_to_store(session, tasks, limiter, cache_dir=CACHE_DIR, inclusive_end=True)
 
-    if not all_records:
+    if not rows:
         print("No new records were fetched.")
         return
 
-    # Convert to DataFrame and save to CSV
-    df = pd.DataFrame(all_records)
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
-    df['latitude'] = pd.to_numeric(df['latitude'], errors='coerce')
-    df['longitude'] = pd.to_numeric(df['longitude'], errors='coerce')
-    df = df.sort_values(by=["site_code", "timestamp"]).reset_index(drop=True)
-    
-    # Reorder columns
-    df = df[['site_code', 'site_name', 'latitude', 'longitude', 'pollutant', 'timestamp', 'value']]
-    
-    df.to_csv(OUTPUT_CSV, index=False)
-    print(f"\nSuccessfully saved {len(df)} records to {OUTPUT_CSV}")
+    # a full crawl re-reads history, so fold each site back into a single part
+    with metrics.span("compact", sites=len(SITES)):
+        for site_code in SITES:
+            store.compact_site(site_code)
+    print(f"\nSuccessfully stored {rows} records from {n_fetched}/{len(tasks)} chunks in {store.STORE_DIR}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download hourly LAQN data for the selected sites.")
+    parser.add_argument("--sync", action="store_true",
+                        help="only fetch windows missing from the local store and append them")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=None,
+                        help="exclusive end date (YYYY-MM-DD) for --sync, defaults to today")
+    args = parser.parse_args()
+
     start_time = time.time()
-    main()
+    with metrics.entry_point("fetch_aq", sync=args.sync, end_date=args.end_date):
+        main(sync_mode=args.sync, end_date=args.end_date)
     print(f"Completed in {time.time() - start_time:.2f} seconds")
\ No newline at end of file
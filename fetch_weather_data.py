@@ -1,106 +1,180 @@
+import math
 import pandas as pd
 import openmeteo_requests
 import requests_cache
-import time
-from retry_requests import retry
+from requests.adapters import HTTPAdapter
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from src import config as cfg
+from src import laqn_store
+from src import metrics
+from src import weather_store
+from src.http_utils import LimitedRetry, TokenBucket
 
-# setup the api client with a cache and retry session
-cache_session = requests_cache.CachedSession('.cache', expire_after=-1)
-retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
-openmeteo = openmeteo_requests.Client(session=retry_session)
+URL = "https://archive-api.open-meteo.com/v1/archive"
+HOURLY_VARIABLES = [
+    "temperature_2m", "relative_humidity_2m", "dew_point_2m", "precipitation",
+    "snow_depth", "weather_code", "pressure_msl", "cloud_cover",
+    "shortwave_radiation", "wind_speed_10m", "wind_direction_10m", "wind_gusts_10m"
+]
+START_DATE = "2010-01-01"
+END_DATE = "2025-06-29"
 
-def fetch_weather_for_site(site_info):
+GRID_RESOLUTION = 0.1     # degrees between reanalysis grid points (ERA5-Land) around London
+BATCH_SIZE = 10           # grid cells requested per api call
+RATE_LIMIT = 1.0          # api calls per second across all workers, retries included
+RETRIES = 5
+RETRY_STATUS = [429, 500, 502, 503, 504]
+MAX_WORKERS = 4
+
+
+def count_response(response, *args, **kwargs):
+    """Response hook recording bytes and cache hits; requests_cache runs hooks for cached responses too."""
+    if getattr(response, "from_cache", False):
+        metrics.count("cache_hits")
+        return response
+    # on a cache miss both requests and requests_cache run the hook on the same network response
+    if getattr(response, "counted", False):
+        return response
+    response.counted = True
+    metrics.count("cache_misses")
+    metrics.count("bytes_downloaded", len(response.content))
+    return response
+
+
+def create_client(limiter=None):
+    """
+    Sets up the api client with a cache and a retrying adapter. Every retry draws a
+    token from limiter, like the first attempt in fetch_weather_batch does.
+    """
+    cache_session = requests_cache.CachedSession('.cache', expire_after=-1)
+    cache_session.hooks['response'].append(count_response)
+    retries = LimitedRetry(total=RETRIES, backoff_factor=0.2, status_forcelist=RETRY_STATUS, limiter=limiter)
+    adapter = HTTPAdapter(max_retries=retries)
+    cache_session.mount('https://', adapter)
+    cache_session.mount('http://', adapter)
+    return openmeteo_requests.Client(session=cache_session)
+
+
+def snap_to_grid(lat, lon, resolution=GRID_RESOLUTION):
+    """Nearest reanalysis grid point, so sites sharing a cell map to the same key."""
+    snap = lambda x: round(round(x / resolution) * resolution, 6)
+    return snap(float(lat)), snap(float(lon))
+
+
+def group_sites_by_cell(site_list, resolution=GRID_RESOLUTION):
+    """Maps each grid cell to the site codes inside it."""
+    cells = {}
+    for site in site_list:
+        cell = snap_to_grid(site["laqn_lat"], site["laqn_lon"], resolution)
+        cells.setdefault(cell, []).append(site["site_code"])
+    return cells
+
+
+def response_to_frame(response):
+    """Turns one location's hourly response into a dataframe."""
+    hourly = response.Hourly()
+
+    # generate a full date range
+    hourly_data = {"time": pd.date_range(
+        start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
+        end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
+        freq=pd.Timedelta(seconds=hourly.Interval()),
+        inclusive="left"
+    )}
+
+    for i, var in enumerate(HOURLY_VARIABLES):
+        hourly_data[var] = hourly.Variables(i).ValuesAsNumpy()
+
+    return pd.DataFrame(data=hourly_data)
+
+
+def fetch_weather_batch(cells, client, limiter=None, url=URL):
     """
-    worker function to fetch and save weather data for a single site.
+    worker function to fetch several grid cells in one api call.
+    returns {cell: hourly dataframe}.
     """
-    site_code = site_info["site_code"]
-    lat = site_info["laqn_lat"]
-    lon = site_info["laqn_lon"]
-    
-    output_dir = cfg.RAW_WTH
-    output_file = output_dir / f"weather_{site_code}.csv"
-    
-    if output_file.exists():
-        return f"skipped: data for {site_code} already exists."
-
-    # define api parameters
-    url = "https://archive-api.open-meteo.com/v1/archive"
-    hourly_variables = [
-        "temperature_2m", "relative_humidity_2m", "dew_point_2m", "precipitation",
-        "snow_depth", "weather_code", "pressure_msl", "cloud_cover",
-        "shortwave_radiation", "wind_speed_10m", "wind_direction_10m", "wind_gusts_10m"
-    ]
     params = {
-        "latitude": lat,
-        "longitude": lon,
-        "start_date": "2010-01-01",
-        "end_date": "2025-06-29",
-        "hourly": hourly_variables,
+        "latitude": [lat for lat, _ in cells],
+        "longitude": [lon for _, lon in cells],
+        # the grid-cell series itself, so every site in the cell can share it
+        "elevation": [math.nan] * len(cells),
+        "start_date": START_DATE,
+        "end_date": END_DATE,
+        "hourly": HOURLY_VARIABLES,
         "timeformat": "iso8601",
         "timezone": "GMT"
     }
+    with metrics.span("fetch_batch", cells=len(cells)):
+        if limiter is not None:
+            limiter.acquire()
+        responses = client.weather_api(url, params=params)
+        return {cell: response_to_frame(response) for cell, response in zip(cells, responses)}
+
+
+def fetch_sites(site_list, client=None, store_dir=weather_store.STORE_DIR, url=URL, show_progress=True):
+    """
+    Fetches each unique grid cell once, in batches, and writes the series out to
+    every site in the cell. Returns the number of api calls made.
+    """
+    # only cells with at least one site still missing from the store need fetching
+    cells = group_sites_by_cell(site_list)
+    pending = {cell: codes for cell, codes in cells.items()
+               if any(not weather_store.has_site(code, store_dir) for code in codes)}
+    cell_list = list(pending)
+    batches = [cell_list[i:i + BATCH_SIZE] for i in range(0, len(cell_list), BATCH_SIZE)]
+
+    print(f"{len(site_list)} sites fall in {len(cells)} grid cells; "
+          f"fetching {len(pending)} cells in {len(batches)} requests using {MAX_WORKERS} workers...")
+    if not batches:
+        return 0
+
+    limiter = TokenBucket(RATE_LIMIT, burst=1)
+    client = client or create_client(limiter)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {executor.submit(fetch_weather_batch, batch, client, limiter, url): batch for batch in batches}
+
+        for future in tqdm(as_completed(futures), total=len(batches), desc="fetching weather data",
+                           disable=not show_progress):
+            batch = futures[future]
+            try:
+                frames = future.result()
+            except Exception as e:
+                metrics.count("batches_failed")
+                print(f"error: could not fetch a batch of {len(batch)} cells. reason: {e}")
+                continue
+
+            # fan each cell's series back out to its sites
+            for cell, frame in frames.items():
+                for site_code in pending[cell]:
+                    weather_store.write_site(site_code, frame, store_dir)
+                    metrics.count("rows_out", len(frame))
+    return len(batches)
+
+
+def load_site_list():
+    """
+    LAQN site coordinates from the AQ store metadata, so weather can be fetched
+    without waiting for the traffic matching; falls back to the matched-sites file.
+    """
+    metadata = laqn_store.load_site_metadata()
+    if metadata:
+        return [{"site_code": code, "laqn_lat": float(info["lat"]), "laqn_lon": float(info["lon"])}
+                for code, info in sorted(metadata.items()) if info.get("lat") and info.get("lon")]
+    sites_df = pd.read_csv(cfg.MATCHED_SITES)
+    return sites_df[["site_code", "laqn_lat", "laqn_lon"]].to_dict('records')
 
-    try:
-        responses = openmeteo.weather_api(url, params=params)
-        response = responses[0]
-        hourly = response.Hourly()
-
-        # generate a full date range
-        hourly_data = {"time": pd.date_range(
-            start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
-            end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
-            freq=pd.Timedelta(seconds=hourly.Interval()),
-            inclusive="left"
-        )}
-        
-        # process the response into a dataframe
-        for i, var in enumerate(hourly_variables):
-            hourly_data[var] = hourly.Variables(i).ValuesAsNumpy()
-        
-        hourly_dataframe = pd.DataFrame(data=hourly_data)
-        
-        # save the data
-        hourly_dataframe.to_csv(output_file, index=False)
-        return f"success: saved data for {site_code}."
-
-    except Exception as e:
-        return f"error: could not process {site_code}. reason: {e}"
 
 def main():
     try:
-        sites_df = pd.read_csv(cfg.MATCHED_SITES)
+        site_list = load_site_list()
     except FileNotFoundError:
-        print(f"error: site mapping file not found at {cfg.MATCHED_SITES}")
+        print(f"error: no site metadata in {laqn_store.STORE_DIR} and no site mapping file at {cfg.MATCHED_SITES}")
         return
 
-    site_list = sites_df.to_dict('records')
-
-    output_dir = cfg.RAW_WTH
-    output_dir.mkdir(parents=True, exist_ok=True)
-    
-    max_workers = 4
-    
-    print(f"starting weather data fetch for {len(site_list)} sites using {max_workers} workers...")
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {}
-        for site in site_list:
-            # submit a new task to the executor
-            future = executor.submit(fetch_weather_for_site, site)
-            futures[future] = site['site_code']
-            # add a short delay between starting each thread to avoid rate-limiting
-            time.sleep(1) 
-        
-        for future in tqdm(as_completed(futures), total=len(site_list), desc="fetching weather data"):
-            try:
-                result = future.result()
-            except Exception as e:
-                print(f"a worker failed with an unexpected error: {e}")
-
+    fetch_sites(site_list)
     print("\nweather data fetching process complete.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with metrics.entry_point("fetch_weather"):
+        main()
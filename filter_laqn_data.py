@@ -1,60 +1,113 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
 import pandas as pd
-from sklearn.impute import KNNImputer
 from src import config as cfg
-
-input_file = cfg.RAW_AQ / "london_air_quality_2010_2025.csv"
-df = pd.read_csv(input_file)
-
-# Convert timestamp to datetime objects
-df['timestamp'] = pd.to_datetime(df['timestamp'])
-
-# Pivot the data, keeping metadata
-df_pivoted = df.pivot_table(
-    index=['timestamp', 'site_code', 'site_name', 'latitude', 'longitude'],
-    columns='pollutant',
-    values='value'
-).reset_index()
-
-# Rename the timestamp column for clarity
-df_pivoted = df_pivoted.rename(columns={"timestamp": "date"})
-
-# Set the date as the main index for time-series operations
-df_pivoted = df_pivoted.set_index('date')
-
-# Group by Site
-# Create a dictionary of DataFrames, one for each site
-sites = {site_code: group for site_code, group in df_pivoted.groupby('site_code')}
-
-# Clean and Impute All Sites
-print(f"Starting imputation for {len(sites)} sites...")
-final_imputed_sites = {}
-imputer = KNNImputer(n_neighbors=5)
-
-for site_code, site_df in sites.items():
-    df_copy = site_df.copy()
-
-    # Combine reference PM2.5 and non-reference FINE data
-    df_copy['pm25_combined'] = df_copy['PM2.5'].combine_first(df_copy['FINE'])
-
-    # Use KNN Imputation for any remaining gaps in NO2 and the combined PM2.5
-    impute_cols = ['NO2', 'pm25_combined']
-    df_copy[impute_cols] = imputer.fit_transform(df_copy[impute_cols])
-
-    # Rename final columns
-    df_copy = df_copy.rename(columns={'NO2': 'NO2_final', 'pm25_combined': 'PM2.5_final'})
-
-    # Keep only the necessary final columns along with metadata
-    final_cols = ['site_code', 'site_name', 'latitude', 'longitude', 'NO2_final', 'PM2.5_final']
-    final_imputed_sites[site_code] = df_copy[final_cols]
-
-
-# Combine and Save Final Dataset
-final_dataset = pd.concat(final_imputed_sites.values())
-
-output_path = cfg.INT_AQ / 'full_clean_air_quality_final.csv'
-
-output_path.parent.mkdir(parents=True, exist_ok=True)
-
-final_dataset.to_csv(output_path)
-
-print(f"\nFinal dataset saved to: {output_path}")
\ No newline at end of file
+from src import imputation
+from src import laqn_store as store
+from src import metrics
+
+POLLUTANTS = ['NO2', 'PM2.5', 'FINE']
+IMPUTE_COLS = ['NO2', 'pm25_combined']
+
+
+def pivot_site(site_df, pollutants=POLLUTANTS):
+    """
+    Long-to-wide for a single site on integer codes: rows are the site's distinct
+    timestamps, columns the pollutants, duplicate readings averaged like pivot_table.
+    Site name and coordinates are constant per site, so they stay out of the index.
+    """
+    times, time_idx = np.unique(site_df['timestamp'].to_numpy(), return_inverse=True)
+    col_idx = pd.Categorical(site_df['pollutant'], categories=pollutants).codes
+    known = col_idx >= 0
+    flat = time_idx[known] * len(pollutants) + col_idx[known]
+
+    size = len(times) * len(pollutants)
+    values = site_df['value'].to_numpy(dtype=np.float64)[known]
+    sums = np.bincount(flat, weights=values, minlength=size).reshape(len(times), len(pollutants))
+    counts = np.bincount(flat, minlength=size).reshape(len(times), len(pollutants))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        wide = np.where(counts > 0, sums / counts, np.nan)
+
+    # like pivot_table, drop timestamps with no reading for any pollutant and keep the stored float32
+    has_reading = counts.any(axis=1)
+    return pd.DataFrame(wide[has_reading].astype(site_df['value'].dtype),
+                        index=pd.DatetimeIndex(times[has_reading], name='date'), columns=pollutants)
+
+
+def clean_site(site_code, impute_mode=imputation.IMPUTE_MODE):
+    """Reads, pivots, combines and imputes one site. Runs inside a worker process."""
+    with metrics.span("clean_site", site=site_code, impute_mode=impute_mode) as span:
+        raw = store.read_site(site_code)
+        wide = pivot_site(raw)
+        metrics.count("rows_in", len(raw))
+
+        # Combine reference PM2.5 and non-reference FINE data
+        wide['pm25_combined'] = wide['PM2.5'].combine_first(wide['FINE'])
+
+        # Impute any remaining gaps in NO2 and the combined PM2.5
+        _, filled, stats = imputation.impute_job(site_code, wide, IMPUTE_COLS, impute_mode)
+        metrics.count("values_imputed", stats["missing"])
+        span.set(rows_in=len(raw), rows_out=len(filled), impute_seconds=stats["seconds"])
+
+        # Rename final columns
+        filled = filled.rename(columns={'NO2': 'NO2_final', 'pm25_combined': 'PM2.5_final'})
+        return site_code, filled, stats
+
+
+def main(impute_mode=imputation.IMPUTE_MODE, max_workers=imputation.MAX_WORKERS):
+    metadata = store.load_site_metadata()
+    site_codes = store.stored_sites()
+    if not site_codes:
+        print(f"error: no sites found in {store.STORE_DIR}")
+        return
+
+    output_path = cfg.AQ_WIDE
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # one site at a time per worker; only the cleaned site frames come back
+    print(f"Starting {impute_mode} cleaning for {len(site_codes)} sites...")
+    if max_workers <= 1:
+        executor = None
+        results = map(clean_site, site_codes, repeat(impute_mode))
+    else:
+        executor = ProcessPoolExecutor(max_workers=min(max_workers, len(site_codes)))
+        results = executor.map(clean_site, site_codes, repeat(impute_mode))
+
+    all_stats = []
+    try:
+        for i, (site_code, filled, stats) in enumerate(results):
+            # Join the site metadata back on at the end
+            site_info = metadata.get(site_code, {})
+            final = pd.DataFrame({
+                'site_code': site_code,
+                'site_name': site_info.get('name'),
+                'latitude': pd.to_numeric(site_info.get('lat'), errors='coerce'),
+                'longitude': pd.to_numeric(site_info.get('lon'), errors='coerce'),
+            }, index=filled.index)
+            final[['NO2_final', 'PM2.5_final']] = filled[['NO2_final', 'PM2.5_final']]
+
+            # readings are stored as float32; six significant digits is well past sensor precision
+            with metrics.span("write_site", site=site_code, rows=len(final)):
+                final.to_csv(output_path, mode='w' if i == 0 else 'a', header=i == 0, float_format='%.6g')
+            metrics.count("rows_out", len(final))
+            all_stats.append(stats)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    print(pd.DataFrame(all_stats).set_index('site_code').fillna(0).to_string())
+    print(f"\nFinal dataset saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pivot, combine and impute the LAQN data.")
+    parser.add_argument("--impute-mode", choices=["windowed", "fast", "knn"], default=imputation.IMPUTE_MODE,
+                        help="windowed: interpolation + blocked KNN (default); fast: no KNN; knn: whole-history KNN")
+    parser.add_argument("--workers", type=int, default=imputation.MAX_WORKERS,
+                        help="sites cleaned in parallel")
+    args = parser.parse_args()
+    with metrics.entry_point("clean_aq", impute_mode=args.impute_mode, workers=args.workers):
+        main(args.impute_mode, args.workers)
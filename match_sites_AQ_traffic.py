@@ -1,28 +1,25 @@
 import pandas as pd
-import numpy as np
 from src import config as cfg
-from math import radians, cos, sin, asin, sqrt
+from src import metrics
+from src import spatial
+from src import traffic_index
 
-def vectorized_haversine(lat1, lon1, lat2, lon2):
-    R = 6371
-    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1.reshape(-1, 1)
-    dlon = lon2 - lon1.reshape(-1, 1)
-    a = np.sin(dlat / 2)**2 + np.cos(lat1).reshape(-1, 1) * np.cos(lat2) * np.sin(dlon / 2)**2
-    c = 2 * np.arcsin(np.sqrt(a))
-    return R * c
+N_NEIGHBOURS = 5          # count points kept per site for distance-weighted traffic
+NEIGHBOUR_RADIUS_KM = 3.0 # beyond this only the nearest count point is kept
 
 def main():
     # load data
-    laqn_sites = pd.read_csv(cfg.INT_AQ / 'laqn_wide.csv')[['site_code', 'site_name', 'latitude', 'longitude']].drop_duplicates('site_code').reset_index(drop=True)
-    dft_df = pd.read_csv(cfg.RAW_TRF / "dft_traffic_counts_aadf.csv", low_memory=False)
-    dft_sites = dft_df[['count_point_id', 'latitude', 'longitude', 'road_type']].dropna().drop_duplicates('count_point_id').reset_index(drop=True)
+    with metrics.span("load") as span:
+        laqn_sites = pd.read_csv(cfg.AQ_WIDE)[['site_code', 'site_name', 'latitude', 'longitude']].drop_duplicates('site_code').reset_index(drop=True)
+        dft_sites = traffic_index.load_count_points()
+        span.set(sites=len(laqn_sites), count_points=len(dft_sites))
 
-    # calculate distances and find nearest
-    distance_matrix = vectorized_haversine(laqn_sites['latitude'].values, laqn_sites['longitude'].values, dft_sites['latitude'].values, dft_sites['longitude'].values)
-    nearest_dft_indices = np.argmin(distance_matrix, axis=1)
-    min_distances = np.min(distance_matrix, axis=1)
-    nearest_dft_sites = dft_sites.loc[nearest_dft_indices]
+    # nearest count points from a haversine ball tree instead of a full distance matrix
+    with metrics.span("nearest"):
+        index = spatial.PointIndex(dft_sites['latitude'].values, dft_sites['longitude'].values)
+        distances, positions = index.nearest(laqn_sites['latitude'].values, laqn_sites['longitude'].values, k=1)
+    min_distances = distances[:, 0]
+    nearest_dft_sites = dft_sites.iloc[positions[:, 0]]
 
     # construct final dataframe
     matches_df = pd.DataFrame({
@@ -44,5 +41,17 @@ def main():
     
     print(f"mapping complete. new file saved to: {output_path}")
 
+    # several nearby count points per site, with inverse-distance weights
+    with metrics.span("neighbours", k=N_NEIGHBOURS, radius_km=NEIGHBOUR_RADIUS_KM):
+        neighbours = spatial.neighbour_table(laqn_sites['site_code'].values, laqn_sites['latitude'].values,
+                                             laqn_sites['longitude'].values, index, dft_sites['count_point_id'].values,
+                                             k=N_NEIGHBOURS, radius_km=NEIGHBOUR_RADIUS_KM)
+    metrics.count("rows_out", len(matches_df) + len(neighbours))
+    neighbours = neighbours.rename(columns={'query_id': 'site_code', 'point_id': 'count_point_id'})
+    neighbours['road_type'] = dft_sites['road_type'].values[neighbours['position']]
+    neighbours.drop(columns='position').to_csv(cfg.MATCHED_NEIGHBOURS, index=False)
+    print(f"{len(neighbours)} site/count point neighbours saved to: {cfg.MATCHED_NEIGHBOURS}")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with metrics.entry_point("match_sites"):
+        main()
\ No newline at end of file
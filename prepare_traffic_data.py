@@ -0,0 +1,35 @@
+import argparse
+import time
+
+from src import metrics
+from src import traffic_index
+
+
+def main(force=False):
+    """Builds the compact traffic tables from the national AADF file, skipping the work if it is unchanged."""
+    start = time.perf_counter()
+    try:
+        with metrics.span("ensure_index", force=force) as span:
+            rebuilt = traffic_index.ensure_index(force=force)
+            span.set(rebuilt=rebuilt)
+    except FileNotFoundError as e:
+        print(f"error: {e}")
+        return
+
+    if not rebuilt:
+        print(f"traffic index in {traffic_index.INDEX_DIR} is up to date with {traffic_index.SOURCE.name}.")
+        return
+    aadf = traffic_index.load_aadf()
+    points = traffic_index.load_count_points()
+    metrics.count("rows_out", len(aadf) + len(points))
+    print(f"traffic index rebuilt in {time.perf_counter() - start:.1f}s: "
+          f"{len(aadf):,} (count_point_id, year) rows, {len(points):,} count points")
+    print(f"saved to: {traffic_index.INDEX_DIR}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index the DfT AADF traffic counts.")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the source file is unchanged")
+    args = parser.parse_args()
+    with metrics.entry_point("prepare_traffic", force=args.force):
+        main(args.force)
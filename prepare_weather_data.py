@@ -2,55 +2,51 @@
 
 import pandas as pd
 from src import config as cfg
-
-def prepare_full_weather_data():
-    
-    # define input and output directories
-    input_dir = cfg.RAW_WTH
-    output_dir = cfg.INT_WTH
-    output_dir.mkdir(parents=True, exist_ok=True)
-    output_path = output_dir / "weather_combined_full.csv"
-
-    weather_files = list(input_dir.glob("weather_*.csv"))
-
-    if not weather_files:
-        print(f"error: no weather files were found in {input_dir}")
-        return
-
-    print(f"found {len(weather_files)} weather files to combine.")
-
-    all_weather_dfs = []
-    for file_path in weather_files:
+from src import metrics
+from src import weather_store
+
+def import_legacy_csvs(input_dir=cfg.RAW_WTH, store_dir=weather_store.STORE_DIR):
+    """Moves per-site CSVs from older runs into the weather store, one site at a time."""
+    imported = 0
+    for file_path in sorted(input_dir.glob("weather_*.csv")):
+        # extract site_code from filename
+        site_code = file_path.stem.replace('weather_', '')
+        if weather_store.has_site(site_code, store_dir):
+            continue
         try:
-            # extract site_code from filename
-            site_code = file_path.stem.replace('weather_', '')
-            temp_df = pd.read_csv(file_path, parse_dates=['time'])
-            temp_df['site_code'] = site_code
-            
-            all_weather_dfs.append(temp_df)
-            print(f"successfully processed file: {file_path.name}")
-
+            with metrics.span("import_csv", site=site_code, bytes=file_path.stat().st_size):
+                weather_store.write_site(site_code, pd.read_csv(file_path), store_dir)
+            imported += 1
+            print(f"successfully imported file: {file_path.name}")
         except Exception as e:
             print(f"an error occurred while processing {file_path.name}: {e}")
-
-    if not all_weather_dfs:
-        print("\nerror: no data was successfully processed from the files.")
+    return imported
+
+
+def prepare_full_weather_data(store_dir=weather_store.STORE_DIR):
+    """
+    The combined weather data is the site-partitioned store itself, opened as one
+    dataset; nothing is concatenated or rewritten. Downstream steps read the sites
+    and columns they need with weather_store.load_weather.
+    """
+    imported = import_legacy_csvs(store_dir=store_dir)
+    if imported:
+        print(f"imported {imported} legacy csv files into {store_dir}")
+
+    sites = weather_store.stored_sites(store_dir)
+    if not sites:
+        print(f"error: no weather data was found in {store_dir}")
         return
 
-    print("\ncombining all processed files into a single dataframe...")
-    combined_df = pd.concat(all_weather_dfs, ignore_index=True)
-
-    # ensure the 'time' column is timezone-aware (utc)
-    if combined_df['time'].dt.tz is None:
-        combined_df['time'] = combined_df['time'].dt.tz_localize('UTC')
-    else:
-        combined_df['time'] = combined_df['time'].dt.tz_convert('UTC')
-
-    combined_df.to_csv(output_path, index=False)
-
-    print(f"full combined weather data has been saved to: {output_path}")
-    print(f"final shape: {combined_df.shape}")
+    with metrics.span("count_rows", sites=len(sites)) as span:
+        dataset = weather_store.dataset(store_dir)
+        rows = dataset.count_rows()
+        size = sum(f.stat().st_size for f in store_dir.rglob("*.parquet"))
+        span.set(rows=rows, bytes=size)
+    print(f"weather dataset at {store_dir}")
+    print(f"sites: {len(sites)}, rows: {rows:,}, on disk: {size / 2**20:.1f} MB")
 
 
 if __name__ == "__main__":
-    prepare_full_weather_data()
\ No newline at end of file
+    with metrics.entry_point("prepare_weather"):
+        prepare_full_weather_data()
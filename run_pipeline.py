@@ -0,0 +1,83 @@
+import argparse
+
+from src import config as cfg
+from src import imputation
+from src import laqn_store
+from src import metrics
+from src import pipeline
+from src import traffic_index
+from src.pipeline import Stage
+
+FETCH_STAGES = ["fetch_aq", "fetch_weather"]
+
+
+def build_stages(impute_mode=imputation.IMPUTE_MODE, workers=imputation.MAX_WORKERS, traffic="nearest",
+                 end_date=None, history_features=False, streaming=False):
+    """
+    The pipeline in README order, with each stage's inputs and outputs taken from src/config.py.
+    Stage code fingerprints cover each script and the src modules it imports (pipeline.src_imports).
+    """
+    aq_sites = cfg.AQ_STORE / laqn_store.SITES_FILE
+    aq_parts = cfg.AQ_STORE / "site_code=*"
+    traffic_tables = [traffic_index.INDEX_DIR / traffic_index.AADF_FILE,
+                      traffic_index.INDEX_DIR / traffic_index.POINTS_FILE]
+    fetch_args = ["--sync"] + (["--end-date", end_date] if end_date else [])
+    build_args = (["--traffic", traffic] + (["--history-features"] if history_features else [])
+                  + (["--streaming"] if streaming else []))
+
+    return [
+        # network stages have no file inputs, so after their first run they only re-run with --refresh
+        Stage("fetch_aq", "fetch_data_Laqn.py", args=fetch_args,
+              outputs=[aq_parts, aq_sites]),
+        Stage("fetch_weather", "fetch_weather_data.py", after=["fetch_aq"],
+              inputs=[aq_sites], outputs=[cfg.WTH_STORE]),
+        Stage("prepare_weather", "prepare_weather_data.py", after=["fetch_weather"],
+              inputs=[cfg.WTH_STORE, cfg.RAW_WTH / "weather_*.csv"], outputs=[cfg.WTH_STORE]),
+        Stage("clean_aq", "filter_laqn_data.py", after=["fetch_aq"],
+              args=["--impute-mode", impute_mode, "--workers", str(workers)],
+              inputs=[aq_parts, aq_sites], outputs=[cfg.AQ_WIDE]),
+        Stage("prepare_traffic", "prepare_traffic_data.py",
+              inputs=[traffic_index.SOURCE], outputs=traffic_tables),
+        Stage("match_sites", "match_sites_AQ_traffic.py", after=["clean_aq", "prepare_traffic"],
+              inputs=[cfg.AQ_WIDE] + traffic_tables, outputs=[cfg.MATCHED_SITES, cfg.MATCHED_NEIGHBOURS]),
+        Stage("build_dataset", "build_model_dataset.py", after=["match_sites", "prepare_weather"],
+              args=build_args,
+              inputs=[cfg.AQ_WIDE, cfg.MATCHED_SITES, cfg.MATCHED_NEIGHBOURS, cfg.WTH_STORE] + traffic_tables,
+              outputs=[cfg.MODEL_READY_DIR if streaming else cfg.MODEL_READY]),
+    ]
+
+
+def print_summary(results, stages):
+    print("\nstage             status      seconds")
+    for stage in stages:
+        result = results.get(stage.name, {"status": "-", "seconds": 0.0})
+        print(f"{stage.name:<17} {result['status']:<10} {result['seconds']:8.1f}")
+    print(f"{'total':<17} {'':<10} {sum(r['seconds'] for r in results.values()):8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pipeline, re-running only stages whose inputs, code or parameters changed.")
+    parser.add_argument("--force", nargs="+", default=[], metavar="STAGE", help="re-run these stages regardless")
+    parser.add_argument("--refresh", action="store_true", help="re-run the network fetch stages (LAQN sync, weather)")
+    parser.add_argument("--dry-run", action="store_true", help="only report which stages would run")
+    parser.add_argument("--jobs", type=int, default=3, help="independent stages run in parallel")
+    parser.add_argument("--impute-mode", choices=["windowed", "fast", "knn"], default=imputation.IMPUTE_MODE)
+    parser.add_argument("--workers", type=int, default=imputation.MAX_WORKERS, help="sites cleaned in parallel")
+    parser.add_argument("--traffic", choices=["nearest", "idw"], default="nearest")
+    parser.add_argument("--history-features", action="store_true", help="add pollutant history features in the build")
+    parser.add_argument("--streaming", action="store_true", help="build the dataset site by site into cfg.MODEL_READY_DIR")
+    parser.add_argument("--end-date", default=None, help="exclusive end date (YYYY-MM-DD) for the LAQN sync")
+    args = parser.parse_args()
+
+    stages = build_stages(args.impute_mode, args.workers, args.traffic, args.end_date, args.history_features,
+                          args.streaming)
+    force = args.force + (FETCH_STAGES if args.refresh else [])
+    with metrics.entry_point("pipeline", jobs=args.jobs, dry_run=args.dry_run):
+        results = pipeline.run(stages, max_workers=args.jobs, force=force, dry_run=args.dry_run)
+    print_summary(results, stages)
+    if any(r["status"] in ("failed", "blocked") for r in results.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
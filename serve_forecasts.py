@@ -0,0 +1,128 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from src import config as cfg
+from src import metrics
+from src.forecasting import MAX_HORIZON, MODELS_DIR, Forecaster
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+
+def load_history(path, forecaster):
+    """The columns the forecaster reads from a model-ready dataset (file or partitioned directory), for its sites."""
+    names = ds.dataset(path, format="parquet", partitioning="hive").schema.names
+    wanted = ['site_code', 'date'] + forecaster.spec.targets + forecaster.hourly_columns + forecaster.site_columns
+    columns = [col for col in dict.fromkeys(wanted) if col in names]
+    sites = forecaster.manifest["sites"]
+    filters = [('site_code', 'in', sites)] if sites else None
+    df = pd.read_parquet(path, columns=columns, filters=filters)
+    return df.sort_values(['site_code', 'date'], kind='stable')
+
+
+def to_columns(df):
+    """{column: [values]} for a JSON response, with ISO hours for dates and null for NaN."""
+    out = {}
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.DatetimeTZDtype):
+            out[col] = values.dt.strftime('%Y-%m-%dT%H:%M:%SZ').tolist()
+        elif values.dtype.kind == 'f':
+            out[col] = [None if np.isnan(v) else v for v in values.tolist()]
+        else:
+            out[col] = values.tolist()
+    return out
+
+
+class ForecastHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health    sites served, targets and the longest horizon
+    POST /forecast  {"sites": [...], "horizons": [...]} → {"site_code": [...], "date": [...], "horizon": [...], <target>: [...]}
+    POST /observe   {"site_code": [...], "date": [...], <column>: [...]}, the columns Forecaster.observe takes
+    Bodies are JSON with one list per column. Requests share one Forecaster, one at a time.
+    """
+    protocol_version = "HTTP/1.1"
+    forecaster = None
+    lock = threading.Lock()
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._send(404, {"error": f"no route {self.path}"})
+        forecaster = self.forecaster
+        self._send(200, {"sites": sorted(forecaster.sites), "targets": forecaster.targets,
+                         "max_horizon": forecaster.max_horizon})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+            with self.lock:
+                if self.path == "/forecast":
+                    with metrics.span("forecast", sites=len(request["sites"])) as span:
+                        out = self.forecaster.forecast(request["sites"], request.get("horizons"))
+                        span.set(rows=len(out))
+                    metrics.count("forecast_requests")
+                    return self._send(200, to_columns(out))
+                if self.path == "/observe":
+                    with metrics.span("observe") as span:
+                        rows = pd.DataFrame(request)
+                        rows['date'] = pd.to_datetime(rows['date'], utc=True)
+                        self.forecaster.observe(rows)
+                        span.set(rows=len(rows))
+                    metrics.count("observe_requests")
+                    return self._send(200, {"rows": len(rows)})
+            self._send(404, {"error": f"no route {self.path}"})
+        except (KeyError, ValueError) as e:
+            self._send(400, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(model_dir=MODELS_DIR, history=cfg.MODEL_READY, host=HOST, port=PORT, max_horizon=MAX_HORIZON):
+    """Loads the models, warms the forecaster up with the observed history and serves it until interrupted."""
+    start = time.perf_counter()
+    with metrics.span("warm_up", history=history) as span:
+        forecaster = Forecaster(model_dir, max_horizon)
+        if history is not None:
+            forecaster.observe(load_history(history, forecaster))
+        span.set(sites=len(forecaster.sites))
+    print(f"loaded {model_dir} and {len(forecaster.sites)} sites of history in {time.perf_counter() - start:.1f}s")
+
+    ForecastHandler.forecaster = forecaster
+    server = ThreadingHTTPServer((host, port), ForecastHandler)
+    print(f"serving forecasts on http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve NO2/PM2.5 forecasts from saved models over HTTP.")
+    parser.add_argument("--models", default=str(MODELS_DIR), help="directory written by src.forecasting.save_models")
+    parser.add_argument("--history", default=str(cfg.MODEL_READY),
+                        help="model-ready dataset to warm up from ('none' to start empty)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-horizon", type=int, default=MAX_HORIZON)
+    args = parser.parse_args()
+    with metrics.entry_point("serve", port=args.port):
+        main(args.models, None if args.history == "none" else args.history, args.host, args.port, args.max_horizon)
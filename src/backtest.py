@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+from src.features import HOUR_NS, add_features, to_hours
+from src.forecasting import MAX_HORIZON, Forecaster, model_manifest
+
+# aadf_vehicle_count changes from year to year, so a backtest reads it per hour like the
+# weather instead of holding the latest value for every origin
+SITE_COLUMNS = ['latitude', 'longitude', 'road_type']
+CHUNK_ROWS = 2**18      # feature rows per batched predict call
+METRICS = ['n', 'r2', 'mae', 'rmse']
+
+
+def daily_origins(start, end, hour=0):
+    """Forecast origins (hours since the epoch) at `hour` UTC on every day from start to end."""
+    start, end = (pd.Timestamp(t) if pd.Timestamp(t).tz else pd.Timestamp(t, tz='UTC') for t in (start, end))
+    hours = to_hours(pd.date_range(start.normalize(), end, freq='D')) + hour
+    return hours[hours <= to_hours([end])[0]]
+
+
+def history_forecaster(manifest, models, df, max_horizon=MAX_HORIZON):
+    """A Forecaster that has observed all of df (model-ready rows), so it can forecast from any hour of it."""
+    hours = to_hours(df['date'])
+    forecaster = Forecaster.from_models(manifest, models, max_horizon, history_hours=int(hours.max() - hours.min()) + 1,
+                                        site_columns=SITE_COLUMNS)
+    forecaster.observe(df)
+    return forecaster
+
+
+def backtest(forecaster, origins, sites=None, chunk_rows=CHUNK_ROWS):
+    """
+    Forecasts 1 .. max_horizon hours after every origin for every site, next to what was
+    observed, as a DataFrame of site_code, origin, date, horizon, {target}_forecast and
+    {target} (NaN where not observed). The forecaster must have observed the hours the
+    forecasts read (history_forecaster); only targets up to each origin are used, and
+    the weather after it is the observed weather. The models are reused for every
+    origin, so origins should come after the models' training rows.
+
+    Every (origin, site) pair is a column of one feature grid, so the features of all
+    pairs are built together and each of the spec.min_lag-hour recursion steps is one
+    predict call per target, chunk_rows feature rows at a time.
+    """
+    sites = list(forecaster.sites) if sites is None else list(sites)
+    unknown = [s for s in sites if s not in forecaster.sites]
+    if unknown:
+        raise ValueError(f"no observations for {unknown}")
+    steps = forecaster.max_horizon
+    origins = np.asarray(origins, dtype=np.int64)
+    pair_sites = np.tile([forecaster.sites[s] for s in sites], len(origins))
+    pair_origins = np.repeat(origins, len(sites))
+
+    predictions = np.empty((len(pair_sites), steps, len(forecaster.targets)))
+    per_chunk = max(1, chunk_rows // steps)
+    for first in range(0, len(pair_sites), per_chunk):
+        chunk = slice(first, first + per_chunk)
+        predictions[chunk] = forecaster.forecast_from(pair_sites[chunk], pair_origins[chunk], steps)
+    observed = forecaster.observed.window(pair_sites, pair_origins + 1, steps)
+
+    horizons = np.arange(1, steps + 1)
+    out = pd.DataFrame({
+        'site_code': pd.Categorical(np.repeat(np.tile(sites, len(origins)), steps), categories=sites),
+        'origin': pd.to_datetime(np.repeat(pair_origins, steps) * HOUR_NS, utc=True),
+        'date': pd.to_datetime((pair_origins[:, None] + horizons).reshape(-1) * HOUR_NS, utc=True),
+        'horizon': np.tile(horizons, len(pair_sites)),
+    })
+    for t, target in enumerate(forecaster.targets):
+        out[f"{target}_forecast"] = predictions[:, :, t].reshape(-1)
+        if target in forecaster.spec.targets:
+            out[target] = observed[:, :, forecaster.spec.targets.index(target)].reshape(-1)
+    return out
+
+
+def rolling_backtest(df, fit, origins, spec, refit_every=None, dummies=None, sites=None,
+                     max_horizon=MAX_HORIZON, chunk_rows=CHUNK_ROWS):
+    """
+    backtest() with models refitted on an expanding window of df (model-ready rows).
+    fit(rows) → ({target: fitted model}, X_train) gets the rows up to a refit origin with
+    spec's history features added, and its models forecast every origin from there until
+    the next refit, refit_every hours later (default: fitted once, at the first origin).
+    Every fit must return the same feature columns; dummies is as for save_models.
+    """
+    origins = np.sort(np.asarray(origins, dtype=np.int64))
+    rows = add_features(df.sort_values(['site_code', 'date'], kind='stable'), spec)
+    hours = to_hours(rows['date'])
+    step = refit_every or int(origins[-1] - origins[0]) + 1
+
+    forecaster, parts = None, []
+    for start in range(int(origins[0]), int(origins[-1]) + 1, step):
+        period = origins[(origins >= start) & (origins < start + step)]
+        if not len(period):
+            continue
+        models, X_train = fit(rows[hours <= period[0]])
+        if forecaster is None:
+            manifest = model_manifest(models, X_train, spec, dummies, sites)
+            forecaster = history_forecaster(manifest, models, df, max_horizon)
+        elif list(X_train.columns) != forecaster.features:
+            raise ValueError("every fit must return the same feature columns")
+        else:
+            forecaster.use_models(models)
+        parts.append(backtest(forecaster, period, sites, chunk_rows))
+    return pd.concat(parts, ignore_index=True)
+
+
+def horizon_metrics(results, by='horizon'):
+    """
+    R², MAE and RMSE of each target's forecasts in backtest results, with n the forecasts
+    that have an observation, per value of the `by` column(s): 'horizon', 'site_code',
+    or a column added to results such as the origin's year.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    targets = [col[:-len("_forecast")] for col in results.columns
+               if col.endswith("_forecast") and col[:-len("_forecast")] in results.columns]
+    frames = []
+    for target in targets:
+        error = (results[f"{target}_forecast"] - results[target]).to_numpy(dtype=np.float64)
+        keep = ~np.isnan(error)
+        scored = results.loc[keep, by].assign(abs_error=np.abs(error[keep]), sq_error=error[keep] ** 2,
+                                              observed=results.loc[keep, target].astype('float64'))
+        grouped = scored.groupby(by, observed=True)
+        stats = grouped.agg(n=('abs_error', 'size'), mae=('abs_error', 'mean'), mse=('sq_error', 'mean'))
+        stats['r2'] = 1 - stats['mse'] / grouped['observed'].var(ddof=0)
+        stats['rmse'] = np.sqrt(stats['mse'])
+        frames.append(stats[METRICS].reset_index().assign(target=target))
+    out = pd.concat(frames, ignore_index=True)
+    return out[by + ['target'] + METRICS]
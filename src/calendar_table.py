@@ -0,0 +1,113 @@
+import json
+
+import holidays
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src import config as cfg
+from src.features import HOUR_NS, to_hours
+
+CALENDAR_PATH = cfg.CALENDAR
+TIMEZONE = 'Europe/London'
+
+# policy periods, in UTC as the notebooks defined them
+ULEZ_START = pd.Timestamp('2019-04-08', tz='UTC')
+LOCKDOWN_START = pd.Timestamp('2020-03-23', tz='UTC')
+LOCKDOWN_END = pd.Timestamp('2021-12-29', tz='UTC')       # inclusive, like Series.between
+
+# local hours counted as rush hour on weekdays
+MORNING_RUSH = (6, 9)
+EVENING_RUSH = (16, 21)
+
+COLUMNS = ['month', 'day_of_week', 'hour', 'is_weekend', 'is_holiday', 'is_rush_hour', 'is_ulez', 'is_lockdown']
+
+# a cached table built under different definitions is rebuilt rather than reused
+DEFINITION = {
+    "timezone": TIMEZONE, "ulez_start": str(ULEZ_START), "lockdown": [str(LOCKDOWN_START), str(LOCKDOWN_END)],
+    "rush_hours": [MORNING_RUSH, EVENING_RUSH], "holidays": f"UK/ENG {holidays.__version__}",
+}
+
+
+def build_calendar(start_year, end_year):
+    """
+    One row per UTC hour from the start of start_year to the end of end_year, keyed by
+    hour_key (whole hours since the epoch, as src.features.to_hours), with the local
+    time parts and calendar flags the modelling dataset uses.
+    """
+    hours = pd.date_range(f"{start_year}-01-01", f"{end_year + 1}-01-01", freq="h", tz="UTC", inclusive="left")
+    local = hours.tz_convert(TIMEZONE)
+    table = pd.DataFrame({'hour_key': to_hours(hours)})
+    table['month'] = local.month
+    table['day_of_week'] = local.dayofweek
+    table['hour'] = local.hour
+    table['is_weekend'] = (table['day_of_week'] >= 5).astype(int)
+
+    # holidays are looked up once per local day, then compared as datetime64 days
+    uk_holidays = holidays.UK(subdiv='ENG', years=range(local.year.min(), local.year.max() + 1))
+    holiday_days = np.array(sorted(uk_holidays), dtype='datetime64[D]')
+    local_days = local.tz_localize(None).to_numpy().astype('datetime64[D]')
+    table['is_holiday'] = np.isin(local_days, holiday_days).astype(int)
+
+    is_weekday = table['is_weekend'].to_numpy() == 0
+    hour = table['hour'].to_numpy()
+    morning_rush = (hour >= MORNING_RUSH[0]) & (hour <= MORNING_RUSH[1])
+    evening_rush = (hour >= EVENING_RUSH[0]) & (hour <= EVENING_RUSH[1])
+    table['is_rush_hour'] = np.where(is_weekday & (morning_rush | evening_rush), 1, 0)
+
+    table['is_ulez'] = (hours >= ULEZ_START).astype(int)
+    table['is_lockdown'] = ((hours >= LOCKDOWN_START) & (hours <= LOCKDOWN_END)).astype(int)
+    return table
+
+
+def _cached_years(path):
+    # (start_year, end_year) of a cached table built under the current definitions, else None
+    if not path.exists():
+        return None
+    meta = pq.read_schema(path).metadata or {}
+    info = json.loads(meta.get(b"calendar", b"{}"))
+    if info.get("definition") != json.loads(json.dumps(DEFINITION)):
+        return None
+    return info["start_year"], info["end_year"]
+
+
+def load_calendar(start_year, end_year, path=CALENDAR_PATH):
+    """
+    The calendar table covering at least start_year..end_year, read from the on-disk
+    cache when it covers the range, otherwise built over the union of both ranges and cached.
+    """
+    cached = _cached_years(path)
+    if cached and cached[0] <= start_year and cached[1] >= end_year:
+        return pd.read_parquet(path)
+    if cached:
+        start_year, end_year = min(start_year, cached[0]), max(end_year, cached[1])
+
+    table = build_calendar(start_year, end_year)
+    arrow = pa.Table.from_pandas(table, preserve_index=False)
+    info = {"start_year": start_year, "end_year": end_year, "definition": DEFINITION}
+    arrow = arrow.replace_schema_metadata({**arrow.schema.metadata, b"calendar": json.dumps(info).encode()})
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    pq.write_table(arrow, tmp_path)
+    tmp_path.replace(path)
+    return table
+
+
+def add_calendar_features(df, calendar=None, time_col='date'):
+    """
+    Adds the calendar columns to df in place, joined on the integer hour key: each
+    row's features are a direct index into the table, so the cost per row is one
+    gather and everything else was computed once per hour.
+    """
+    keys = to_hours(df[time_col])
+    if calendar is None:
+        years = pd.DatetimeIndex(df[time_col]).year
+        calendar = load_calendar(int(years.min()), int(years.max()))
+    first_key = calendar['hour_key'].iat[0]
+    positions = keys - first_key
+    if len(positions) and (positions.min() < 0 or positions.max() >= len(calendar)):
+        missing = keys[(positions < 0) | (positions >= len(calendar))][0]
+        raise ValueError(f"calendar does not cover {pd.Timestamp(missing * HOUR_NS, tz='UTC')}")
+    for col in COLUMNS:
+        df[col] = calendar[col].to_numpy()[positions]
+    return df
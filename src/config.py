@@ -8,15 +8,63 @@ RAW        = DATA / "raw"
 RAW_TRF    = RAW / "traffic"
 RAW_AQ     = RAW / "pollution"
 RAW_WTH    = RAW / "weather"
+AQ_STORE   = RAW_AQ / "laqn_store"
+WTH_STORE  = RAW_WTH / "weather_store"
 
 INTERIM    = DATA / "interim"
 INT_TRF    = INTERIM / "traffic"
 INT_AQ     = INTERIM / "pollution"
 INT_WTH = INTERIM / "weather"
+AQ_WIDE    = INT_AQ / "full_clean_air_quality_final.csv"
+CALENDAR   = INTERIM / "calendar_hours.parquet"        # calendar features per UTC hour
 
 FINAL      = DATA / "final"
 FIN_TRF    = FINAL / "traffic"
 FIN_MERGED = FINAL / "aq_traffic"
+MODEL_READY = FIN_MERGED / "model_ready_dataset.parquet"
+MODEL_READY_DIR = FIN_MERGED / "model_ready_dataset"      # partitioned output of the streaming build
+PIPELINE_STATE = DATA / "_pipeline"
+METRICS    = DATA / "_metrics"            # timing spans, counters and profiles (src/metrics.py)
+TRAINING_CACHE = DATA / "_training"      # memory-mapped fold matrices and LightGBM Dataset binaries
+MODELS     = DATA / "models"          # fitted models saved for forecasting, one directory per model
 
 SITES_POLLUTION = ROOT / "src" / "data" / "selected_sites.csv"
-MATCHED_SITES = ROOT / "data" / "matched_sites_laqn_to_dft.csv"
\ No newline at end of file
+MATCHED_SITES = ROOT / "data" / "matched_sites_laqn_to_dft.csv"
+MATCHED_NEIGHBOURS = ROOT / "data" / "matched_neighbours_laqn_to_dft.csv"
+
+# column types of the model-ready dataset, in column order. measurements are float32,
+# flags int8, calendar parts int8/int16, and site and road type categorical
+# (one road_type column instead of get_dummies indicators)
+MODEL_DTYPES = {
+    'date': 'datetime64[ns, UTC]',
+    'site_code': 'category',
+    'site_name': 'category',
+    'latitude': 'float32',
+    'longitude': 'float32',
+    'NO2': 'float32',
+    'PM2.5': 'float32',
+    'temperature_2m': 'float32',
+    'relative_humidity_2m': 'float32',
+    'dew_point_2m': 'float32',
+    'precipitation': 'float32',
+    'snow_depth': 'float32',
+    'weather_code': 'int8',
+    'pressure_msl': 'float32',
+    'cloud_cover': 'float32',
+    'shortwave_radiation': 'float32',
+    'wind_speed_10m': 'float32',
+    'wind_direction_10m': 'float32',
+    'wind_gusts_10m': 'float32',
+    'year': 'int16',
+    'aadf_vehicle_count': 'float32',
+    'road_type': 'category',
+    'month': 'int8',
+    'day_of_week': 'int8',
+    'hour': 'int8',
+    'is_weekend': 'int8',
+    'is_holiday': 'int8',
+    'is_rush_hour': 'int8',
+    'is_ulez': 'int8',
+    'is_lockdown': 'int8',
+}
+MODEL_FEATURE_DTYPE = 'float32'      # pollutant history features, which follow the columns above
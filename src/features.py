@@ -0,0 +1,211 @@
+import numpy as np
+import pandas as pd
+
+TARGETS = ('NO2', 'PM2.5')
+LAGS = (24, 12)
+HOUR_NS = 3600 * 10**9
+
+
+class FeatureSpec:
+    """
+    Which history features to build for each target, all in hours:
+      lags:      value exactly n hours earlier ({col}_lag{n}h)
+      windows:   mean and max over the w hours ending `shift` hours earlier ({col}_roll{w}h_mean/_max)
+      ewm_spans: exponentially weighted mean up to `shift` hours earlier ({col}_ewm{span}h)
+    Lags, windows and EWMs are measured on timestamps, so missing hours stay missing
+    instead of shifting neighbouring rows into place.
+    """
+
+    def __init__(self, targets=TARGETS, lags=LAGS, windows=(), ewm_spans=(), shift=1):
+        self.targets = list(targets)
+        self.lags = list(lags)
+        self.windows = list(windows)
+        self.ewm_spans = list(ewm_spans)
+        self.shift = shift
+
+    def names(self):
+        names = [f"{col}_lag{n}h" for n in self.lags for col in self.targets]
+        for w in self.windows:
+            names += [f"{col}_roll{w}h_{stat}" for stat in ("mean", "max") for col in self.targets]
+        names += [f"{col}_ewm{span}h" for span in self.ewm_spans for col in self.targets]
+        return names
+
+    @property
+    def min_lag(self):
+        """Fewest hours between a feature and the newest observation it reads."""
+        lags = list(self.lags) + ([self.shift] if self.windows or self.ewm_spans else [])
+        return min(lags) if lags else None
+
+    @property
+    def context_hours(self):
+        """Hours of history an update needs to extend the features exactly."""
+        needed = list(self.lags) + [w + self.shift for w in self.windows] + [self.shift]
+        return max(needed)
+
+
+def to_hours(times):
+    """Whole hours since the epoch for a datetime-like column (tz-aware values are taken in UTC)."""
+    times = pd.DatetimeIndex(times)
+    if times.tz is not None:
+        times = times.tz_convert('UTC').tz_localize(None)
+    return times.as_unit('ns').asi8 // HOUR_NS
+
+
+def grid_features(grid, spec, ewm=None, out_rows=None):
+    """
+    Every feature for every target over one site's hourly grid (rows = consecutive
+    hours, columns = targets, NaN where an hour is missing) in one pass: each lag
+    is a row offset, each window one rolling reduction over all targets at once.
+    `ewm` may carry EWM arrays already aligned with the grid (e.g. continued from
+    a stored state). Returns {name: array over out_rows (default every grid row)}.
+    """
+    n_rows, n_targets = grid.shape
+    frame = pd.DataFrame(grid)
+    blocks = []
+
+    def shifted(values, offset):
+        # values[row - offset] for every grid row, NaN before the start of the grid
+        out = np.full_like(values, np.nan)
+        if offset < n_rows:
+            out[offset:] = values[:n_rows - offset]
+        return out
+
+    for n in spec.lags:
+        blocks.append(shifted(grid, n))
+    for w in spec.windows:
+        rolling = frame.rolling(w, min_periods=1)
+        blocks.append(shifted(rolling.mean().to_numpy(), spec.shift))
+        blocks.append(shifted(rolling.max().to_numpy(), spec.shift))
+    if ewm is None:
+        ewm = ewm_grids(grid, spec)
+    for values in ewm:
+        blocks.append(shifted(values, spec.shift))
+
+    # blocks follow spec.names(): one column per target within each block; one gather for all of them
+    matrix = np.hstack(blocks) if blocks else np.empty((n_rows, 0))
+    if out_rows is not None:
+        matrix = matrix[np.asarray(out_rows)]
+    return dict(zip(spec.names(), matrix.T))
+
+
+def ewm_grids(grid, spec, seed=None):
+    """
+    One EWM array per span over the grid rows. With adjust=False and ignore_na=True
+    the recursion only needs the previous value, so a seed row continues a series exactly.
+    """
+    out = []
+    for i, span in enumerate(spec.ewm_spans):
+        frame = pd.DataFrame(grid)
+        if seed is not None:
+            frame = pd.concat([pd.DataFrame(seed[i][None, :]), frame], ignore_index=True)
+        values = frame.ewm(span=span, adjust=False, ignore_na=True).mean().to_numpy()
+        out.append(values[1:] if seed is not None else values)
+    return out
+
+
+class SiteState:
+    """The last context_hours of one site's grid and EWMs, enough to extend its features."""
+
+    def __init__(self, end_hour, values, ewm):
+        self.end_hour = end_hour      # last hour covered (inclusive)
+        self.values = values          # (context_hours, n_targets), oldest first
+        self.ewm = ewm                # one (context_hours, n_targets) array per span
+
+
+class FeatureEngine:
+    """
+    Builds history features per site on an hourly (site, hour) grid. fit_transform
+    handles a full history and keeps a small per-site state; update then extends
+    the features to newer hours without touching the rest of the history.
+    """
+
+    def __init__(self, spec=None, time_col='date', site_col='site_code'):
+        self.spec = spec or FeatureSpec()
+        self.time_col = time_col
+        self.site_col = site_col
+        self.state = {}
+
+    def _site_groups(self, df):
+        hours = to_hours(df[self.time_col])
+        site_idx, codes = pd.factorize(df[self.site_col].astype(str), sort=True)
+        order = np.argsort(site_idx, kind='stable')
+        bounds = np.searchsorted(site_idx[order], np.arange(len(codes) + 1))
+        for i, site_code in enumerate(codes):
+            rows = order[bounds[i]:bounds[i + 1]]
+            yield site_code, rows, hours[rows]
+
+    def _fill(self, grid, offsets, df, rows):
+        targets = df[self.spec.targets].to_numpy(dtype=np.float64)
+        grid[offsets] = targets[rows]
+
+    def _keep_state(self, site_code, grid, ewm, end_hour):
+        context = self.spec.context_hours
+        self.state[site_code] = SiteState(end_hour, grid[-context:].copy(), [e[-context:].copy() for e in ewm])
+
+    def fit_transform(self, df):
+        """Features for every row of df (any row order), indexed like df."""
+        names = self.spec.names()
+        out = np.full((len(df), len(names)), np.nan)
+        self.state = {}
+        for site_code, rows, hours in self._site_groups(df):
+            start = hours.min()
+            grid = np.full((hours.max() - start + 1, len(self.spec.targets)), np.nan)
+            offsets = hours - start
+            self._fill(grid, offsets, df, rows)
+
+            ewm = ewm_grids(grid, self.spec)
+            features = grid_features(grid, self.spec, ewm=ewm, out_rows=offsets)
+            if names:
+                out[rows] = np.column_stack([features[name] for name in names])
+            self._keep_state(site_code, self._padded(grid), [self._padded(e) for e in ewm], hours.max())
+        return pd.DataFrame(out, index=df.index, columns=names)
+
+    def _padded(self, grid):
+        # a history shorter than the context is padded with missing hours at the front
+        missing = self.spec.context_hours - len(grid)
+        if missing <= 0:
+            return grid
+        return np.vstack([np.full((missing, grid.shape[1]), np.nan), grid])
+
+    def update(self, new_df):
+        """
+        Features for rows newer than everything seen so far for their site, using
+        only the stored context. Sites not seen before start from an empty history.
+        """
+        names = self.spec.names()
+        out = np.full((len(new_df), len(names)), np.nan)
+        context = self.spec.context_hours
+        n_targets = len(self.spec.targets)
+
+        for site_code, rows, hours in self._site_groups(new_df):
+            state = self.state.get(site_code)
+            if state is None:
+                state = SiteState(hours.min() - 1, np.full((context, n_targets), np.nan),
+                                  [np.full((context, n_targets), np.nan) for _ in self.spec.ewm_spans])
+            if hours.min() <= state.end_hour:
+                last = pd.Timestamp(state.end_hour * HOUR_NS, tz='UTC')
+                raise ValueError(f"update for {site_code} must be after {last}; "
+                                 "recompute with fit_transform to revise history")
+
+            # grid = stored context followed by the new hours
+            start = state.end_hour - context + 1
+            grid = np.vstack([state.values, np.full((hours.max() - state.end_hour, n_targets), np.nan)])
+            offsets = hours - start
+            self._fill(grid, offsets, new_df, rows)
+
+            # EWMs continue from the stored state rather than restarting inside the context
+            seeds = [e[-1] for e in state.ewm]
+            ewm = [np.vstack([old, new]) for old, new in
+                   zip(state.ewm, ewm_grids(grid[context:], self.spec, seeds))]
+
+            features = grid_features(grid, self.spec, ewm=ewm, out_rows=offsets)
+            if names:
+                out[rows] = np.column_stack([features[name] for name in names])
+            self._keep_state(site_code, grid, ewm, hours.max())
+        return pd.DataFrame(out, index=new_df.index, columns=names)
+
+
+def add_features(df, spec=None, time_col='date', site_col='site_code'):
+    """Returns df with the spec's history features appended (replacing any of the same name)."""
+    features = FeatureEngine(spec, time_col, site_col).fit_transform(df)
+    return pd.concat([df.drop(columns=features.columns, errors='ignore'), features], axis=1)
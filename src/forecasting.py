@@ -0,0 +1,346 @@
+import copy
+import json
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src import config as cfg
+from src.calendar_table import COLUMNS as CALENDAR_COLUMNS
+from src.calendar_table import load_calendar
+from src.features import HOUR_NS, FeatureSpec, ewm_grids, grid_features, to_hours
+
+MODELS_DIR = cfg.MODELS
+MANIFEST = "manifest.json"
+MAX_HORIZON = 48
+
+# columns with one value per site (the latest one observed), rather than one per hour
+SITE_COLUMNS = ['latitude', 'longitude', 'aadf_vehicle_count', 'road_type']
+
+
+def model_manifest(models, X_train, spec, dummies=None, sites=None):
+    """
+    What a Forecaster needs to rebuild the inputs of fitted models ({target:
+    LGBMRegressor or RandomForestRegressor}): the feature columns in training order, the
+    categories of categorical columns, the indicator columns get_dummies made (dummies is
+    the columns → prefix it was given), the history FeatureSpec and the sites trained on.
+    """
+    categories = {col: [str(c) for c in X_train[col].cat.categories] for col in X_train.columns
+                  if isinstance(X_train[col].dtype, pd.CategoricalDtype)}
+    indicators = {}
+    for source, prefix in (dummies or {}).items():
+        for col in X_train.columns:
+            if col.startswith(f"{prefix}_"):
+                indicators[col] = [source, col[len(prefix) + 1:]]
+    return {
+        "targets": list(models), "features": list(X_train.columns),
+        "categories": categories, "indicators": indicators, "sites": list(sites) if sites is not None else None,
+        "spec": {"targets": spec.targets, "lags": spec.lags, "windows": spec.windows,
+                 "ewm_spans": spec.ewm_spans, "shift": spec.shift},
+    }
+
+
+def save_models(model_dir, models, X_train, spec, dummies=None, sites=None):
+    """Saves fitted models with their model_manifest, for Forecaster(model_dir)."""
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    files = {}
+    for i, (target, model) in enumerate(models.items()):
+        files[target] = f"model_{i}.joblib"
+        joblib.dump(model, model_dir / files[target])
+    manifest = {**model_manifest(models, X_train, spec, dummies, sites), "files": files}
+    with open(model_dir / MANIFEST, 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+
+def load_models(model_dir):
+    """(manifest, {target: model}) saved by save_models."""
+    model_dir = Path(model_dir)
+    with open(model_dir / MANIFEST, 'r') as f:
+        manifest = json.load(f)
+    models = {target: joblib.load(model_dir / name) for target, name in manifest["files"].items()}
+    return manifest, models
+
+
+class HourRing:
+    """
+    The latest `capacity` hours of some columns for every site. Hour h of a site lives in
+    slot h % capacity of the site's row, so a new hour overwrites the oldest in place and
+    reading a window is one gather for all sites.
+    """
+
+    def __init__(self, capacity, n_cols):
+        self.capacity = capacity
+        self.n_cols = n_cols
+        self.hours = np.full((0, capacity), -1, dtype=np.int64)
+        self.values = np.full((0, capacity, n_cols), np.nan)
+
+    def add_site(self):
+        self.hours = np.vstack([self.hours, np.full((1, self.capacity), -1, dtype=np.int64)])
+        self.values = np.concatenate([self.values, np.full((1, self.capacity, self.n_cols), np.nan)])
+
+    def put(self, site, hours, values):
+        # only the newest `capacity` hours fit
+        keep = hours > hours.max() - self.capacity
+        slots = hours[keep] % self.capacity
+        self.hours[site, slots] = hours[keep]
+        self.values[site, slots] = values[keep]
+
+    def window(self, sites, starts, n):
+        """(len(sites), n, n_cols) for hours starts[i] .. starts[i] + n - 1 of each site, NaN where not held."""
+        hours = starts[:, None] + np.arange(n)
+        slots = hours % self.capacity
+        out = self.values[sites[:, None], slots]
+        out[self.hours[sites[:, None], slots] != hours] = np.nan
+        return out
+
+
+class Forecaster:
+    """
+    Serves NO2/PM2.5 forecasts from models saved by save_models, loaded once. observe()
+    keeps, per site, ring buffers of the latest observed targets (with their EWMs) and of
+    the hourly weather, so a forecast reads only what its features need; forecast() builds
+    the feature rows for many sites and horizons with the training feature code and
+    predicts each target for all of them in one call.
+
+    history_hours keeps that many more hours per site than the forecasts need, so
+    forecasts can also be made from past origins (see src.backtest); site_columns are the
+    columns held as one latest value per site, any other input column is held per hour.
+    """
+
+    def __init__(self, model_dir=MODELS_DIR, max_horizon=MAX_HORIZON, history_hours=0, site_columns=SITE_COLUMNS):
+        manifest, models = load_models(model_dir)
+        self._setup(manifest, models, max_horizon, history_hours, site_columns)
+
+    @classmethod
+    def from_models(cls, manifest, models, max_horizon=MAX_HORIZON, history_hours=0, site_columns=SITE_COLUMNS):
+        """A Forecaster for models in memory, with their model_manifest."""
+        forecaster = cls.__new__(cls)
+        forecaster._setup(manifest, models, max_horizon, history_hours, site_columns)
+        return forecaster
+
+    def _setup(self, manifest, models, max_horizon, history_hours, site_columns):
+        self.manifest = manifest
+        self.targets = self.manifest["targets"]
+        self.features = self.manifest["features"]
+        self.categories = self.manifest["categories"]
+        self.indicators = self.manifest["indicators"]
+        self.spec = FeatureSpec(**self.manifest["spec"])
+        self.max_horizon = max_horizon
+        self.use_models(models)
+
+        # where each feature column comes from
+        history = self.spec.names()
+        sources = [self.indicators[col][0] if col in self.indicators else col for col in self.features]
+        self.site_columns = [col for col in site_columns if col in sources]
+        self.hourly_columns = [col for col in dict.fromkeys(sources) if col not in history
+                               and col not in CALENDAR_COLUMNS and col != 'year' and col not in self.site_columns]
+        self.history_cols, self.history_pos = self._positions(history)
+        self.calendar_cols, self.calendar_pos = self._positions(CALENDAR_COLUMNS)
+        self.hourly_cols, self.hourly_pos = self._positions(self.hourly_columns)
+        self.year_cols, _ = self._positions(['year'])
+        self.static_cols = [j for j, source in enumerate(sources) if source in self.site_columns]
+
+        n_targets = len(self.spec.targets)
+        capacity = self.spec.context_hours + max_horizon + history_hours
+        self.observed = HourRing(capacity, n_targets)
+        self.ewm = HourRing(capacity, len(self.spec.ewm_spans) * n_targets)
+        self.weather = HourRing(capacity, len(self.hourly_columns))
+        self.sites = {}                                   # site_code -> row in the rings
+        self.last_hour = np.empty(0, dtype=np.int64)      # last hour with an observed target, per site
+        self.static = np.empty((0, len(self.static_cols)))
+        self.calendar = None
+
+    def use_models(self, models):
+        """Swaps in models ({target: model}) refitted on the same feature columns."""
+        self.models = {}
+        for target, model in models.items():
+            names = getattr(model, 'feature_names_in_', None)
+            if names is not None:
+                # checked once here instead of by sklearn on every array predict
+                if list(names) != list(self.features):
+                    raise ValueError(f"{target} model was fitted on columns {list(names)}, "
+                                     f"the manifest lists {list(self.features)}")
+                # a private shallow copy without the names; the caller's model keeps them
+                model = copy.copy(model)
+                del model.feature_names_in_
+            self.models[target] = model
+
+    def _positions(self, names):
+        # (model columns, positions in names) for the features that come from names
+        names = list(names)
+        cols = [j for j, col in enumerate(self.features) if col in names]
+        return cols, [names.index(self.features[j]) for j in cols]
+
+    def _site(self, site_code):
+        if site_code not in self.sites:
+            self.sites[site_code] = len(self.sites)
+            for ring in (self.observed, self.ewm, self.weather):
+                ring.add_site()
+            self.last_hour = np.append(self.last_hour, -1)
+            self.static = np.vstack([self.static, np.full((1, len(self.static_cols)), np.nan)])
+        return self.sites[site_code]
+
+    def _encode_static(self, site, values):
+        # the site's static feature values as the model saw them: categories as codes, indicators as 0/1
+        for k, j in enumerate(self.static_cols):
+            col = self.features[j]
+            if col in self.indicators:
+                source, level = self.indicators[col]
+                if source in values:
+                    self.static[site, k] = float(str(values[source]) == level)
+            elif col in values:
+                value = values[col]
+                if col in self.categories:
+                    value = self.categories[col].index(str(value)) if str(value) in self.categories[col] else np.nan
+                self.static[site, k] = value
+
+    def observe(self, df):
+        """
+        Adds rows of site_code and date with any of the targets, hourly weather and site
+        columns. Targets must be newer than the site's last observed hour; weather can be
+        for any hour, so forecast weather for the hours ahead is added the same way.
+        """
+        hours = to_hours(df['date'])
+        targets = df.reindex(columns=self.spec.targets).to_numpy(dtype=np.float64)
+        weather = df.reindex(columns=self.hourly_columns).to_numpy(dtype=np.float64)
+        site_frame = df.reindex(columns=self.site_columns)
+        n_targets = len(self.spec.targets)
+
+        for site_code, rows in df.groupby(df['site_code'].astype(str), sort=False).indices.items():
+            site = self._site(site_code)
+            site_hours = hours[rows]
+            observed = ~np.isnan(targets[rows]).all(axis=1)
+            if observed.any():
+                obs_hours = site_hours[observed]
+                last = self.last_hour[site]
+                if last >= 0 and obs_hours.min() <= last:
+                    raise ValueError(f"observations for {site_code} must be after "
+                                     f"{pd.Timestamp(last * HOUR_NS, tz='UTC')}")
+                # every hour from the last observed one, so gaps overwrite stale slots with NaN
+                start = obs_hours.min() if last < 0 else last + 1
+                grid = np.full((obs_hours.max() - start + 1, n_targets), np.nan)
+                grid[obs_hours - start] = targets[rows][observed]
+                grid_hours = np.arange(start, obs_hours.max() + 1)
+                self.observed.put(site, grid_hours, grid)
+                if self.spec.ewm_spans:
+                    seeds = None
+                    if last >= 0:
+                        seed = self.ewm.window(np.array([site]), np.array([last]), 1)[0, 0]
+                        seeds = seed.reshape(-1, n_targets)
+                    self.ewm.put(site, grid_hours, np.hstack(ewm_grids(grid, self.spec, seeds)))
+                self.last_hour[site] = obs_hours.max()
+
+            has_weather = ~np.isnan(weather[rows]).all(axis=1)
+            if has_weather.any():
+                self.weather.put(site, site_hours[has_weather], weather[rows][has_weather])
+            if self.site_columns:
+                latest = site_frame.iloc[rows].ffill().iloc[-1]
+                self._encode_static(site, latest.dropna().to_dict())
+
+    def _calendar_rows(self, hours):
+        first, last = int(hours.min()), int(hours.max())
+        if self.calendar is None or first < self.calendar[0] or last >= self.calendar[0] + len(self.calendar[1]):
+            years = pd.DatetimeIndex([first * HOUR_NS, last * HOUR_NS]).year
+            table = load_calendar(int(years[0]), int(years[1]))
+            self.calendar = (int(table['hour_key'].iat[0]), table[CALENDAR_COLUMNS].to_numpy(dtype=np.float64))
+        return self.calendar[1][hours - self.calendar[0]]
+
+    def _assemble(self, sites, hours, history):
+        """Feature rows (site-major) for the given hours of each site, in manifest column order."""
+        n_sites, length = hours.shape
+        X = np.full((n_sites * length, len(self.features)), np.nan)
+        flat_hours = hours.reshape(-1)
+        X[:, self.history_cols] = history[:, self.history_pos]
+        if self.calendar_cols:
+            X[:, self.calendar_cols] = self._calendar_rows(flat_hours)[:, self.calendar_pos]
+        if self.year_cols:
+            X[:, self.year_cols[0]] = (flat_hours * 3600).astype('datetime64[s]').astype('datetime64[Y]').astype(int) + 1970
+        if self.hourly_cols:
+            weather = self.weather.window(sites, hours[:, 0], length).reshape(n_sites * length, -1)
+            X[:, self.hourly_cols] = weather[:, self.hourly_pos]
+        X[:, self.static_cols] = np.repeat(self.static[sites], length, axis=0)
+        return X
+
+    def _predict(self, target, X):
+        model = self.models[target]
+        if hasattr(model, 'booster_'):
+            return model.booster_.predict(X)
+        return model.predict(X)
+
+    def forecast(self, sites, horizons=None):
+        """
+        Forecasts for every site × horizon (hours after the site's last observed hour, up
+        to max_horizon) as a DataFrame of site_code, date, horizon and one column per target.
+        """
+        horizons = np.unique(np.arange(1, self.max_horizon + 1) if horizons is None else np.asarray(horizons))
+        if horizons.min() < 1 or horizons.max() > self.max_horizon:
+            raise ValueError(f"horizons must be between 1 and {self.max_horizon}")
+        unknown = [s for s in sites if s not in self.sites or self.last_hour[self.sites[s]] < 0]
+        if unknown:
+            raise ValueError(f"no observations for {unknown}")
+        site_idx = np.array([self.sites[s] for s in sites])
+        origins = self.last_hour[site_idx]
+        picked = self.forecast_from(site_idx, origins, int(horizons.max()))[:, horizons - 1]
+        out = pd.DataFrame({
+            'site_code': np.repeat(list(sites), len(horizons)),
+            'date': pd.to_datetime(((origins[:, None] + horizons).reshape(-1)) * HOUR_NS, utc=True),
+            'horizon': np.tile(horizons, len(site_idx)),
+        })
+        for t, target in enumerate(self.targets):
+            out[target] = picked[:, :, t].reshape(-1)
+        return out
+
+    def forecast_from(self, site_idx, origins, steps):
+        """
+        (len(site_idx), steps, targets) forecasts 1 .. steps hours after origins[i] (an
+        hour since the epoch) for ring row site_idx[i]; a site can appear many times, with
+        different origins. Only targets up to each origin are read, weather is read for
+        every hour. All pairs share one feature grid (a column per pair and target), so
+        each feature is computed once for all of them by src.features.grid_features.
+        Hours further ahead than the shortest lag are forecast recursively, spec.min_lag
+        hours at a time: each block's predictions go into the grid the next block's
+        features read, and each block is one predict call per target over every pair.
+        """
+        n_sites, n_targets = len(site_idx), len(self.spec.targets)
+        context = self.spec.context_hours
+        block = self.spec.min_lag or steps
+
+        # one column per (site, target), rows from context hours before each site's origin to steps after it
+        width = n_sites * n_targets
+        wide = FeatureSpec([str(k) for k in range(width)], self.spec.lags, self.spec.windows,
+                           self.spec.ewm_spans, self.spec.shift)
+        past = self.observed.window(site_idx, origins - context + 1, context)
+        grid = np.vstack([past.transpose(1, 0, 2).reshape(context, width), np.full((steps, width), np.nan)])
+        n_spans = len(self.spec.ewm_spans)
+        if n_spans:
+            past_ewm = self.ewm.window(site_idx, origins - context + 1, context)
+            past_ewm = [past_ewm[:, :, s * n_targets:(s + 1) * n_targets].transpose(1, 0, 2).reshape(context, width)
+                        for s in range(n_spans)]
+
+        predictions = np.full((n_sites, steps, len(self.targets)), np.nan)
+        for first in range(0, steps, block):
+            length = min(block, steps - first)
+            rows = np.arange(context + first, context + first + length)
+            ewm = None
+            if n_spans:
+                # EWMs continue from each site's value at its origin over everything forecast so far
+                future = ewm_grids(grid[context:], wide, [e[-1] for e in past_ewm])
+                ewm = [np.vstack([p, f]) for p, f in zip(past_ewm, future)]
+            features = grid_features(grid, wide, ewm=ewm, out_rows=rows)
+            # (rows, feature, site, target) → one row per site and hour, columns in spec.names() order
+            history = np.column_stack(list(features.values())) if features else np.empty((length, 0))
+            history = history.reshape(length, -1, n_sites, n_targets).transpose(2, 0, 1, 3)
+            history = history.reshape(n_sites * length, -1)
+
+            hours = origins[:, None] + first + 1 + np.arange(length)
+            X = self._assemble(site_idx, hours, history)
+            for t, target in enumerate(self.targets):
+                values = self._predict(target, X).reshape(n_sites, length)
+                predictions[:, first:first + length, t] = values
+                if target in self.spec.targets:
+                    k = self.spec.targets.index(target)
+                    grid[rows[:, None], np.arange(n_sites)[None, :] * n_targets + k] = values.T
+
+        return predictions
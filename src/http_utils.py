@@ -0,0 +1,84 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from urllib3.util.retry import Retry
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire() blocks until a token is available,
+    so callers are held to `rate` requests per second with bursts up to `burst`.
+    A rate of 0 or None disables limiting.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate or 0)
+        self.capacity = float(burst if burst is not None else max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostLimiter:
+    """
+    Caps the number of in-flight requests per host and draws every request
+    from one shared token bucket.
+    """
+
+    def __init__(self, per_host, rate=None, burst=None):
+        self.per_host = per_host
+        self.bucket = TokenBucket(rate, burst)
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    def _semaphore(self, host):
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self.semaphores[host]
+
+    @contextmanager
+    def slot(self, url):
+        """Holds a per-host slot and a rate-limit token for the duration of one request."""
+        with self._semaphore(urlsplit(url).netloc):
+            self.bucket.acquire()
+            yield
+
+
+class LimitedRetry(Retry):
+    """
+    urllib3 Retry that draws a token from `limiter` (a TokenBucket) before every
+    retried attempt, so retries a 429 or 5xx triggers inside the adapter are held
+    to the same rate as first attempts instead of bypassing it.
+    """
+
+    def __init__(self, *args, limiter=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter
+
+    def new(self, **kwargs):
+        # urllib3 makes a new Retry after each attempt; carry the limiter over
+        retry = super().new(**kwargs)
+        retry.limiter = self.limiter
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.limiter is not None:
+            self.limiter.acquire()
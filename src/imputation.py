@@ -0,0 +1,118 @@
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.impute import KNNImputer
+
+from src.resources import peak_rss_mb
+
+IMPUTE_MODE = "windowed"      # "windowed", "fast" or "knn" (whole-history KNNImputer)
+N_NEIGHBORS = 5
+SHORT_GAP_HOURS = 3           # gaps up to this long are interpolated in time
+BLOCK_DAYS = 30               # KNN only searches for neighbours inside the same block
+MAX_WORKERS = 4
+
+
+def gap_span_hours(series):
+    """
+    For every missing value, the number of hours between the readings either
+    side of its gap (NaN at the start or end of the series, 0 where not missing).
+    """
+    times = pd.Series(series.index, index=series.index)
+    valid_times = times.where(series.notna())
+    span = (valid_times.bfill() - valid_times.ffill()) / pd.Timedelta(hours=1)
+    return span.where(series.isna(), 0.0)
+
+
+def fill_short_gaps(frame, cols, max_gap=SHORT_GAP_HOURS):
+    """Interpolates in time across gaps of at most max_gap missing hours, leaving longer gaps untouched."""
+    filled = frame[cols].copy()
+    for col in cols:
+        series = frame[col]
+        short = gap_span_hours(series) <= max_gap + 1
+        interpolated = series.interpolate(method='time', limit_area='inside')
+        filled[col] = series.where(~(series.isna() & short), interpolated)
+    return filled
+
+
+def seasonal_diurnal_profile(frame, cols):
+    """Mean by (month, hour of day) for each column, broadcast back onto the frame's rows."""
+    index = frame.index
+    keys = [index.month, index.hour]
+    profile = frame[cols].groupby(keys).transform('mean')
+    # fall back to the column mean where a month/hour cell has no readings at all
+    return profile.fillna(frame[cols].mean())
+
+
+def block_bounds(index, block_days=BLOCK_DAYS):
+    """(starts, ends) row positions of the block_days time blocks of a sorted DatetimeIndex."""
+    # on timedeltas, not asi8: asi8 is in the index's own unit, and the store's is seconds,
+    # so dividing it by a block length in ns put every row of a site into one block
+    block_id = np.asarray((index - index[0]) // pd.Timedelta(days=block_days))
+    starts = np.flatnonzero(np.r_[True, block_id[1:] != block_id[:-1]])
+    return starts, np.r_[starts[1:], len(block_id)]
+
+
+def blocked_knn(frame, cols, block_days=BLOCK_DAYS, n_neighbors=N_NEIGHBORS):
+    """
+    KNN imputation where neighbours are only searched inside fixed time blocks,
+    so cost grows with history length instead of with its square. Columns with no
+    readings in a block are left missing for the caller's fallback.
+    """
+    values = frame[cols].to_numpy(dtype=np.float64, copy=True)
+    missing_rows = np.isnan(values).any(axis=1)
+    if not missing_rows.any():
+        return pd.DataFrame(values, index=frame.index, columns=cols)
+
+    starts, ends = block_bounds(frame.index, block_days)
+    imputer = KNNImputer(n_neighbors=n_neighbors)
+    for start, end in zip(starts, ends):
+        if not missing_rows[start:end].any():
+            continue
+        block = values[start:end]
+        present = ~np.isnan(block).all(axis=0)
+        if not present.any():
+            continue
+        block[:, present] = imputer.fit_transform(block[:, present])
+    return pd.DataFrame(values, index=frame.index, columns=cols)
+
+
+def impute_frame(frame, cols, mode=IMPUTE_MODE):
+    """
+    Fills gaps in `cols` of a single site's frame (DatetimeIndex).
+      knn:      KNNImputer over the whole history (the original behaviour)
+      windowed: short gaps interpolated, long gaps by blocked KNN, seasonal/diurnal profile last
+      fast:     short gaps interpolated, everything else from the seasonal/diurnal profile
+    Returns the filled columns and a count of values filled by each step.
+    """
+    counts = {"missing": int(frame[cols].isna().sum().sum())}
+    if mode == "knn":
+        filled = pd.DataFrame(KNNImputer(n_neighbors=N_NEIGHBORS).fit_transform(frame[cols]),
+                              index=frame.index, columns=cols)
+        counts["knn"] = counts["missing"]
+        return filled, counts
+    if mode not in ("windowed", "fast"):
+        raise ValueError(f"unknown imputation mode: {mode}")
+
+    filled = fill_short_gaps(frame, cols)
+    remaining = int(filled.isna().sum().sum())
+    counts["interpolated"] = counts["missing"] - remaining
+
+    if mode == "windowed" and remaining:
+        filled = blocked_knn(filled, cols)
+        counts["knn"] = remaining - int(filled.isna().sum().sum())
+        remaining -= counts["knn"]
+
+    if remaining:
+        filled = filled.fillna(seasonal_diurnal_profile(frame, cols))
+        counts["profile"] = remaining - int(filled.isna().sum().sum())
+    return filled, counts
+
+
+def impute_job(site_code, frame, cols, mode=IMPUTE_MODE):
+    """impute_frame for one site, timed, with the process's peak RSS once it is done."""
+    start = time.perf_counter()
+    filled, counts = impute_frame(frame, cols, mode)
+    stats = {"site_code": site_code, "rows": len(frame), "seconds": round(time.perf_counter() - start, 3),
+             "peak_rss_mb": round(peak_rss_mb(), 1), **counts}
+    return site_code, filled, stats
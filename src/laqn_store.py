@@ -0,0 +1,221 @@
+import json
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src import config as cfg
+
+STORE_DIR = cfg.AQ_STORE
+STATE_FILE = "_sync_state.json"
+SITES_FILE = "_sites.json"
+COLUMNS = ['pollutant', 'timestamp', 'value']
+ROW_GROUP_ROWS = 50_000
+
+SCHEMA = pa.schema([
+    ('pollutant', pa.dictionary(pa.int8(), pa.string())),
+    ('timestamp', pa.timestamp('s')),
+    ('value', pa.float32()),
+])
+
+
+def load_state(store_dir=STORE_DIR):
+    """
+    Loads the sync state: for every site and species code, the half-open
+    [start, end) day windows already fetched and the resulting high-water mark.
+    """
+    state_file = store_dir / STATE_FILE
+    if not state_file.exists():
+        return {}
+    with open(state_file, 'r') as f:
+        raw = json.load(f)
+    state = {}
+    for site_code, species in raw.items():
+        state[site_code] = {}
+        for species_code, entry in species.items():
+            state[site_code][species_code] = {
+                "covered": [(date.fromisoformat(a), date.fromisoformat(b)) for a, b in entry["covered"]],
+                "updated": entry.get("updated"),
+            }
+    return state
+
+
+def save_state(state, store_dir=STORE_DIR):
+    """Writes the sync state atomically so an interrupted run never leaves it half written."""
+    store_dir.mkdir(parents=True, exist_ok=True)
+    raw = {}
+    for site_code, species in state.items():
+        raw[site_code] = {}
+        for species_code, entry in species.items():
+            covered = merge_windows(entry["covered"])
+            raw[site_code][species_code] = {
+                "covered": [[a.isoformat(), b.isoformat()] for a, b in covered],
+                "high_water": covered[-1][1].isoformat() if covered else None,
+                "updated": entry.get("updated"),
+            }
+    tmp_file = store_dir / (STATE_FILE + ".tmp")
+    with open(tmp_file, 'w') as f:
+        json.dump(raw, f, indent=1)
+    tmp_file.replace(store_dir / STATE_FILE)
+
+
+def merge_windows(windows):
+    """Merges overlapping or touching [start, end) windows."""
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def high_water_mark(covered):
+    """Exclusive end of the last fetched window, or None when nothing has been fetched."""
+    covered = merge_windows(covered)
+    return covered[-1][1] if covered else None
+
+
+def missing_windows(covered, start, end, refresh_from=None):
+    """
+    Returns the [start, end) windows not yet covered. Anything on or after
+    `refresh_from` is treated as uncovered so provisional recent hours are re-read.
+    """
+    if refresh_from is not None:
+        covered = [(a, min(b, refresh_from)) for a, b in covered if a < refresh_from]
+
+    gaps = []
+    cursor = start
+    for c_start, c_end in merge_windows(covered):
+        if c_end <= cursor:
+            continue
+        if c_start >= end:
+            break
+        if c_start > cursor:
+            gaps.append((cursor, c_start))
+        cursor = c_end
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def mark_covered(state, site_code, species_code, start, end):
+    entry = state.setdefault(site_code, {}).setdefault(species_code, {"covered": [], "updated": None})
+    entry["covered"] = merge_windows(entry["covered"] + [(start, end)])
+    entry["updated"] = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def chunk_table(pollutant_name, timestamps, values):
+    """
+    Builds one store batch from column arrays: int64 epoch seconds and float32
+    values, with the pollutant held as a dictionary code rather than repeated strings.
+    """
+    n = len(timestamps)
+    pollutant = pa.DictionaryArray.from_arrays(pa.array(np.zeros(n, dtype=np.int8)),
+                                               pa.array([pollutant_name]))
+    return pa.Table.from_arrays([
+        pollutant,
+        pa.array(np.asarray(timestamps, dtype=np.int64), type=pa.timestamp('s')),
+        pa.array(np.asarray(values, dtype=np.float32)),
+    ], schema=SCHEMA)
+
+
+class StoreWriter:
+    """
+    Streams chunk batches into one new part file per site, flushing a row group
+    whenever a site has ROW_GROUP_ROWS rows buffered, so memory stays bounded by a
+    few chunks no matter how long the crawl. Existing parts are never rewritten.
+    """
+
+    def __init__(self, store_dir=STORE_DIR, row_group_rows=ROW_GROUP_ROWS):
+        self.store_dir = store_dir
+        self.row_group_rows = row_group_rows
+        self.stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        self.buffers = {}
+        self.writers = {}
+        self.rows = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, site_code, table):
+        if table.num_rows == 0:
+            return
+        self.buffers.setdefault(site_code, []).append(table)
+        self.rows[site_code] = self.rows.get(site_code, 0) + table.num_rows
+        if sum(t.num_rows for t in self.buffers[site_code]) >= self.row_group_rows:
+            self._flush(site_code)
+
+    def _flush(self, site_code):
+        tables = self.buffers.pop(site_code, [])
+        if not tables:
+            return
+        if site_code not in self.writers:
+            site_dir = self.store_dir / f"site_code={site_code}"
+            site_dir.mkdir(parents=True, exist_ok=True)
+            self.writers[site_code] = pq.ParquetWriter(site_dir / f"part-{self.stamp}.parquet", SCHEMA)
+        batch = pa.concat_tables(tables).unify_dictionaries().combine_chunks()
+        self.writers[site_code].write_table(batch)
+
+    def close(self):
+        for site_code in list(self.buffers):
+            self._flush(site_code)
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+        return self.rows
+
+
+def read_site(site_code, store_dir=STORE_DIR, columns=None):
+    """
+    Reads every part for one site, keeping the most recently written value
+    when a refresh re-fetched the same hour.
+    """
+    parts = sorted((store_dir / f"site_code={site_code}").glob("part-*.parquet"))
+    if not parts:
+        return pd.DataFrame(columns=['site_code'] + COLUMNS)
+    df = pd.concat([pd.read_parquet(part) for part in parts], ignore_index=True)
+    df = df.drop_duplicates(subset=['pollutant', 'timestamp'], keep='last')
+    df['pollutant'] = df['pollutant'].astype('category')
+    df['value'] = df['value'].astype(np.float32)
+    df.insert(0, 'site_code', site_code)
+    df = df.sort_values(['pollutant', 'timestamp']).reset_index(drop=True)
+    return df if columns is None else df[columns]
+
+
+def compact_site(site_code, store_dir=STORE_DIR):
+    """Rewrites a site's parts as a single de-duplicated part."""
+    parts = sorted((store_dir / f"site_code={site_code}").glob("part-*.parquet"))
+    if len(parts) < 2:
+        return
+    df = read_site(site_code, store_dir, columns=COLUMNS)
+    table = pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False)
+    with StoreWriter(store_dir) as writer:
+        writer.write(site_code, table)
+    for part in parts:
+        part.unlink()
+
+
+def stored_sites(store_dir=STORE_DIR):
+    return sorted(p.name.split("=", 1)[1] for p in store_dir.glob("site_code=*") if p.is_dir())
+
+
+def save_site_metadata(metadata, store_dir=STORE_DIR):
+    """Site name and coordinates live once per site here instead of on every row."""
+    store_dir.mkdir(parents=True, exist_ok=True)
+    existing = load_site_metadata(store_dir)
+    existing.update(metadata)
+    with open(store_dir / SITES_FILE, 'w') as f:
+        json.dump(existing, f, indent=1)
+
+
+def load_site_metadata(store_dir=STORE_DIR):
+    sites_file = store_dir / SITES_FILE
+    if not sites_file.exists():
+        return {}
+    with open(sites_file, 'r') as f:
+        return json.load(f)
@@ -0,0 +1,260 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from src import config as cfg
+from src.resources import peak_rss_mb
+
+# AIRQ_METRICS: unset (default) for no records, "1" to append them to METRICS_FILE, or another file's path
+# AIRQ_PROFILE: "cprofile" or "sample" to profile the entry point's process, unset (default) for neither
+# AIRQ_RUN_ID:  shared by every process of one run; set here if missing so child processes inherit it
+METRICS_FILE = cfg.METRICS / "metrics.jsonl"
+PROFILE_DIR = cfg.METRICS / "profiles"
+MAX_BYTES = 64 * 2 ** 20  # a file over this is moved to <file>.1 by the next process to open it
+SAMPLE_INTERVAL = 0.005   # seconds between stack samples
+TOP_FUNCTIONS = 25        # functions kept in a profile's record
+
+
+def _metrics_path():
+    value = os.environ.get("AIRQ_METRICS", "")
+    if value.lower() in ("", "off", "0", "false", "none"):
+        return None
+    if value.lower() in ("1", "on", "true"):
+        return str(METRICS_FILE)
+    return value
+
+
+def _rotate(path):
+    # keeps one previous file; a process that finds it already moved by another just opens the new one
+    try:
+        if os.path.getsize(path) > MAX_BYTES:
+            os.replace(path, path + ".1")
+    except FileNotFoundError:
+        pass
+
+
+PATH = _metrics_path()
+ENABLED = PATH is not None
+RUN_ID = os.environ.setdefault("AIRQ_RUN_ID", uuid.uuid4().hex[:12])
+SCRIPT = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python"
+
+_counters = {}
+_counter_lock = threading.Lock()
+_local = threading.local()
+_fd_lock = threading.Lock()
+_fd = None
+_fd_pid = None
+
+
+def emit(record):
+    """Appends one record to the metrics file, tagged with the run, process and script."""
+    global _fd, _fd_pid
+    if not ENABLED:
+        return
+    # one O_APPEND write per line, so lines from threads and worker processes never interleave;
+    # a forked worker opens its own descriptor
+    if _fd is None or _fd_pid != os.getpid():
+        with _fd_lock:
+            if _fd is None or _fd_pid != os.getpid():
+                os.makedirs(os.path.dirname(os.path.abspath(PATH)), exist_ok=True)
+                _rotate(PATH)
+                _fd = os.open(PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                _fd_pid = os.getpid()
+    line = {"run": RUN_ID, "pid": os.getpid(), "script": SCRIPT, "time": round(time.time(), 3), **record}
+    os.write(_fd, (json.dumps(line, default=str) + "\n").encode())
+
+
+def count(name, n=1):
+    """
+    Adds n to a counter. Each span reports what its own thread counted while it was
+    open; the process totals go out when entry_point ends.
+    """
+    if not ENABLED:
+        return
+    with _counter_lock:
+        _counters[name] = _counters.get(name, 0) + n
+    local = getattr(_local, "counters", None)
+    if local is None:
+        local = _local.counters = {}
+    local[name] = local.get(name, 0) + n
+
+
+def counters():
+    """The process's counter totals, across all threads."""
+    with _counter_lock:
+        return dict(_counters)
+
+
+class Span:
+    """
+    A timed region. On exit one "span" record is written with its seconds, attributes,
+    the counters its thread moved while it was open and the process's peak RSS. Spans
+    nest per thread; each record names its parent.
+    """
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.seconds = None
+
+    def set(self, **attrs):
+        """Adds attributes known only once the work is done (rows written, cache hit, ...)."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.before = dict(getattr(_local, "counters", {}))
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        _local.stack.pop()
+        after = getattr(_local, "counters", {})
+        moved = {k: v - self.before.get(k, 0) for k, v in after.items() if v != self.before.get(k, 0)}
+        emit({"type": "span", "name": self.name, "parent": self.parent, "seconds": round(self.seconds, 6),
+              "status": "ok" if exc_type is None else exc_type.__name__, "attrs": self.attrs,
+              "counters": moved, "peak_rss_mb": round(peak_rss_mb(), 1)})
+        return False
+
+
+class _NullSpan:
+    seconds = None
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, **attrs):
+    """with span("merge_weather", rows=len(df)) as s: ...; a shared no-op when metrics are off."""
+    if not ENABLED:
+        return _NULL_SPAN
+    return Span(name, attrs)
+
+
+class StackSampler:
+    """
+    Samples every other thread's Python stack each interval from a daemon thread. Keeps
+    sample counts per collapsed stack (root;...;leaf), the format flame graph tools read.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ";".join(reversed(names))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def top(self, n=TOP_FUNCTIONS):
+        """(function, own samples, samples anywhere on the stack) for the n most sampled functions."""
+        own, total = {}, {}
+        for key, hits in self.stacks.items():
+            frames = key.split(";")
+            own[frames[-1]] = own.get(frames[-1], 0) + hits
+            for frame in set(frames):
+                total[frame] = total.get(frame, 0) + hits
+        ranked = sorted(total, key=total.get, reverse=True)[:n]
+        return [{"function": f, "own": own.get(f, 0), "total": total[f]} for f in ranked]
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            for key, hits in sorted(self.stacks.items()):
+                f.write(f"{key} {hits}\n")
+
+
+def cprofile_top(profiler, n=TOP_FUNCTIONS):
+    """(function, calls, own seconds, cumulative seconds) for the n functions with the most cumulative time."""
+    import pstats
+    stats = pstats.Stats(profiler).stats
+    rows = [{"function": f"{func} ({os.path.basename(file)}:{line})", "calls": calls,
+             "own_s": round(own, 4), "cumulative_s": round(cumulative, 4)}
+            for (file, line, func), (_, calls, own, cumulative, _) in stats.items()]
+    return sorted(rows, key=lambda r: r["cumulative_s"], reverse=True)[:n]
+
+
+def _profile_path(name, suffix):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    return PROFILE_DIR / f"{RUN_ID}-{name}-{os.getpid()}{suffix}"
+
+
+def _emit_totals(name):
+    emit({"type": "counters", "name": name, "counters": counters(), "peak_rss_mb": round(peak_rss_mb(), 1)})
+
+
+@contextmanager
+def entry_point(name, **attrs):
+    """
+    Wraps a script's main: a top-level span named after its stage, the process's counter
+    totals at the end, and the profiler AIRQ_PROFILE asks for. cprofile covers the main
+    thread and writes a .prof file (pstats, snakeviz); sample covers every thread and
+    writes collapsed stacks (flamegraph.pl, speedscope). Worker processes are not
+    profiled; they report through their own spans.
+    """
+    mode = os.environ.get("AIRQ_PROFILE", "").lower()
+    profiler = sampler = None
+    if mode == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif mode == "sample":
+        sampler = StackSampler()
+        sampler.start()
+    elif mode:
+        print(f"warning: unknown AIRQ_PROFILE {mode!r}, expected cprofile or sample")
+
+    try:
+        with span(name, **attrs) as s:
+            yield s
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            path = _profile_path(name, ".prof")
+            profiler.dump_stats(path)
+            emit({"type": "profile", "name": name, "mode": "cprofile", "path": str(path),
+                  "top": cprofile_top(profiler)})
+        if sampler is not None:
+            sampler.stop()
+            path = _profile_path(name, ".folded")
+            sampler.save(path)
+            emit({"type": "profile", "name": name, "mode": "sample", "path": str(path),
+                  "samples": sampler.samples, "interval": sampler.interval, "top": sampler.top()})
+        _emit_totals(name)
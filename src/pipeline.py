@@ -0,0 +1,251 @@
+import ast
+import hashlib
+import json
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+
+from src import config as cfg
+from src import metrics
+
+STATE_DIR = cfg.PIPELINE_STATE
+STATE_FILE = "state.json"
+RUNS_FILE = "runs.jsonl"
+HASH_BLOCK = 1 << 20
+
+
+class Stage:
+    """
+    One pipeline step: a script run as its own process, the files it reads and
+    writes, and the parameters passed to it. Inputs and outputs are paths, which
+    may end in a glob pattern (e.g. a store's "site_code=*" partitions).
+    """
+
+    def __init__(self, name, script, args=(), inputs=(), outputs=(), code=(), after=(), params=None):
+        self.name = name
+        self.script = script
+        self.args = list(args)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        # the script, every src module it imports (directly or through other src modules),
+        # plus any other files whose changes should trigger a re-run
+        self.code = [cfg.ROOT / script] + src_imports(cfg.ROOT / script) + list(code)
+        self.after = list(after)
+        self.params = params or {}
+
+    def command(self):
+        return [sys.executable, str(cfg.ROOT / self.script)] + self.args
+
+
+def src_imports(path, seen=None):
+    """The src/*.py modules a Python file imports, followed through the src modules themselves."""
+    seen = set() if seen is None else seen
+    tree = ast.parse(Path(path).read_text(), filename=str(path))
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module == "src":
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and node.module.startswith("src."):
+            names = [node.module.split(".")[1]]
+        elif isinstance(node, ast.Import):
+            names = [alias.name.split(".")[1] for alias in node.names if alias.name.startswith("src.")]
+        else:
+            continue
+        for name in names:
+            module = cfg.ROOT / "src" / f"{name}.py"
+            if module.exists() and module not in seen:
+                seen.add(module)
+                src_imports(module, seen)
+    return sorted(seen)
+
+
+def expand(path):
+    """Files behind a path: the file itself, every file under a directory, or glob matches."""
+    path = Path(path)
+    if any(ch in path.name for ch in "*?["):
+        matches = sorted(path.parent.glob(path.name))
+    else:
+        matches = [path] if path.exists() else []
+    files = []
+    for match in matches:
+        if match.is_dir():
+            files.extend(sorted(p for p in match.rglob("*") if p.is_file() and not p.name.endswith(".tmp")))
+        else:
+            files.append(match)
+    return files
+
+
+class Fingerprinter:
+    """
+    Content hashes of files, remembered against (size, mtime) so a file that
+    hasn't been touched since the last run is never read again.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache or {}
+        self.lock = threading.Lock()
+
+    def file_digest(self, path):
+        stat = path.stat()
+        key = str(path)
+        with self.lock:
+            entry = self.cache.get(key)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["digest"]
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        with self.lock:
+            self.cache[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest}
+        return digest
+
+    def paths_digest(self, paths):
+        h = hashlib.blake2b(digest_size=16)
+        for path in paths:
+            for f in expand(path):
+                h.update(str(f.relative_to(cfg.ROOT) if f.is_relative_to(cfg.ROOT) else f).encode())
+                h.update(self.file_digest(f).encode())
+        return h.hexdigest()
+
+    def stage_digest(self, stage):
+        h = hashlib.blake2b(digest_size=16)
+        h.update(json.dumps({"args": stage.args, "params": stage.params}, sort_keys=True, default=str).encode())
+        h.update(self.paths_digest(stage.code).encode())
+        h.update(self.paths_digest(stage.inputs).encode())
+        return h.hexdigest()
+
+
+def load_state(state_dir=STATE_DIR):
+    state_file = state_dir / STATE_FILE
+    if not state_file.exists():
+        return {"stages": {}, "files": {}}
+    with open(state_file, 'r') as f:
+        return json.load(f)
+
+
+def save_state(state, state_dir=STATE_DIR):
+    state_dir.mkdir(parents=True, exist_ok=True)
+    tmp_file = state_dir / (STATE_FILE + ".tmp")
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f, indent=1)
+    tmp_file.replace(state_dir / STATE_FILE)
+
+
+def check_graph(stages):
+    """Stage names must be unique and every dependency declared; returns stages by name."""
+    by_name = {}
+    for stage in stages:
+        if stage.name in by_name:
+            raise ValueError(f"duplicate stage: {stage.name}")
+        by_name[stage.name] = stage
+    for stage in stages:
+        for dep in stage.after:
+            if dep not in by_name:
+                raise ValueError(f"stage {stage.name} depends on unknown stage {dep}")
+
+    # peel off stages whose dependencies are all placed; anything left over is a cycle
+    placed, remaining = set(), set(by_name)
+    while remaining:
+        layer = {name for name in remaining if set(by_name[name].after) <= placed}
+        if not layer:
+            raise ValueError(f"dependency cycle between stages: {sorted(remaining)}")
+        placed |= layer
+        remaining -= layer
+    return by_name
+
+
+def run_stage(stage, log_dir):
+    """
+    Runs one stage's script, logging its output. Returns (ok, seconds). The script
+    inherits AIRQ_RUN_ID, so its metrics records share the run id of this one.
+    """
+    log_dir.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    with metrics.span("stage", stage=stage.name) as span:
+        with open(log_dir / f"{stage.name}.log", 'w') as log:
+            proc = subprocess.run(stage.command(), cwd=cfg.ROOT, stdout=log, stderr=subprocess.STDOUT)
+        elapsed = time.perf_counter() - start
+        # the scripts report most failures by printing and returning, so also require the outputs
+        missing = [str(p) for p in stage.outputs if not expand(p)]
+        span.set(returncode=proc.returncode, missing_outputs=missing)
+    return proc.returncode == 0 and not missing, elapsed
+
+
+def run(stages, max_workers=3, force=(), dry_run=False, state_dir=STATE_DIR):
+    """
+    Runs the stages in dependency order, up to max_workers at once. A stage is
+    skipped when its fingerprint (code, parameters and input contents) matches
+    the last successful run and its outputs exist; because inputs are hashed by
+    content, a re-run upstream stage that writes identical outputs doesn't
+    cascade. Stages downstream of a failure are not run. Returns per-stage results.
+    """
+    by_name = check_graph(stages)
+    state = load_state(state_dir)
+    fingerprinter = Fingerprinter(state.get("files"))
+    force = set(force)
+    unknown = force - set(by_name)
+    if unknown:
+        raise ValueError(f"unknown stages: {sorted(unknown)}")
+
+    results = {}
+    pending = {s.name for s in stages}
+    running = {}
+    started = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    def ready(name):
+        return all(dep in results for dep in by_name[name].after)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for name in sorted(n for n in pending if ready(n)):
+                pending.discard(name)
+                stage = by_name[name]
+                if any(results[dep]["status"] in ("failed", "blocked") for dep in stage.after):
+                    results[name] = {"status": "blocked", "seconds": 0.0}
+                    print(f"[{name}] blocked by a failed dependency")
+                    continue
+
+                digest = fingerprinter.stage_digest(stage)
+                previous = state["stages"].get(name, {})
+                up_to_date = (previous.get("fingerprint") == digest
+                              and all(expand(p) for p in stage.outputs)
+                              and not any(results[dep]["status"] == "would run" for dep in stage.after))
+                if up_to_date and name not in force:
+                    results[name] = {"status": "skipped", "seconds": 0.0}
+                    print(f"[{name}] up to date")
+                    continue
+                if dry_run:
+                    # inputs from a stage that would run can't be hashed yet, so everything after it is stale too
+                    results[name] = {"status": "would run", "seconds": 0.0}
+                    print(f"[{name}] would run")
+                    continue
+
+                print(f"[{name}] running: {' '.join(stage.command()[1:])}")
+                running[executor.submit(run_stage, stage, state_dir / "logs")] = (name, digest)
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, digest = running.pop(future)
+                ok, elapsed = future.result()
+                results[name] = {"status": "ok" if ok else "failed", "seconds": round(elapsed, 2)}
+                print(f"[{name}] {'finished' if ok else 'FAILED'} in {elapsed:.1f}s "
+                      f"(log: {state_dir / 'logs' / (name + '.log')})")
+                if ok:
+                    state["stages"][name] = {"fingerprint": digest, "seconds": round(elapsed, 2),
+                                             "finished": datetime.now(timezone.utc).isoformat(timespec='seconds')}
+                else:
+                    state["stages"].pop(name, None)
+
+    if not dry_run:
+        state["files"] = fingerprinter.cache
+        save_state(state, state_dir)
+        with open(state_dir / RUNS_FILE, 'a') as f:
+            f.write(json.dumps({"started": started, "run": metrics.RUN_ID, "stages": results}) + "\n")
+    return results
@@ -0,0 +1,38 @@
+import sys
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    # on linux ru_maxrss survives exec, so a spawned worker would report its parent's peak;
+    # VmHWM belongs to the process image and starts fresh
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        # windows has no resource module; psutil exposes the peak working set instead
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 2**20
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS bytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def current_rss_mb():
+    """Current resident set size of this process in MB, or None when it cannot be read."""
+    try:
+        import psutil
+    except ImportError:
+        try:
+            with open("/proc/self/statm") as f:
+                pages = int(f.read().split()[1])
+        except OSError:
+            return None
+        import os
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    return psutil.Process().memory_info().rss / 2**20
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+EARTH_RADIUS_KM = 6371.0
+MIN_DISTANCE_KM = 0.1      # floor for inverse-distance weights, so a co-located point doesn't get infinite weight
+
+
+class PointIndex:
+    """
+    BallTree over (lat, lon) points with the haversine metric. Memory grows with
+    the number of points indexed rather than with points x queries, and each
+    query only visits the tree nodes near it.
+    """
+
+    def __init__(self, lat, lon, leaf_size=40):
+        self.coords = np.radians(np.column_stack([np.asarray(lat, dtype=np.float64),
+                                                  np.asarray(lon, dtype=np.float64)]))
+        self.tree = BallTree(self.coords, leaf_size=leaf_size, metric='haversine')
+
+    def __len__(self):
+        return len(self.coords)
+
+    @staticmethod
+    def _queries(lat, lon):
+        return np.radians(np.column_stack([np.atleast_1d(np.asarray(lat, dtype=np.float64)),
+                                           np.atleast_1d(np.asarray(lon, dtype=np.float64))]))
+
+    def nearest(self, lat, lon, k=1):
+        """Distances (km) and positions of the k nearest points to each query, closest first."""
+        k = min(k, len(self))
+        dist, idx = self.tree.query(self._queries(lat, lon), k=k)
+        return dist * EARTH_RADIUS_KM, idx
+
+    def within(self, lat, lon, radius_km):
+        """For each query, the distances (km) and positions of every point within radius_km, closest first."""
+        idx, dist = self.tree.query_radius(self._queries(lat, lon), r=radius_km / EARTH_RADIUS_KM,
+                                           return_distance=True, sort_results=True)
+        return [d * EARTH_RADIUS_KM for d in dist], list(idx)
+
+
+def idw_weights(distances, power=2):
+    """Inverse-distance weights normalised to sum to one along the last axis."""
+    w = 1.0 / np.maximum(np.asarray(distances, dtype=np.float64), MIN_DISTANCE_KM) ** power
+    return w / w.sum(axis=-1, keepdims=True)
+
+
+def neighbour_table(query_ids, lat, lon, index, point_ids, k=5, radius_km=None):
+    """
+    Long table of (query_id, point_id, rank, distance_km, weight) for the k nearest
+    points to each query, optionally dropping any further than radius_km. The
+    nearest point is always kept so no query is left without a match.
+    """
+    dist, idx = index.nearest(lat, lon, k=k)
+    table = pd.DataFrame({
+        'query_id': np.repeat(np.asarray(query_ids), idx.shape[1]),
+        'point_id': np.asarray(point_ids)[idx.ravel()],
+        'rank': np.tile(np.arange(1, idx.shape[1] + 1), len(idx)),
+        'distance_km': dist.ravel(),
+        'position': idx.ravel(),
+    })
+    if radius_km is not None:
+        table = table[(table['rank'] == 1) | (table['distance_km'] <= radius_km)]
+    # assign rather than set a column, since after the radius filter the table is a slice
+    weight = table.groupby('query_id')['distance_km'].transform(lambda d: idw_weights(d.to_numpy()))
+    return table.assign(weight=weight).reset_index(drop=True)
@@ -0,0 +1,103 @@
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from src import config as cfg
+
+SOURCE = cfg.RAW_TRF / "dft_traffic_counts_aadf.csv"
+INDEX_DIR = cfg.INT_TRF
+AADF_FILE = "aadf_by_point_year.parquet"
+POINTS_FILE = "count_points.parquet"
+SOURCE_FILE = "_traffic_source.json"
+
+# the only columns anything downstream uses out of the ~35 in the national file
+COLUMN_TYPES = {
+    'count_point_id': pa.int64(),
+    'year': pa.int16(),
+    'road_type': pa.dictionary(pa.int32(), pa.string()),
+    'latitude': pa.float64(),
+    'longitude': pa.float64(),
+    'all_motor_vehicles': pa.float64(),
+}
+POINT_COLUMNS = ['count_point_id', 'latitude', 'longitude', 'road_type']
+
+
+def read_source(source=SOURCE):
+    """Reads just the needed columns with pyarrow's multithreaded CSV reader."""
+    return pacsv.read_csv(
+        source,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=16 << 20),
+        convert_options=pacsv.ConvertOptions(include_columns=list(COLUMN_TYPES), column_types=COLUMN_TYPES),
+    )
+
+
+def source_signature(source=SOURCE):
+    stat = source.stat()
+    return {"source": str(source), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def is_current(source=SOURCE, index_dir=INDEX_DIR):
+    """True when both tables exist and were built from the source file as it is now."""
+    sidecar = index_dir / SOURCE_FILE
+    if not (sidecar.exists() and (index_dir / AADF_FILE).exists() and (index_dir / POINTS_FILE).exists()):
+        return False
+    with open(sidecar, 'r') as f:
+        return json.load(f) == source_signature(source)
+
+
+def build_index(source=SOURCE, index_dir=INDEX_DIR):
+    """
+    Builds the two derived tables from the raw AADF file:
+      aadf_by_point_year: mean all_motor_vehicles per (count_point_id, year), sorted on the key
+      count_points:       first complete coordinate/road_type row per count point, in file order
+    """
+    table = read_source(source)
+
+    # like a pandas groupby, rows with a missing key are left out
+    keyed = table.filter(pc.and_(pc.is_valid(table['count_point_id']), pc.is_valid(table['year'])))
+    aadf = (keyed.group_by(['count_point_id', 'year'])
+            .aggregate([('all_motor_vehicles', 'mean')])
+            .select(['count_point_id', 'year', 'all_motor_vehicles_mean'])
+            .rename_columns(['count_point_id', 'year', 'all_motor_vehicles'])
+            .sort_by([('count_point_id', 'ascending'), ('year', 'ascending')]))
+
+    # same rows as dropna().drop_duplicates('count_point_id') on the full frame
+    points = table.select(POINT_COLUMNS).drop_null().to_pandas()
+    points = points.drop_duplicates('count_point_id').reset_index(drop=True)
+
+    index_dir.mkdir(parents=True, exist_ok=True)
+    pq.write_table(aadf, index_dir / AADF_FILE, row_group_size=64_000)
+    points.to_parquet(index_dir / POINTS_FILE, index=False)
+    with open(index_dir / SOURCE_FILE, 'w') as f:
+        json.dump(source_signature(source), f, indent=1)
+    return aadf.num_rows, len(points)
+
+
+def ensure_index(source=SOURCE, index_dir=INDEX_DIR, force=False):
+    """Rebuilds the tables only when the source file has changed since the last build."""
+    if not source.exists():
+        if (index_dir / AADF_FILE).exists() and (index_dir / POINTS_FILE).exists():
+            return False
+        raise FileNotFoundError(f"traffic source file not found: {source}")
+    if force or not is_current(source, index_dir):
+        build_index(source, index_dir)
+        return True
+    return False
+
+
+def load_aadf(count_point_ids=None, source=SOURCE, index_dir=INDEX_DIR):
+    """Yearly mean vehicle counts, optionally for a subset of count points (row groups are pruned on the key)."""
+    ensure_index(source, index_dir)
+    filters = None
+    if count_point_ids is not None:
+        filters = [('count_point_id', 'in', [int(c) for c in count_point_ids])]
+    return pd.read_parquet(index_dir / AADF_FILE, filters=filters)
+
+
+def load_count_points(source=SOURCE, index_dir=INDEX_DIR):
+    """One row per count point: coordinates and road type."""
+    ensure_index(source, index_dir)
+    return pd.read_parquet(index_dir / POINTS_FILE)
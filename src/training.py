@@ -0,0 +1,374 @@
+import json
+import math
+import multiprocessing as mp
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import r2_score
+from sklearn.model_selection import ParameterSampler, TimeSeriesSplit
+
+from src import config as cfg
+from src.resources import peak_rss_mb
+
+CACHE_DIR = cfg.TRAINING_CACHE
+N_SPLITS = 5
+RANDOM_STATE = 42
+# every candidate trains on the same binned fold datasets, so binning is fixed here; pre-filtering
+# is off so candidates may use a smaller min_data_in_leaf than the one the bins were built with
+DATASET_PARAMS = {'max_bin': 255, 'bin_construct_sample_cnt': 200000, 'feature_pre_filter': False, 'verbose': -1}
+KINDS = ("lgbm", "rf")
+EARLY_STOPPING_SHARE = 0.15   # most recent share of a fold's training rows that early stopping watches
+
+
+def split_cores(search_workers=None, model_threads=None, total=None):
+    """
+    (search_workers, model_threads) with workers × threads <= total cores (default all).
+    Given one, the other gets what's left; given neither, one candidate runs at a time
+    with every core in the model, which for LightGBM usually wins.
+    """
+    total = total or os.cpu_count() or 1
+    if search_workers is None and model_threads is None:
+        search_workers = 1
+    if search_workers is None:
+        search_workers = max(1, total // model_threads)
+    if model_threads is None:
+        model_threads = max(1, total // search_workers)
+    if search_workers * model_threads > total:
+        raise ValueError(f"{search_workers} search workers × {model_threads} model threads "
+                         f"oversubscribes {total} cores")
+    return search_workers, model_threads
+
+
+class FoldCache:
+    """
+    A feature matrix, its targets and TimeSeriesSplit folds, written once to a directory
+    as .npy files and opened memory-mapped read-only, so every worker process reads the
+    same pages instead of unpickling its own copy. Rows are in time order and each fold's
+    training rows are a prefix with its test rows straight after, so a fold is a pair of
+    views into the one matrix. Categorical columns are stored as their integer codes.
+    """
+
+    def __init__(self, cache_dir):
+        self.dir = Path(cache_dir)
+        with open(self.dir / "folds.json", 'r') as f:
+            meta = json.load(f)
+        self.features = meta["features"]
+        self.targets = meta["targets"]
+        self.categorical = meta["categorical"]
+        self.folds = [tuple(fold) for fold in meta["folds"]]     # (test_start, test_end) row positions
+        self.X = np.load(self.dir / "X.npy", mmap_mode='r')
+        self.y = np.load(self.dir / "y.npy", mmap_mode='r')
+
+    @classmethod
+    def build(cls, X, y, cache_dir, n_splits=N_SPLITS):
+        """Writes X (DataFrame, rows in time order) and y (DataFrame, one column per target)."""
+        cache_dir = Path(cache_dir)
+        if cache_dir.exists():
+            shutil.rmtree(cache_dir)
+        cache_dir.mkdir(parents=True)
+
+        categorical = [col for col in X.columns if isinstance(X[col].dtype, pd.CategoricalDtype)]
+        matrix = np.empty(X.shape, dtype=np.float32)
+        for i, col in enumerate(X.columns):
+            if col in categorical:
+                codes = X[col].cat.codes.to_numpy()
+                matrix[:, i] = np.where(codes < 0, np.nan, codes)
+            else:
+                matrix[:, i] = X[col].to_numpy(dtype=np.float32)
+        np.save(cache_dir / "X.npy", matrix)
+        np.save(cache_dir / "y.npy", y.to_numpy(dtype=np.float64))
+
+        folds = []
+        for train_idx, test_idx in TimeSeriesSplit(n_splits=n_splits).split(matrix):
+            folds.append((int(test_idx[0]), int(test_idx[-1]) + 1))
+        meta = {"features": list(X.columns), "targets": list(y.columns),
+                "categorical": categorical, "folds": folds}
+        with open(cache_dir / "folds.json", 'w') as f:
+            json.dump(meta, f, indent=1)
+        return cls(cache_dir)
+
+    def fold(self, i):
+        """(X_train, X_test, y_train, y_test) views for fold i."""
+        start, end = self.folds[i]
+        return self.X[:start], self.X[start:end], self.y[:start], self.y[start:end]
+
+    def dataset_path(self, i):
+        return self.dir / f"fold{i}.bin"
+
+    def build_datasets(self, threads=1):
+        """Bins each fold's training rows once into a LightGBM Dataset binary, shared by every candidate and target."""
+        import lightgbm as lgb
+        params = dict(DATASET_PARAMS, num_threads=threads)
+        for i in range(len(self.folds)):
+            X_train, _, y_train, _ = self.fold(i)
+            dataset = lgb.Dataset(X_train, label=y_train[:, 0], feature_name=self.features,
+                                  categorical_feature=self.categorical, params=params)
+            dataset.save_binary(str(self.dataset_path(i)))
+
+    def load_dataset(self, i, threads=1):
+        import lightgbm as lgb
+        return lgb.Dataset(str(self.dataset_path(i)), params=dict(DATASET_PARAMS, num_threads=threads)).construct()
+
+
+def fit_lgbm(dataset, params, threads, random_state, valid=None, early_stopping_rounds=None):
+    """
+    lgb.train with LGBMRegressor-style parameters (n_estimators, subsample, ...). Given a
+    valid Dataset, stops once its l2 hasn't improved for early_stopping_rounds rounds and
+    keeps the best round.
+    """
+    import lightgbm as lgb
+    params = dict(params)
+    rounds = params.pop('n_estimators', 100)
+    params.update(objective='regression', num_threads=threads, seed=random_state, verbose=-1)
+    if valid is None:
+        return lgb.train(params, dataset, num_boost_round=rounds)
+    return lgb.train(params, dataset, num_boost_round=rounds, valid_sets=[valid],
+                     callbacks=[lgb.early_stopping(early_stopping_rounds, verbose=False)])
+
+
+def evaluate_candidate(cache_dir, kind, params, model_threads, random_state=RANDOM_STATE):
+    """
+    One candidate on every fold and target, with model_threads threads per fit.
+    Returns ({target: [fold R2, ...]}, pid, peak RSS MB of this process).
+    """
+    cache = FoldCache(cache_dir)
+    scores = {target: [] for target in cache.targets}
+    for i in range(len(cache.folds)):
+        X_train, X_test, y_train, y_test = cache.fold(i)
+        dataset = cache.load_dataset(i, model_threads) if kind == "lgbm" else None
+        for t, target in enumerate(cache.targets):
+            if kind == "lgbm":
+                # same binned features for every target, only the label changes
+                dataset.set_label(y_train[:, t])
+                model = fit_lgbm(dataset, params, model_threads, random_state)
+            else:
+                from sklearn.ensemble import RandomForestRegressor
+                model = RandomForestRegressor(**params, n_jobs=model_threads, random_state=random_state)
+                model.fit(X_train, y_train[:, t])
+            scores[target].append(r2_score(y_test[:, t], model.predict(X_test)))
+    return scores, os.getpid(), peak_rss_mb()
+
+
+def _run_jobs(func, jobs, workers):
+    """
+    func(*args) for each args in jobs, in order, inline or across `workers` processes.
+    func returns (*result, pid, peak RSS MB); gives ([result, ...], summed peak RSS MB).
+    """
+    peaks = {}
+    results = []
+    if workers == 1:
+        outputs = (func(*args) for args in jobs)
+        for *result, pid, peak in outputs:
+            results.append(tuple(result))
+            peaks[pid] = peak
+    else:
+        # spawned rather than forked workers, since OpenMP (LightGBM's threads) isn't fork-safe
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as executor:
+            futures = [executor.submit(func, *args) for args in jobs]
+            for future in futures:
+                *result, pid, peak = future.result()
+                results.append(tuple(result))
+                peaks[pid] = max(peaks.get(pid, 0.0), peak)
+    return results, sum(peaks.values())
+
+
+class SearchResult:
+    """Per-candidate fold scores for every target, the best candidate per target, and what the search cost."""
+
+    def __init__(self, candidates, scores, search_workers, model_threads, seconds, peak_rss_mb):
+        self.candidates = candidates
+        self.scores = scores                  # {target: (n_candidates, n_folds) R2}
+        self.search_workers = search_workers
+        self.model_threads = model_threads
+        self.seconds = seconds
+        self.peak_rss_mb = peak_rss_mb        # summed over the processes that ran candidates (shared pages in each)
+        # highest mean R2, first candidate on ties, as RandomizedSearchCV picks
+        self.best_index = {target: int(np.argmax(s.mean(axis=1))) for target, s in scores.items()}
+        self.best_params = {target: candidates[i] for target, i in self.best_index.items()}
+
+    def fold_scores(self, target):
+        return list(self.scores[target][self.best_index[target]])
+
+    def results(self):
+        """One row per candidate and target: parameters, fold scores and their mean."""
+        rows = []
+        for target, scores in self.scores.items():
+            for params, fold_scores in zip(self.candidates, scores):
+                row = {'target': target, **params}
+                row.update({f'split{i}_test_score': s for i, s in enumerate(fold_scores)})
+                row['mean_test_score'] = fold_scores.mean()
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+    def summary(self):
+        return (f"{len(self.candidates)} candidates × {len(self.scores)} targets with "
+                f"{self.search_workers} search workers × {self.model_threads} model threads: "
+                f"{self.seconds:.1f}s, peak RSS {self.peak_rss_mb:.0f} MB")
+
+
+def search(cache, kind, param_dist, n_iter, search_workers=None, model_threads=None,
+           random_state=RANDOM_STATE):
+    """
+    Randomized search over param_dist for every target of the cache at once: the same
+    candidates RandomizedSearchCV draws for this random_state, each scored on every
+    fold for every target. search_workers processes run candidates side by side, each
+    model using model_threads threads (see split_cores); workers read the folds from
+    the shared memory-mapped cache and, for LightGBM, from Dataset binaries binned once.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of {KINDS}")
+    workers, threads = split_cores(search_workers, model_threads)
+    candidates = list(ParameterSampler(param_dist, n_iter, random_state=random_state))
+
+    start = time.perf_counter()
+    if kind == "lgbm":
+        cache.build_datasets(threads=workers * threads)
+    outputs, peak = _run_jobs(evaluate_candidate, [(cache.dir, kind, params, threads, random_state)
+                                                   for params in candidates], workers)
+    results = [scores for scores, in outputs]
+    elapsed = time.perf_counter() - start
+
+    scores = {target: np.array([r[target] for r in results]) for target in cache.targets}
+    return SearchResult(candidates, scores, workers, threads, elapsed, peak)
+
+
+def halving_schedule(n_candidates, eta=3, min_resource=1 / 27):
+    """
+    [(candidates, resource), ...] per rung of a successive-halving search. The resource
+    is the share of a candidate's n_estimators and of each fold's training rows a rung
+    uses: it starts at min_resource and grows eta-fold per rung up to the full budget.
+    Each rung keeps the best 1/eta of the last, and the full-budget rung only the best one.
+    """
+    n_rungs = 1 + max(0, round(math.log(1 / min_resource, eta)))
+    sizes = [max(1, math.ceil(n_candidates / eta ** rung)) for rung in range(n_rungs - 1)] + [1]
+    return [(n, eta ** (rung - n_rungs + 1)) for rung, n in enumerate(sizes)]
+
+
+def evaluate_rung(cache_dir, params, targets, resource, model_threads, early_stopping_rounds,
+                  random_state=RANDOM_STATE):
+    """
+    One LightGBM candidate at one rung, for the targets it's still in the running for.
+    The last EARLY_STOPPING_SHARE of each fold's training rows is held out for early
+    stopping. Each fold trains on the most recent `resource` share of the rest for up to
+    that share of n_estimators rounds, and is scored by predicting its test rows at the
+    best round, so the test rows pick neither the rounds nor the candidate's score.
+    Returns ({target: [fold R2, ...]}, {target: [best round, ...]}, pid, peak RSS MB of
+    this process).
+    """
+    import lightgbm as lgb
+    cache = FoldCache(cache_dir)
+    params = dict(params, n_estimators=max(1, math.ceil(params.get('n_estimators', 100) * resource)))
+    scores = {target: [] for target in targets}
+    best_rounds = {target: [] for target in targets}
+    for i in range(len(cache.folds)):
+        X_train, X_test, y_train, y_test = cache.fold(i)
+        dataset = cache.load_dataset(i, model_threads)
+        n_train = len(y_train)
+        n_fit = n_train - max(1, int(n_train * EARLY_STOPPING_SHARE))
+        valid = lgb.Dataset(X_train[n_fit:], reference=dataset,
+                            params=dict(DATASET_PARAMS, num_threads=model_threads)).construct()
+        recent = np.arange(n_fit - max(1, int(n_fit * resource)), n_fit)
+        for target in targets:
+            t = cache.targets.index(target)
+            dataset.set_label(y_train[:, t])
+            valid.set_label(y_train[n_fit:, t])
+            # a subset reuses the fold's bins, and takes the label set just above
+            model = fit_lgbm(dataset.subset(recent), params, model_threads, random_state, valid, early_stopping_rounds)
+            scores[target].append(r2_score(y_test[:, t], model.predict(X_test, num_iteration=model.best_iteration)))
+            best_rounds[target].append(model.best_iteration)
+    return scores, best_rounds, os.getpid(), peak_rss_mb()
+
+
+class HalvingResult:
+    """
+    Every rung of a successive-halving search, and for each target the candidate left at
+    the end with its fold scores and early-stopped n_estimators. Has the best_params,
+    fold_scores, results and summary of SearchResult.
+    """
+
+    def __init__(self, candidates, rungs, search_workers, model_threads, seconds, peak_rss_mb):
+        self.candidates = candidates
+        self.rungs = rungs                    # [{'resource', 'scores': {target: {index: fold R2}}, 'best_rounds': ...}]
+        self.search_workers = search_workers
+        self.model_threads = model_threads
+        self.seconds = seconds
+        self.peak_rss_mb = peak_rss_mb
+        final = rungs[-1]
+        self.best_index = {target: max(scores, key=lambda i: np.mean(scores[i]))
+                           for target, scores in final['scores'].items()}
+        # refit with the rounds early stopping settled on, averaged over the folds
+        self.best_params = {target: dict(candidates[i], n_estimators=int(round(np.mean(final['best_rounds'][target][i]))))
+                            for target, i in self.best_index.items()}
+
+    def fold_scores(self, target):
+        return list(self.rungs[-1]['scores'][target][self.best_index[target]])
+
+    def results(self):
+        """One row per rung, target and candidate scored there: parameters, fold scores, their mean and best rounds."""
+        rows = []
+        for rung, info in enumerate(self.rungs):
+            for target, scores in info['scores'].items():
+                for i, fold_scores in scores.items():
+                    row = {'rung': rung, 'resource': info['resource'], 'target': target, **self.candidates[i]}
+                    row.update({f'split{k}_test_score': s for k, s in enumerate(fold_scores)})
+                    row['mean_test_score'] = np.mean(fold_scores)
+                    row['mean_best_rounds'] = np.mean(info['best_rounds'][target][i])
+                    rows.append(row)
+        return pd.DataFrame(rows)
+
+    def summary(self):
+        sizes = " → ".join(str(len(next(iter(info['scores'].values())))) for info in self.rungs)
+        return (f"successive halving over {sizes} candidates per target with "
+                f"{self.search_workers} search workers × {self.model_threads} model threads: "
+                f"{self.seconds:.1f}s, peak RSS {self.peak_rss_mb:.0f} MB")
+
+
+def halving_search(cache, param_dist, n_candidates=27, eta=3, min_resource=1 / 27, early_stopping_rounds=50,
+                   search_workers=None, model_threads=None, random_state=RANDOM_STATE):
+    """
+    Successive-halving randomized search over param_dist for LightGBM, for every target of
+    the cache. n_candidates are drawn as RandomizedSearchCV would; the first rung scores
+    them all on a small share of the boosting rounds and of each fold's (most recent)
+    training rows, and each rung after keeps the best 1/eta per target on eta times the
+    resource (see halving_schedule), until one candidate per target is scored in full.
+    Every fit stops early on the most recent rows of its fold's training data (see
+    evaluate_rung), so best_params carries the rounds it needed rather than the sampled
+    n_estimators, and the fold scores are R2 on test rows the fit never saw.
+    """
+    workers, threads = split_cores(search_workers, model_threads)
+    candidates = list(ParameterSampler(param_dist, n_candidates, random_state=random_state))
+    schedule = halving_schedule(n_candidates, eta, min_resource)
+
+    start = time.perf_counter()
+    cache.build_datasets(threads=workers * threads)
+    alive = {target: list(range(n_candidates)) for target in cache.targets}
+    rungs = []
+    peak = 0.0
+    for rung, (_, resource) in enumerate(schedule):
+        # a candidate still in the running for both targets is fitted once per fold for both
+        indices = sorted(set().union(*alive.values()))
+        jobs = [(cache.dir, candidates[i], [t for t in cache.targets if i in alive[t]], resource, threads,
+                 early_stopping_rounds, random_state) for i in indices]
+        outputs, rung_peak = _run_jobs(evaluate_rung, jobs, workers)
+        peak = max(peak, rung_peak)
+
+        info = {'resource': resource, 'scores': {}, 'best_rounds': {}}
+        for target in cache.targets:
+            info['scores'][target] = {i: np.array(scores[target]) for i, (scores, _) in zip(indices, outputs)
+                                      if target in scores}
+            info['best_rounds'][target] = {i: np.array(rounds[target]) for i, (_, rounds) in zip(indices, outputs)
+                                           if target in rounds}
+        rungs.append(info)
+        if rung + 1 < len(schedule):
+            keep = schedule[rung + 1][0]
+            for target in cache.targets:
+                # stable sort, so ties keep the earlier candidate
+                ranked = sorted(alive[target], key=lambda i: -info['scores'][target][i].mean())
+                alive[target] = sorted(ranked[:keep])
+    elapsed = time.perf_counter() - start
+    return HalvingResult(candidates, rungs, workers, threads, elapsed, peak)
@@ -0,0 +1,291 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+BLOCK_PAIRS = 2 ** 17    # (row, tree) pairs per block, so a block's working arrays stay a few MB
+COMPACT_EVERY = 6        # traversal steps between dropping (row, tree) pairs that reached a leaf
+IDENTITY_OBJECTIVES = ('regression', 'regression_l1', 'huber', 'fair', 'quantile', 'mape')
+
+
+def _bin_dtype(n_bins):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if n_bins <= np.iinfo(dtype).max:
+            return dtype
+    raise ValueError(f"{n_bins} bins do not fit in 32 bits")
+
+
+def _sklearn_trees(model):
+    """Per-tree node arrays of a fitted sklearn forest (one output); leaves have left == -1."""
+    trees = []
+    for estimator in model.estimators_:
+        t = estimator.tree_
+        if t.n_outputs != 1:
+            raise ValueError("only single-output forests are supported")
+        missing_left = getattr(t, 'missing_go_to_left', np.zeros(t.node_count, dtype=np.uint8))
+        trees.append({
+            'left': t.children_left.astype(np.int64), 'right': t.children_right.astype(np.int64),
+            'feature': np.maximum(t.feature, 0).astype(np.int64), 'threshold': t.threshold.astype(np.float64),
+            'nan_left': missing_left.astype(bool), 'value': t.value[:, 0, 0].astype(np.float64), 'cats': {},
+        })
+    return trees
+
+
+def _lgbm_tree(structure):
+    """Node arrays for one tree of Booster.dump_model(), numbered depth-first from the root."""
+    left, right, feature, threshold, nan_left, value, cats = [], [], [], [], [], [], {}
+    stack = [(structure, -1, False)]
+    while stack:
+        node, parent, is_right = stack.pop()
+        i = len(left)
+        if parent >= 0:
+            (right if is_right else left)[parent] = i
+        left.append(-1)
+        right.append(-1)
+        if 'leaf_value' in node:
+            feature.append(0)
+            threshold.append(0.0)
+            nan_left.append(False)
+            value.append(node['leaf_value'])
+            continue
+        if node['missing_type'] == 'Zero':
+            raise ValueError("models trained with zero_as_missing are not supported")
+        feature.append(node['split_feature'])
+        value.append(0.0)
+        if node['decision_type'] == '==':
+            cats[i] = [int(c) for c in str(node['threshold']).split('||')]
+            threshold.append(0.0)
+            nan_left.append(False)
+        else:
+            threshold.append(float(node['threshold']))
+            # without a NaN missing type LightGBM reads NaN as 0.0
+            nan_left.append(node['default_left'] if node['missing_type'] == 'NaN' else 0.0 <= node['threshold'])
+        stack.append((node['right_child'], i, True))
+        stack.append((node['left_child'], i, False))
+    return {'left': np.array(left, dtype=np.int64), 'right': np.array(right, dtype=np.int64),
+            'feature': np.array(feature, dtype=np.int64), 'threshold': np.array(threshold, dtype=np.float64),
+            'nan_left': np.array(nan_left, dtype=bool), 'value': np.array(value, dtype=np.float64), 'cats': cats}
+
+
+def _breadth_first(left, right):
+    """Node order with each node's two children next to each other, left first."""
+    order, frontier = [], np.array([0])
+    while len(frontier):
+        order.append(frontier)
+        inner = frontier[left[frontier] >= 0]
+        frontier = np.column_stack([left[inner], right[inner]]).ravel()
+    return np.concatenate(order)
+
+
+class TreeTable:
+    """
+    A fitted tree ensemble flattened into one int64 word per node (left child, split
+    feature, split threshold as a bin number, which way NaN goes) and one leaf value per
+    node. Children sit side by side in breadth-first order, so the right child is the
+    left one plus one, and leaves are their own children. A block of rows descends every
+    tree at once with one gather from the node table per level.
+
+    Inputs are quantized first: each feature's value becomes the number of split
+    thresholds on that feature below it plus one (NaN is 0), so a split is an integer
+    compare on a uint8/uint16 matrix a fraction of the size of the float input.
+    Built by compile_model from a LightGBM or scikit-learn forest regressor.
+
+    Opt-in: predictions match the model's own predict, but on one core they run at
+    half its speed or less, and predict allocates more. What it saves is the model's
+    resident size (see benchmarks/bench_tree_inference.py); nothing in the pipeline uses it.
+    """
+
+    def __init__(self, trees, n_features, feature_names, categories, average, sklearn_inputs):
+        self.n_features = n_features
+        self.feature_names = feature_names
+        self.categories = categories          # {column: categories} pandas categoricals are coded against
+        self.n_trees = len(trees)
+        self.scale = 1.0 / self.n_trees if average else 1.0
+        self.sklearn_inputs = sklearn_inputs  # sklearn compares float32 inputs, LightGBM float64
+
+        n_nodes = sum(len(tree['left']) for tree in trees)
+        if n_nodes >= 2 ** 31:
+            raise ValueError(f"{n_nodes:,} nodes do not fit in the node table")
+        self.roots = np.empty(self.n_trees, dtype=np.int64)
+        self.value = np.zeros(n_nodes, dtype=np.float64)
+        child = np.empty(n_nodes, dtype=np.int64)
+        leaf = np.empty(n_nodes, dtype=bool)
+        feature = np.zeros(n_nodes, dtype=np.int64)
+        threshold = np.zeros(n_nodes, dtype=np.float64)
+        nan_left = np.zeros(n_nodes, dtype=bool)
+        cat_nodes, cat_sets = [], []
+
+        offset = 0
+        for k, tree in enumerate(trees):
+            order = _breadth_first(tree['left'], tree['right'])
+            new = np.empty(len(order), dtype=np.int64)
+            new[order] = np.arange(len(order)) + offset
+            ids = new[order]
+            left = tree['left'][order]
+            self.roots[k] = offset
+            leaf[ids] = left < 0
+            child[ids] = np.where(left < 0, ids, new[np.maximum(left, 0)])
+            self.value[ids] = np.where(left < 0, tree['value'][order], 0.0)
+            feature[ids] = np.where(left < 0, 0, tree['feature'][order])
+            threshold[ids] = tree['threshold'][order]
+            nan_left[ids] = tree['nan_left'][order]
+            for old, cats in tree['cats'].items():
+                cat_nodes.append(new[old])
+                cat_sets.append(cats)
+            offset += len(order)
+
+        # a categorical split becomes a numerical one on a virtual 0/1 column, one per distinct
+        # (feature, categories sent left), filled in when inputs are quantized
+        self.virtual = {}
+        for node, cats in zip(cat_nodes, cat_sets):
+            key = (int(feature[node]), tuple(sorted(cats)))
+            feature[node] = self.virtual.setdefault(key, n_features + len(self.virtual))
+        self.n_columns = n_features + len(self.virtual)
+        numerical = ~leaf
+        numerical[cat_nodes] = False
+
+        # sorted split thresholds of every numerical feature are its bin edges
+        self.thresholds = [np.empty(0)] * n_features
+        split_nodes = {f: np.flatnonzero(numerical & (feature == f)) for f in np.unique(feature[numerical])}
+        for f, nodes in split_nodes.items():
+            self.thresholds[f] = np.unique(threshold[nodes])
+        max_bin = max(len(t) for t in self.thresholds + [np.empty(2)])
+        self.bin_dtype = _bin_dtype(max_bin)
+
+        # one int64 per node: left child in the high 32 bits, then feature, bin and NaN direction
+        feature_bits = max(1, (self.n_columns - 1).bit_length())
+        self.bin_bits = 31 - feature_bits
+        self.bin_mask = (1 << self.bin_bits) - 1
+        if max_bin >= self.bin_mask:
+            raise ValueError(f"{max_bin:,} split thresholds on one feature do not fit in the node table")
+        # leaves never move right; x <= thresholds[f][j]  ⇔  (thresholds below x) <= j  ⇔  bin <= j + 1
+        hi = np.full(n_nodes, self.bin_mask, dtype=np.int64)
+        lo = np.zeros(n_nodes, dtype=np.int64)
+        for f, nodes in split_nodes.items():
+            hi[nodes] = np.searchsorted(self.thresholds[f], threshold[nodes]) + 1
+            lo[nodes] = ~nan_left[nodes]
+        # virtual columns are 1 for the categories sent left and 2 otherwise (NaN included)
+        hi[cat_nodes] = 1
+        self.nodes = (child << 32) | (feature << (self.bin_bits + 1)) | (hi << 1) | lo
+
+    @property
+    def nbytes(self):
+        arrays = (self.roots, self.nodes, self.value)
+        return sum(a.nbytes for a in arrays) + sum(t.nbytes for t in self.thresholds)
+
+    def _columns(self, X):
+        """Float64 columns of X in model feature order (categoricals as their codes)."""
+        if isinstance(X, pd.DataFrame):
+            if self.feature_names is not None and set(self.feature_names) <= set(X.columns):
+                X = X[self.feature_names]
+            columns = []
+            for col in X.columns:
+                values = X[col]
+                if isinstance(values.dtype, pd.CategoricalDtype):
+                    if col in self.categories:
+                        values = values.cat.set_categories(self.categories[col])
+                    codes = values.cat.codes.to_numpy()
+                    columns.append(np.where(codes < 0, np.nan, codes))
+                else:
+                    columns.append(values.to_numpy(dtype=np.float64, na_value=np.nan))
+            return columns
+        X = np.asarray(X)
+        return [X[:, f].astype(np.float64) for f in range(X.shape[1])]
+
+    def quantize(self, X):
+        """
+        X (DataFrame or array, model feature order) as a matrix of bin numbers, followed by
+        the virtual columns of categorical splits. Features no split reads are left at 1.
+        """
+        columns = self._columns(X)
+        if len(columns) != self.n_features:
+            raise ValueError(f"expected {self.n_features} features, got {len(columns)}")
+        bins = np.ones((len(columns[0]), self.n_columns), dtype=self.bin_dtype)
+        for f, values in enumerate(columns):
+            if len(self.thresholds[f]):
+                if self.sklearn_inputs:
+                    values = values.astype(np.float32).astype(np.float64)
+                bins[:, f] = np.where(np.isnan(values), 0, np.searchsorted(self.thresholds[f], values) + 1)
+        for (f, cats), col in self.virtual.items():
+            # LightGBM sends NaN and negative categories right
+            bins[:, col] = np.where(np.isin(columns[f], cats), 1, 2)
+        return bins
+
+    def _leaves(self, bins):
+        """
+        Leaf node of every (tree, row) pair of a quantized block, tree-major so that
+        consecutive gathers stay within one tree's nodes. Pairs that reached a leaf are
+        dropped every few steps, so deep trees don't keep every row descending.
+        """
+        n_rows = len(bins)
+        flat = bins.ravel()
+        node = np.repeat(self.roots, n_rows)
+        row_start = np.tile(np.arange(n_rows, dtype=np.int64) * self.n_columns, self.n_trees)
+        leaves = np.empty_like(node)
+        pairs = np.arange(len(node))
+        with_nan = bool((bins == 0).any())
+        step = 0
+        while len(node):
+            word = self.nodes.take(node)
+            child = word >> 32
+            value = flat.take(row_start + ((word & 0xFFFFFFFF) >> (self.bin_bits + 1)))
+            go_right = value > ((word >> 1) & self.bin_mask)
+            if with_nan:
+                go_right |= value < (word & 1)
+            step += 1
+            if step % COMPACT_EVERY == 0:
+                # a leaf is its own child
+                done = child == node
+                if done.any():
+                    leaves[pairs[done]] = node[done]
+                    keep = np.flatnonzero(~done)
+                    child, go_right = child.take(keep), go_right.take(keep)
+                    pairs, row_start = pairs.take(keep), row_start.take(keep)
+            node = child + go_right
+        return leaves
+
+    def _predict_block(self, bins):
+        return self.value.take(self._leaves(bins)).reshape(self.n_trees, len(bins)).sum(axis=0) * self.scale
+
+    def predict(self, X, block_rows=None, n_threads=None):
+        """
+        Predictions for X, block_rows rows at a time (default BLOCK_PAIRS / trees) on
+        n_threads threads (default all cores).
+        """
+        bins = self.quantize(X)
+        block_rows = block_rows or max(1, BLOCK_PAIRS // self.n_trees)
+        blocks = [bins[i:i + block_rows] for i in range(0, len(bins), block_rows)]
+        n_threads = n_threads or os.cpu_count() or 1
+        if n_threads == 1 or len(blocks) == 1:
+            parts = [self._predict_block(b) for b in blocks]
+        else:
+            # numpy releases the GIL inside the gathers and compares, so blocks descend in parallel
+            with ThreadPoolExecutor(n_threads) as pool:
+                parts = list(pool.map(self._predict_block, blocks))
+        return np.concatenate(parts) if parts else np.empty(0)
+
+
+def compile_model(model):
+    """TreeTable for a fitted LGBMRegressor / lightgbm.Booster or sklearn RandomForest / ExtraTrees regressor."""
+    if hasattr(model, 'estimators_'):
+        names = getattr(model, 'feature_names_in_', None)
+        return TreeTable(_sklearn_trees(model), model.n_features_in_,
+                         list(names) if names is not None else None, {}, average=True, sklearn_inputs=True)
+
+    booster = getattr(model, 'booster_', model)
+    dump = booster.dump_model()
+    objective = dump.get('objective', 'regression').split()[0]
+    if objective not in IDENTITY_OBJECTIVES:
+        raise ValueError(f"objective {objective} transforms its raw scores, which is not supported")
+    if booster.params.get('linear_tree'):
+        raise ValueError("linear trees are not supported")
+    names = dump['feature_names']
+    # categorical features list their categories in feature_infos; a DataFrame's categorical
+    # columns are recoded against the categories seen in training, as Booster.predict does
+    infos = dump['feature_infos']
+    cat_columns = [n for n in names if isinstance(infos.get(n), dict) and infos[n].get('values')]
+    categories = dict(zip(cat_columns, booster.pandas_categorical or []))
+    trees = [_lgbm_tree(tree['tree_structure']) for tree in dump['tree_info']]
+    return TreeTable(trees, len(names), names, categories, average=dump.get('average_output', False),
+                     sklearn_inputs=False)
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+
+class RunningStats:
+    """
+    Per-column validation statistics accumulated one frame at a time: rows, nulls,
+    and min/max/mean for numeric columns. Merging blocks gives the same numbers as
+    computing them on the concatenated frame.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.nulls = {}
+        self.minimum = {}
+        self.maximum = {}
+        self.total = {}
+        self.count = {}
+
+    def update(self, df):
+        self.rows += len(df)
+        for col, n in df.isna().sum().items():
+            self.nulls[col] = self.nulls.get(col, 0) + int(n)
+        numeric = df.select_dtypes(include=[np.number, 'bool'])
+        if numeric.empty:
+            return
+        for col, lo, hi, total, count in zip(numeric.columns, numeric.min().astype(float), numeric.max().astype(float),
+                                             numeric.sum().astype(float), numeric.count()):
+            if count == 0:
+                continue
+            self.minimum[col] = min(self.minimum.get(col, lo), lo)
+            self.maximum[col] = max(self.maximum.get(col, hi), hi)
+            self.total[col] = self.total.get(col, 0.0) + total
+            self.count[col] = self.count.get(col, 0) + int(count)
+
+    def null_total(self):
+        return sum(self.nulls.values())
+
+    def summary(self):
+        """One row per column: nulls, min, max, mean."""
+        cols = list(self.nulls)
+        return pd.DataFrame({
+            'nulls': [self.nulls[c] for c in cols],
+            'min': [self.minimum.get(c) for c in cols],
+            'max': [self.maximum.get(c) for c in cols],
+            'mean': [self.total[c] / self.count[c] if self.count.get(c) else None for c in cols],
+        }, index=cols)
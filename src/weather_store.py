@@ -0,0 +1,102 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from src import config as cfg
+
+STORE_DIR = cfg.WTH_STORE
+PART_FILE = "part-0.parquet"
+
+# one schema for every site: typed UTC timestamps, float32 readings, small-integer codes
+SCHEMA = pa.schema([
+    ('time', pa.timestamp('s', tz='UTC')),
+    ('temperature_2m', pa.float32()),
+    ('relative_humidity_2m', pa.float32()),
+    ('dew_point_2m', pa.float32()),
+    ('precipitation', pa.float32()),
+    ('snow_depth', pa.float32()),
+    ('weather_code', pa.int8()),
+    ('pressure_msl', pa.float32()),
+    ('cloud_cover', pa.float32()),
+    ('shortwave_radiation', pa.float32()),
+    ('wind_speed_10m', pa.float32()),
+    ('wind_direction_10m', pa.float32()),
+    ('wind_gusts_10m', pa.float32()),
+])
+VARIABLES = SCHEMA.names[1:]
+
+
+def frame_to_table(frame):
+    """
+    Casts one site's hourly frame (a 'time' column plus the weather variables)
+    to the store schema. Naive timestamps are taken to be UTC.
+    """
+    frame = frame.copy()
+    time = pd.to_datetime(frame['time'])
+    frame['time'] = time.dt.tz_localize('UTC') if time.dt.tz is None else time.dt.tz_convert('UTC')
+    # weather codes arrive as floats; round before the integer cast so NaN stays null
+    frame['weather_code'] = frame['weather_code'].round().astype('Int8')
+    return pa.Table.from_pandas(frame[SCHEMA.names], preserve_index=False).cast(SCHEMA)
+
+
+def site_path(site_code, store_dir=STORE_DIR):
+    return store_dir / f"site_code={site_code}" / PART_FILE
+
+
+def write_site(site_code, frame, store_dir=STORE_DIR):
+    """Replaces one site's partition, writing to a temporary file first so readers never see half a part."""
+    path = site_path(site_code, store_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    pq.write_table(frame_to_table(frame), tmp_path, compression='zstd')
+    tmp_path.replace(path)
+
+
+def has_site(site_code, store_dir=STORE_DIR):
+    return site_path(site_code, store_dir).exists()
+
+
+def stored_sites(store_dir=STORE_DIR):
+    return sorted(p.parent.name.split("=", 1)[1] for p in store_dir.glob(f"site_code=*/{PART_FILE}"))
+
+
+def dataset(store_dir=STORE_DIR):
+    """
+    All sites as one Arrow dataset over the partition files. Nothing is read
+    until a scan, so this replaces the old combined CSV without concatenating.
+    """
+    return ds.dataset(store_dir, format="parquet", partitioning="hive", schema=SCHEMA.append(
+        pa.field('site_code', pa.string())))
+
+
+def _utc(ts):
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize('UTC') if ts.tz is None else ts.tz_convert('UTC')
+
+
+def load_weather(sites=None, columns=None, start=None, end=None, store_dir=STORE_DIR):
+    """
+    Loads weather for the given sites, columns and [start, end) time range, reading
+    only the matching partitions and column chunks. Always returns site_code and time.
+    """
+    columns = list(VARIABLES) if columns is None else [c for c in columns if c not in ('site_code', 'time')]
+    unknown = set(columns) - set(VARIABLES)
+    if unknown:
+        raise ValueError(f"unknown weather columns: {sorted(unknown)}")
+
+    conditions = []
+    if sites is not None:
+        conditions.append(pc.field('site_code').isin([str(s) for s in sites]))
+    if start is not None:
+        conditions.append(pc.field('time') >= _utc(start))
+    if end is not None:
+        conditions.append(pc.field('time') < _utc(end))
+    filter_expr = None
+    for condition in conditions:
+        filter_expr = condition if filter_expr is None else filter_expr & condition
+
+    table = dataset(store_dir).to_table(columns=['site_code', 'time'] + columns, filter=filter_expr)
+    df = table.to_pandas()
+    df['site_code'] = df['site_code'].astype('category')
+    return df.sort_values(['site_code', 'time'], ignore_index=True)